@@ -7,6 +7,8 @@ Comprehensive test of all API endpoints with MongoDB Atlas
 import requests
 import sys
 import json
+import hashlib
+import secrets
 from datetime import datetime
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -88,20 +90,21 @@ class AtlasEndpointTester:
             return False
 
     async def get_reset_token_from_db(self, email):
-        """Get password reset token from MongoDB Atlas"""
+        """Substitute a known token for the outstanding reset token in MongoDB Atlas"""
         try:
             client = AsyncIOMotorClient(self.mongo_url)
             db = client[self.db_name]
             
-            token_doc = await db.password_reset_tokens.find_one(
+            # Only a hash is stored and the emailed link is not kept at rest,
+            # so swap in the hash of a token generated here
+            token = secrets.token_urlsafe(32)
+            result = await db.password_reset_tokens.update_one(
                 {"email": email, "used": False},
-                sort=[("created_at", -1)]
+                {"$set": {"token_hash": hashlib.sha256(token.encode('utf-8')).hexdigest()}}
             )
             client.close()
             
-            if token_doc:
-                return token_doc["token"]
-            return None
+            return token if result.modified_count else None
             
         except Exception as e:
             self.log(f"❌ Error getting reset token: {str(e)}", "ERROR")
@@ -0,0 +1,236 @@
+"""Archiving of old comments and votes into compressed collections.
+
+``db.commentaires`` and ``db.votes`` only grow, while the application reads
+the newest 100 comments of a recipe and, for votes, the activity window of
+the trending ranking plus the current user's own votes. The archive job moves
+the rest to ``commentaires_archive`` and ``votes_archive``, created with the
+zstd block compressor, so that the hot collections and their indexes stay
+small enough to remain in the Mongo cache.
+
+- Comments older than ``comments_retention_days`` are archived, except the
+  newest ``keep_comments`` of each recipe: recipe pages show the same list.
+  With ``keep_comments=0`` the retention window alone applies.
+- Votes older than ``votes_retention_days`` are archived and their count and
+  sum captured on the recipe (``votes_archives: {nb, somme}``), so the
+  average rating is recomputed from the hot votes plus these totals. A user
+  rating an archived vote again gets it restored by ``restore_vote``.
+
+A vote is only deleted from ``db.votes`` if its note is still the one that
+was copied; one rated again meanwhile stays hot and its copy is dropped. The
+totals and the average are then recounted and written with the recipe's
+``version`` as compare-and-set, like rating updates, so a vote landing in
+between is never lost nor counted twice.
+
+Each batch is copied to the archive before being deleted from the hot
+collection; the archives have a unique index on ``id``, so a batch
+interrupted half-way is simply moved again on the next run.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure
+
+from coordination import CoordinationBackend, LockNotAcquired
+from versions import version_filter, versioned_update
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLLECTIONS = {"commentaires": "commentaires_archive", "votes": "votes_archive"}
+COMPRESSED = {"storageEngine": {"wiredTiger": {"configString": "block_compressor=zstd"}}}
+DUPLICATE_KEY = 11000
+TOTALS_UPDATE_ATTEMPTS = 5
+
+
+async def restore_vote(db, recette_id: str, user_id: str) -> Optional[dict]:
+    """Move a user's archived vote back to ``db.votes`` (None when there is none)"""
+    vote = await db.votes_archive.find_one_and_delete({"recette_id": recette_id, "user_id": user_id})
+    if vote is None:
+        return None
+    await db.votes.insert_one(vote)
+    await db.recettes.update_one(
+        {"id": recette_id},
+        {"$inc": {"votes_archives.nb": -1, "votes_archives.somme": -vote["note"], "version": 1}}
+    )
+    return vote
+
+
+async def rating_totals(db, recette_id: str) -> Dict[str, float]:
+    """Number and sum of a recipe's votes, hot and archived"""
+    groupes = await db.votes.aggregate([
+        {"$match": {"recette_id": recette_id}},
+        {"$group": {"_id": None, "nb": {"$sum": 1}, "somme": {"$sum": "$note"}}}
+    ]).to_list(1)
+    recette = await db.recettes.find_one({"id": recette_id}, {"_id": 0, "votes_archives": 1})
+    archives = (recette or {}).get("votes_archives") or {}
+    hot = groupes[0] if groupes else {}
+    return {
+        "nb": hot.get("nb", 0) + archives.get("nb", 0),
+        "somme": hot.get("somme", 0) + archives.get("somme", 0)
+    }
+
+
+class ArchiveJob:
+    def __init__(self, db, coordination: CoordinationBackend, comments_retention_days: int = 180,
+                 votes_retention_days: int = 90, keep_comments: int = 100, batch_size: int = 1000,
+                 pause: float = 0.1, interval: float = 24 * 3600):
+        self.db = db
+        self.coordination = coordination
+        self.comments_retention = timedelta(days=comments_retention_days)
+        self.votes_retention = timedelta(days=votes_retention_days)
+        if keep_comments < 0:
+            raise ValueError(f"keep_comments doit être positif ou nul: {keep_comments}")
+        self.keep_comments = keep_comments
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.last_report: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def create_indexes(self) -> None:
+        existing = await self.db.list_collection_names()
+        for archive in ARCHIVE_COLLECTIONS.values():
+            if archive not in existing:
+                try:
+                    await self.db.create_collection(archive, **COMPRESSED)
+                except (CollectionInvalid, OperationFailure, NotImplementedError):
+                    pass  # Created by another worker, or storage options unsupported
+            await self.db[archive].create_index("id", unique=True)
+        await self.db.votes_archive.create_index([("user_id", 1), ("recette_id", 1)])
+        await self.db.commentaires_archive.create_index([("recette_id", 1), ("created_at", -1)])
+
+    async def _move(self, collection: str, documents: List[dict]) -> None:
+        try:
+            await self.db[ARCHIVE_COLLECTIONS[collection]].insert_many(documents, ordered=False)
+        except BulkWriteError as error:
+            # Copied by an interrupted run
+            if any(failure["code"] != DUPLICATE_KEY for failure in error.details["writeErrors"]):
+                raise
+
+    async def _update_totals(self, recette_id: str) -> None:
+        """Recount a recipe's archived totals and average, retrying when it changed meanwhile"""
+        for _ in range(TOTALS_UPDATE_ATTEMPTS):
+            recette = await self.db.recettes.find_one({"id": recette_id}, {"_id": 0, "version": 1})
+            if recette is None:
+                return
+            version = recette.get("version", 1)
+            totals = {}
+            for collection in ("votes", "votes_archive"):
+                groupes = await self.db[collection].aggregate([
+                    {"$match": {"recette_id": recette_id}},
+                    {"$group": {"_id": None, "nb": {"$sum": 1}, "somme": {"$sum": "$note"}}}
+                ]).to_list(1)
+                totals[collection] = groupes[0] if groupes else {"nb": 0, "somme": 0}
+            archives = {"nb": totals["votes_archive"]["nb"], "somme": totals["votes_archive"]["somme"]}
+            changes = {"votes_archives": archives}
+            nb = totals["votes"]["nb"] + archives["nb"]
+            if nb:
+                changes.update(note_moyenne=(totals["votes"]["somme"] + archives["somme"]) / nb, nb_votes=nb)
+            result = await self.db.recettes.update_one(
+                {"id": recette_id, "version": version_filter(version)},
+                versioned_update({"$set": changes}, version)
+            )
+            if result.matched_count:
+                return
+        logger.warning("Totaux archivés de la recette %s non mis à jour (modifiée entre-temps)", recette_id)
+
+    async def _archive_votes(self, cutoff: datetime) -> int:
+        moved = 0
+        while True:
+            votes = await self.db.votes.find({"created_at": {"$lt": cutoff}}).limit(self.batch_size).to_list(None)
+            if not votes:
+                return moved
+            # Replace rather than insert: a copy left by an interrupted run may hold an older note
+            await self.db.votes_archive.bulk_write(
+                [ReplaceOne({"_id": vote["_id"]}, vote, upsert=True) for vote in votes], ordered=False
+            )
+            # Only votes whose note is still the copied one leave the hot collection
+            deleted = await self.db.votes.bulk_write(
+                [DeleteOne({"_id": vote["_id"], "note": vote["note"]}) for vote in votes], ordered=False
+            )
+            ids = [vote["_id"] for vote in votes]
+            if deleted.deleted_count < len(votes):
+                rated_again = await self.db.votes.distinct("_id", {"_id": {"$in": ids}})
+                await self.db.votes_archive.delete_many({"_id": {"$in": rated_again}})
+            for recette_id in {vote["recette_id"] for vote in votes}:
+                await self._update_totals(recette_id)
+            moved += deleted.deleted_count
+            await asyncio.sleep(self.pause)
+
+    async def _archive_comments(self, cutoff: datetime) -> int:
+        moved = 0
+        recette_ids = await self.db.commentaires.distinct("recette_id", {"created_at": {"$lt": cutoff}})
+        for recette_id in recette_ids:
+            limit = cutoff
+            if self.keep_comments:
+                # Keep the comments a recipe page shows, however old they are
+                shown = await self.db.commentaires.find(
+                    {"recette_id": recette_id}, {"_id": 0, "created_at": 1}
+                ).sort("created_at", -1).skip(self.keep_comments - 1).limit(1).to_list(1)
+                if not shown:
+                    continue
+                oldest_shown = shown[0]["created_at"]
+                if oldest_shown.tzinfo is None:
+                    oldest_shown = oldest_shown.replace(tzinfo=timezone.utc)
+                limit = min(cutoff, oldest_shown)
+            query = {"recette_id": recette_id, "created_at": {"$lt": limit}}
+            while True:
+                commentaires = await self.db.commentaires.find(query).limit(self.batch_size).to_list(None)
+                if not commentaires:
+                    break
+                await self._move("commentaires", commentaires)
+                await self.db.commentaires.delete_many({"_id": {"$in": [c["_id"] for c in commentaires]}})
+                moved += len(commentaires)
+                await asyncio.sleep(self.pause)
+        return moved
+
+    async def archive(self) -> dict:
+        """Move comments and votes past their retention window to the archives"""
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        report = {
+            "started_at": now,
+            "commentaires": await self._archive_comments(now - self.comments_retention),
+            "votes": await self._archive_votes(now - self.votes_retention)
+        }
+        report["duree_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(
+            "Archivage: %d commentaires, %d votes en %.0f ms",
+            report["commentaires"], report["votes"], report["duree_ms"]
+        )
+        self.last_report = report
+        return report
+
+    async def run_once(self) -> Optional[dict]:
+        """Archive unless another worker is already doing it (None then)"""
+        try:
+            async with self.coordination.lock("archive", ttl=3600.0):
+                return await self.archive()
+        except LockNotAcquired:
+            return None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if not await self.coordination.get("archive:fresh"):
+                    if await self.run_once() is not None:
+                        await self.coordination.set("archive:fresh", True, ttl=self.interval * 0.9)
+            except Exception:
+                logger.exception("Erreur lors de l'archivage")
+            await asyncio.sleep(min(self.interval, 3600.0))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,169 @@
+"""In-memory prefix index for search-as-you-type.
+
+Every approved recipe contributes its title, indexed at each word so that
+"pom" finds "Tarte aux pommes", and its ingredient tokens. Keys are folded
+like the ingredient tokens (lowercase, no accents) and kept in a sorted list:
+a lookup is one ``bisect`` followed by a short scan of the matching range.
+
+The index lives in each worker. It is built at startup, with a single sort
+run in a thread so the event loop keeps serving, and then maintained
+incrementally: the approve/reject endpoints update it directly and the change
+stream brings the changes made by other workers.
+"""
+import asyncio
+import bisect
+import re
+from typing import Dict, Iterable, List, Tuple
+
+from ingredients import fold
+
+WORD = re.compile(r"[a-z0-9]+")
+
+# Entries scanned per lookup before ranking; bounds the cost of 1-letter prefixes
+MAX_SCAN = 500
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        # Parallel sorted lists: keys for bisect, entries (key, kind, target) alongside
+        self._keys: List[str] = []
+        self._entries: List[Tuple[str, str, str]] = []
+        self._recettes: Dict[str, dict] = {}
+        self._object_ids: Dict[object, str] = {}
+        self._ingredient_counts: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._recettes)
+
+    def _insert(self, key: str, kind: str, target: str) -> None:
+        entry = (key, kind, target)
+        position = bisect.bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            return
+        self._entries.insert(position, entry)
+        self._keys.insert(position, key)
+
+    def _delete(self, key: str, kind: str, target: str) -> None:
+        entry = (key, kind, target)
+        position = bisect.bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+            del self._keys[position]
+
+    @staticmethod
+    def _title_keys(titre: str) -> List[str]:
+        words = WORD.findall(fold(titre))
+        return [" ".join(words[start:]) for start in range(len(words))]
+
+    def _store(self, recette: dict) -> dict:
+        stored = {
+            "titre": recette["titre"],
+            "note_moyenne": recette.get("note_moyenne", 0.0),
+            "ingredient_tokens": list(recette.get("ingredient_tokens", [])),
+            "_id": recette.get("_id"),
+        }
+        self._recettes[recette["id"]] = stored
+        if stored["_id"] is not None:
+            self._object_ids[stored["_id"]] = recette["id"]
+        return stored
+
+    def load(self, recettes: Iterable[dict]) -> None:
+        """Fill an empty index in O(n log n): entries are collected, then sorted once"""
+        entries = set()
+        for recette in recettes:
+            stored = self._store(recette)
+            entries.update((key, "recette", recette["id"]) for key in self._title_keys(stored["titre"]))
+        for stored in self._recettes.values():
+            for token in stored["ingredient_tokens"]:
+                self._ingredient_counts[token] = self._ingredient_counts.get(token, 0) + 1
+        entries.update((token, "ingredient", token) for token in self._ingredient_counts)
+        self._entries = sorted(entries)
+        self._keys = [entry[0] for entry in self._entries]
+
+    def add(self, recette: dict) -> None:
+        """Index an approved recipe (replaces its previous entries)"""
+        previous = self._recettes.get(recette["id"])
+        if previous and recette.get("_id") is None:
+            recette = {**recette, "_id": previous["_id"]}
+        self.remove(recette["id"])
+        stored = self._store(recette)
+        for key in self._title_keys(stored["titre"]):
+            self._insert(key, "recette", recette["id"])
+        for token in stored["ingredient_tokens"]:
+            count = self._ingredient_counts.get(token, 0)
+            if count == 0:
+                self._insert(token, "ingredient", token)
+            self._ingredient_counts[token] = count + 1
+
+    def remove(self, recette_id: str) -> None:
+        stored = self._recettes.pop(recette_id, None)
+        if stored is None:
+            return
+        self._object_ids.pop(stored["_id"], None)
+        for key in self._title_keys(stored["titre"]):
+            self._delete(key, "recette", recette_id)
+        for token in stored["ingredient_tokens"]:
+            count = self._ingredient_counts.get(token, 0) - 1
+            if count <= 0:
+                self._ingredient_counts.pop(token, None)
+                self._delete(token, "ingredient", token)
+            else:
+                self._ingredient_counts[token] = count
+
+    def remove_object(self, object_id) -> None:
+        """Remove by Mongo ``_id``, all a delete event carries"""
+        recette_id = self._object_ids.pop(object_id, None)
+        if recette_id is not None:
+            self.remove(recette_id)
+
+    async def build(self, db) -> int:
+        """Replace the content with every approved recipe"""
+        recettes = await db.recettes.find(
+            {"approuve": True}, {"id": 1, "titre": 1, "note_moyenne": 1, "ingredient_tokens": 1}
+        ).to_list(None)
+        index = AutocompleteIndex()
+        await asyncio.to_thread(index.load, recettes)
+        self.__dict__.update(index.__dict__)
+        return len(self)
+
+    def apply_change(self, event: dict) -> None:
+        """Change-bus subscriber for the recettes collection"""
+        if event["operation"] == "delete":
+            self.remove_object(event.get("object_id"))
+            return
+        document = event["document"]
+        if not document.get("id"):
+            return
+        if document.get("approuve"):
+            self.add({**document, "_id": event.get("object_id")})
+        else:
+            self.remove(document["id"])
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[dict]:
+        query = " ".join(WORD.findall(fold(prefix)))
+        if not query:
+            return []
+        start = bisect.bisect_left(self._keys, query)
+        recettes, ingredients = {}, {}
+        for position in range(start, min(start + MAX_SCAN, len(self._keys))):
+            if not self._keys[position].startswith(query):
+                break
+            _, kind, target = self._entries[position]
+            if kind == "recette":
+                recettes[target] = self._recettes[target]
+            else:
+                ingredients[target] = self._ingredient_counts[target]
+
+        titres = []
+        seen = set()
+        for recette_id, recette in sorted(recettes.items(), key=lambda item: -item[1]["note_moyenne"]):
+            if recette["titre"] not in seen:
+                seen.add(recette["titre"])
+                titres.append({"type": "recette", "texte": recette["titre"], "recette_id": recette_id})
+        termes = [
+            {"type": "ingredient", "texte": token, "nb_recettes": count}
+            for token, count in sorted(ingredients.items(), key=lambda item: -item[1])
+        ]
+        # Keep a third of the list for ingredients unless titles leave more room
+        nb_termes = min(len(termes), max(limit - len(titres), limit // 3))
+        return titres[:limit - nb_termes] + termes[:nb_termes]
@@ -0,0 +1 @@
+"""Performance benchmarks for the recipe backend (see README.md)."""
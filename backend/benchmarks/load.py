@@ -0,0 +1,365 @@
+"""Mixed-workload load generator.
+
+``run`` boots the benchmark stack (benchmarks.stack) in a subprocess, logs in
+a pool of seeded users, then drives a closed-loop workload of browse, search,
+rate, comment, login, upload and AI calls with N concurrent clients. Latencies
+recorded during the warmup are discarded. Throughput and p50/p95/p99 per
+scenario are written to a JSON report.
+
+``compare`` checks a report against a baseline and exits with status 1 when a
+scenario's p95 or throughput regressed beyond the threshold.
+
+    python -m benchmarks.load run --mongomock --duration 30 --output bench.json
+    python -m benchmarks.load compare baseline.json bench.json --threshold 0.15
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from PIL import Image
+
+from benchmarks.seed import BENCH_PASSWORD, CATEGORIES, bench_email, search_terms
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = "browse=35,search=15,category=10,detail=15,rate=8,comment=5,login=5,upload=5,ai=2"
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    unknown = set(weights) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Scénarios inconnus: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def phone_photo() -> bytes:
+    """A noisy 12 MP-ish aspect JPEG, close to what phones upload"""
+    noise = Image.effect_noise((2016, 1512), 64)
+    image = Image.merge("RGB", (noise, noise.rotate(90, expand=False), noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, recette_ids: list, tokens: list, users: int, seed: int):
+        self.client = client
+        self.recette_ids = recette_ids
+        self.tokens = tokens
+        self.users = users
+        self.rng = random.Random(seed)
+        self.terms = search_terms()
+        self.photo = phone_photo()
+
+    def auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+    async def browse(self):
+        return await self.client.get("/api/recettes", params={"avec_ma_note": "true"}, headers=self.auth())
+
+    async def search(self):
+        return await self.client.get("/api/recettes", params={"search": self.rng.choice(self.terms)})
+
+    async def category(self):
+        return await self.client.get("/api/recettes", params={"categorie": self.rng.choice(CATEGORIES)})
+
+    async def detail(self):
+        ids = self.rng.sample(self.recette_ids, min(len(self.recette_ids), 12))
+        return await self.client.post(
+            "/api/recettes/batch",
+            json={"ids": ids, "include": ["commentaires", "ma_note"]},
+            headers=self.auth()
+        )
+
+    async def rate(self):
+        return await self.client.post(
+            f"/api/recettes/{self.rng.choice(self.recette_ids)}/noter",
+            json={"note": self.rng.randint(1, 5)},
+            headers=self.auth()
+        )
+
+    async def comment(self):
+        return await self.client.post(
+            f"/api/recettes/{self.rng.choice(self.recette_ids)}/commentaires",
+            json={"commentaire": "Testée ce soir, un régal."},
+            headers=self.auth()
+        )
+
+    async def login(self):
+        return await self.client.post(
+            "/api/auth/login",
+            json={"email": bench_email(self.rng.randrange(self.users)), "password": BENCH_PASSWORD}
+        )
+
+    async def upload(self):
+        return await self.client.post(
+            "/api/recettes",
+            data={
+                "titre": "Tarte du benchmark",
+                "ingredients": "200 g de farine\n100 g de beurre\n3 pommes",
+                "instructions": "Préparer la pâte.\nCuire 30 minutes.",
+                "categorie": "Dessert",
+            },
+            files={"image": ("photo.jpg", self.photo, "image/jpeg")},
+            headers=self.auth()
+        )
+
+    async def ai(self):
+        return await self.client.post("/api/ia/generer-recette", json={"ingredients": "tomates, courgettes, comté"})
+
+    async def ai_stream(self):
+        async with self.client.stream(
+            "POST", "/api/ia/suggestions/stream", json={"ingredients": "poireaux, saumon"}
+        ) as response:
+            async for _ in response.aiter_bytes():
+                pass
+        return response
+
+
+SCENARIOS = {
+    name: getattr(Workload, name)
+    for name in ("browse", "search", "category", "detail", "rate", "comment", "login", "upload", "ai", "ai_stream")
+}
+
+
+def start_stack(args) -> tuple:
+    """Start benchmarks.stack and wait for its BENCH_READY line"""
+    command = [
+        sys.executable, "-m", "benchmarks.stack",
+        "--port", str(args.port),
+        "--users", str(args.users),
+        "--recipes", str(args.recipes),
+        "--votes-per-recipe", str(args.votes_per_recipe),
+        "--comments-per-recipe", str(args.comments_per_recipe),
+        "--seed", str(args.seed),
+        "--ai-latency", str(args.ai_latency),
+        "--ai-error-rate", str(args.ai_error_rate),
+        "--ai-malformed-rate", str(args.ai_malformed_rate),
+        "--workers", str(args.workers),
+    ]
+    if args.mongomock:
+        command.append("--mongomock")
+    else:
+        command += ["--mongo-url", args.mongo_url]
+
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=subprocess.PIPE, text=True)
+    ready = {}
+
+    def wait_ready():
+        for line in process.stdout:
+            if line.startswith("BENCH_READY "):
+                ready.update(json.loads(line[len("BENCH_READY "):]))
+                return
+
+    waiter = threading.Thread(target=wait_ready, daemon=True)
+    waiter.start()
+    waiter.join(args.boot_timeout)
+    if not ready:
+        process.terminate()
+        raise SystemExit("La stack de benchmark n'a pas démarré (voir la sortie d'erreur ci-dessus)")
+    return process, ready
+
+
+async def drive(args, ready: dict) -> dict:
+    weights = parse_mix(args.mix)
+    names = list(weights)
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+        tokens = []
+        for index in range(min(args.users, 20)):
+            response = await client.post(
+                "/api/auth/login", json={"email": bench_email(index), "password": BENCH_PASSWORD}
+            )
+            response.raise_for_status()
+            tokens.append(response.json()["token"])
+
+        start = time.perf_counter()
+        measure_from = start + args.warmup
+        deadline = measure_from + args.duration
+
+        async def worker(worker_id: int):
+            workload = Workload(client, ready["recette_ids"], tokens, args.users, args.seed + worker_id)
+            rng = random.Random(args.seed * 1000 + worker_id)
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    return
+                name = rng.choices(names, weights=[weights[n] for n in names])[0]
+                try:
+                    response = await SCENARIOS[name](workload)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                elapsed = time.perf_counter() - now
+                if now >= measure_from:
+                    samples[name].append(elapsed)
+                    if failed:
+                        errors[name] += 1
+
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+
+    return summarize(samples, errors, args.duration)
+
+
+def summarize(samples: dict, errors: dict, duration: float) -> dict:
+    routes = {}
+    for name, values in sorted(samples.items()):
+        values.sort()
+        routes[name] = {
+            "count": len(values),
+            "errors": errors.get(name, 0),
+            "rps": round(len(values) / duration, 2),
+            "mean_ms": round(1000 * sum(values) / len(values), 2),
+            "p50_ms": round(1000 * percentile(values, 0.50), 2),
+            "p95_ms": round(1000 * percentile(values, 0.95), 2),
+            "p99_ms": round(1000 * percentile(values, 0.99), 2),
+            "max_ms": round(1000 * values[-1], 2),
+        }
+    everything = sorted(value for values in samples.values() for value in values)
+    total = {
+        "count": len(everything),
+        "errors": sum(errors.values()),
+        "rps": round(len(everything) / duration, 2),
+        "p50_ms": round(1000 * percentile(everything, 0.50), 2),
+        "p95_ms": round(1000 * percentile(everything, 0.95), 2),
+        "p99_ms": round(1000 * percentile(everything, 0.99), 2),
+    }
+    return {"routes": routes, "total": total}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+
+def command_run(args) -> None:
+    process, ready = start_stack(args)
+    try:
+        results = asyncio.run(drive(args, ready))
+    finally:
+        process.terminate()
+        process.wait(10)
+
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "database": "mongomock" if args.mongomock else args.mongo_url,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "mix": args.mix,
+            "ai_latency": args.ai_latency,
+            "ai_error_rate": args.ai_error_rate,
+            "ai_malformed_rate": args.ai_malformed_rate,
+            "seed": args.seed,
+            "dataset": ready["counts"],
+        },
+        **results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    print(f"{'scénario':<10} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'erreurs':>8}")
+    for name, stats in report["routes"].items():
+        print(f"{name:<10} {stats['rps']:>8} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+              f"{stats['p99_ms']:>9} {stats['errors']:>8}")
+    total = report["total"]
+    print(f"{'total':<10} {total['rps']:>8} {total['p50_ms']:>9} {total['p95_ms']:>9} "
+          f"{total['p99_ms']:>9} {total['errors']:>8}")
+    print(f"Rapport écrit dans {args.output}")
+
+
+def command_compare(args) -> None:
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    regressions = []
+    for name, before in baseline["routes"].items():
+        after = current["routes"].get(name)
+        if after is None:
+            continue
+        p95_change = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        rps_change = (after["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0.0
+        flag = ""
+        if p95_change > args.threshold or rps_change < -args.threshold:
+            regressions.append(name)
+            flag = "  <-- régression"
+        print(f"{name:<10} p95 {before['p95_ms']:>8} -> {after['p95_ms']:>8} ({p95_change:+.1%})  "
+              f"req/s {before['rps']:>7} -> {after['rps']:>7} ({rps_change:+.1%}){flag}")
+    if regressions:
+        print(f"Régressions au-delà de {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="boot the stack and run the workload")
+    run.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    run.add_argument("--mongomock", action="store_true", help="in-memory database instead of a local mongod")
+    run.add_argument("--port", type=int, default=8765)
+    run.add_argument("--users", type=int, default=200)
+    run.add_argument("--recipes", type=int, default=2000)
+    run.add_argument("--votes-per-recipe", type=int, default=5)
+    run.add_argument("--comments-per-recipe", type=int, default=3)
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--workers", type=int, default=1, help="server workers (gunicorn mode when > 1)")
+    run.add_argument("--concurrency", type=int, default=32)
+    run.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    run.add_argument("--warmup", type=float, default=5.0, help="seconds discarded before measuring")
+    run.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. browse=50,search=50")
+    run.add_argument("--ai-latency", type=float, default=0.8, help="seconds spent by the fake LLM per call")
+    run.add_argument("--ai-error-rate", type=float, default=0.0, help="fraction of fake LLM calls that fail")
+    run.add_argument("--ai-malformed-rate", type=float, default=0.0, help="fraction of truncated JSON answers")
+    run.add_argument("--boot-timeout", type=float, default=300.0)
+    run.add_argument("--output", default="bench_results.json")
+    run.set_defaults(func=command_run)
+
+    compare = commands.add_parser("compare", help="compare a report against a baseline")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression")
+    compare.set_defaults(func=command_compare)
+    return parser
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Micro-benchmarks of the CPU-bound helpers of server.py.
+
+Covers image processing on phone-size inputs, bcrypt hashing and checking,
+JWT creation and decoding, and the validation/serialization of a 100-recipe
+listing page. Each case is calibrated to run at least ``--min-time`` seconds
+per round; the best of ``--rounds`` rounds is kept as its throughput.
+
+    python -m benchmarks.micro run
+    python -m benchmarks.micro save-baseline
+    python -m benchmarks.micro compare --threshold 0.15
+
+``compare`` exits with status 1 when a case's throughput dropped by more than
+the threshold relative to the stored baseline (benchmarks/baselines/micro.json).
+Baselines are machine specific: regenerate them on the machine that compares.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "micro.json"
+
+
+def load_server():
+    # server.py needs a Mongo URL at import time, but no connection is ever made here
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "recettes_bench")
+    os.environ["TRACING_EXPORTER"] = "none"
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    return server
+
+
+def noisy_image(size, mode: str):
+    from PIL import Image
+
+    noise = Image.effect_noise(size, 48)
+    bands = [noise, noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT), noise.transpose(Image.Transpose.FLIP_TOP_BOTTOM)]
+    if mode == "RGBA":
+        bands.append(Image.new("L", size, 200))
+    return Image.merge(mode, bands)
+
+
+def encode(image, **options) -> bytes:
+    output = io.BytesIO()
+    image.save(output, **options)
+    return output.getvalue()
+
+
+def build_cases(server) -> dict:
+    """name -> zero-argument callable"""
+    from typing import List as TypingList
+
+    import jwt
+    from pydantic import TypeAdapter
+
+    # Phone photos: 12 MP JPEG, a PNG screenshot with alpha, and a HEIC-sized
+    # high quality 4:4:4 JPEG (Pillow cannot decode HEIC without a plugin)
+    photo_jpeg = encode(noisy_image((4032, 3024), "RGB"), format="JPEG", quality=90)
+    screenshot_png = encode(noisy_image((1170, 2532), "RGBA"), format="PNG")
+    heic_like = encode(noisy_image((4284, 5712), "RGB"), format="JPEG", quality=95, subsampling=0)
+
+    password_hash = server.hash_password("mot-de-passe-benchmark")
+    user = {"id": str(uuid.uuid4()), "email": "bench@recettes.fr", "role": "client"}
+    token = server.create_jwt_token(user)
+
+    thumbnail = server.process_image(photo_jpeg)
+    now = datetime.now(timezone.utc)
+
+    def page(with_images: bool) -> List[dict]:
+        return [
+            {
+                "_id": index,
+                "id": str(uuid.uuid4()),
+                "titre": f"Gratin numéro {index}",
+                "ingredients": "\n".join(f"{grams} g d'ingrédient {grams}" for grams in range(8)),
+                "instructions": "\n".join(f"Étape {step}: mélanger puis cuire." for step in range(6)),
+                "auteur_id": user["id"],
+                "auteur_nom": "Cuisinier",
+                "categorie": "Plat principal",
+                "image": thumbnail if with_images else None,
+                "approuve": True,
+                "note_moyenne": 4.2,
+                "nb_votes": 17,
+                "created_at": now,
+            }
+            for index in range(100)
+        ]
+
+    page_text, page_images = page(False), page(True)
+    listing = TypeAdapter(TypingList[server.Recette])
+
+    def serialize(documents):
+        return listing.dump_json([server.Recette(**document) for document in documents])
+
+    return {
+        "process_image_jpeg_12mp": lambda: server.process_image(photo_jpeg),
+        "process_image_png_screenshot": lambda: server.process_image(screenshot_png),
+        "process_image_heic_like_24mp": lambda: server.process_image(heic_like),
+        "hash_password": lambda: server.hash_password("mot-de-passe-benchmark"),
+        "verify_password": lambda: server.verify_password("mot-de-passe-benchmark", password_hash),
+        "create_jwt_token": lambda: server.create_jwt_token(user),
+        "decode_jwt_token": lambda: jwt.decode(token, server.JWT_SECRET, algorithms=["HS256"]),
+        "serialize_page_100": lambda: serialize(page_text),
+        "serialize_page_100_with_images": lambda: serialize(page_images),
+        "decode_base64_image": lambda: base64.b64decode(thumbnail),
+    }
+
+
+def measure(func: Callable, rounds: int, min_time: float) -> dict:
+    func()  # warm caches and lazy imports
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    per_op = [elapsed / number]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        per_op.append((time.perf_counter() - started) / number)
+
+    best = min(per_op)
+    return {
+        "ops_per_sec": round(1 / best, 2),
+        "best_ms": round(best * 1000, 4),
+        "median_ms": round(statistics.median(per_op) * 1000, 4),
+        "iterations": number,
+        "rounds": rounds,
+    }
+
+
+def run_cases(args) -> dict:
+    server = load_server()
+    cases = build_cases(server)
+    results = {}
+    for name, func in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(func, args.rounds, args.min_time)
+        stats = results[name]
+        print(f"{name:<32} {stats['ops_per_sec']:>12} ops/s   best {stats['best_ms']:>10} ms   "
+              f"median {stats['median_ms']:>10} ms", flush=True)
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "cases": results,
+    }
+
+
+def command_run(args) -> None:
+    report = run_cases(args)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+def command_save_baseline(args) -> None:
+    report = run_cases(args)
+    BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    BASELINE_PATH.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Référence enregistrée dans {BASELINE_PATH}")
+
+
+def command_compare(args) -> None:
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["cases"]
+    report = run_cases(args)
+    regressions = []
+    print()
+    for name, stats in report["cases"].items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<32} pas de référence")
+            continue
+        change = (stats["ops_per_sec"] - before["ops_per_sec"]) / before["ops_per_sec"]
+        flag = ""
+        if change < -args.threshold:
+            regressions.append(name)
+            flag = "  <-- régression"
+        print(f"{name:<32} {before['ops_per_sec']:>12} -> {stats['ops_per_sec']:>12} ops/s ({change:+.1%}){flag}")
+    if regressions:
+        print(f"Régressions au-delà de {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(command):
+        command.add_argument("--rounds", type=int, default=5)
+        command.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per round")
+        command.add_argument("--filter", help="only run cases whose name contains this text")
+
+    run = commands.add_parser("run", help="run the micro-benchmarks")
+    add_common(run)
+    run.add_argument("--output", help="write the results to this JSON file")
+    run.set_defaults(func=command_run)
+
+    save = commands.add_parser("save-baseline", help="run and store the results as the baseline")
+    add_common(save)
+    save.set_defaults(func=command_save_baseline)
+
+    compare = commands.add_parser("compare", help="run and compare against the baseline")
+    add_common(compare)
+    compare.add_argument("--baseline", default=str(BASELINE_PATH))
+    compare.add_argument("--threshold", type=float, default=0.10, help="allowed relative throughput drop")
+    compare.set_defaults(func=command_compare)
+    return parser
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
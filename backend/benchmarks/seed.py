@@ -0,0 +1,150 @@
+"""Synthetic data generation for benchmarks.
+
+Everything is derived from a random seed so that two runs at the same scale
+see the same catalog. Users share one bcrypt hash (computed once, at the
+production cost) and have predictable credentials so the load generator can
+log in.
+"""
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+
+import bcrypt
+
+BENCH_PASSWORD = "bench-password"
+CATEGORIES = [
+    "Entrée", "Plat principal", "Dessert", "Boisson", "Apéritif",
+    "Petit-déjeuner", "Goûter", "Sauce", "Autre"
+]
+PLATS = [
+    "Tarte", "Gratin", "Velouté", "Salade", "Quiche", "Risotto", "Clafoutis", "Crumble",
+    "Blanquette", "Tajine", "Soupe", "Cake", "Mousse", "Curry", "Poêlée", "Galette"
+]
+INGREDIENTS = [
+    "tomates", "courgettes", "aubergines", "poireaux", "carottes", "pommes de terre", "oignons",
+    "ail", "champignons", "épinards", "poulet", "saumon", "cabillaud", "lardons", "jambon",
+    "chèvre", "comté", "crème fraîche", "beurre", "œufs", "farine", "sucre", "lait", "chocolat",
+    "pommes", "poires", "fraises", "citron", "riz", "pâtes", "lentilles", "pois chiches", "basilic",
+    "thym", "persil", "curry", "cumin", "miel", "noisettes", "amandes"
+]
+COMMENTAIRES = [
+    "Délicieux, toute la famille a adoré !",
+    "Un peu trop salé à mon goût mais très bon.",
+    "Recette simple et efficace, merci.",
+    "Je l'ai refaite trois fois cette semaine.",
+    "Parfait pour un dîner entre amis."
+]
+
+
+@dataclass
+class SeedConfig:
+    users: int = 200
+    recipes: int = 2000
+    votes_per_recipe: int = 5
+    comments_per_recipe: int = 3
+    pending_ratio: float = 0.05
+    seed: int = 42
+
+
+def bench_email(index: int) -> str:
+    return f"bench-user-{index}@bench-recettes.fr"
+
+
+def search_terms() -> list:
+    """Terms the load generator searches for (they all match seeded recipes)"""
+    return PLATS[:8] + INGREDIENTS[:12]
+
+
+def _recette(rng: random.Random, auteur: dict, created_at: datetime, approuve: bool) -> dict:
+    ingredients = rng.sample(INGREDIENTS, rng.randint(4, 9))
+    titre = f"{rng.choice(PLATS)} aux {ingredients[0]} et {ingredients[1]}"
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "titre": titre,
+        "ingredients": "\n".join(f"{rng.randint(1, 500)} g de {nom}" for nom in ingredients),
+        "instructions": "\n".join(
+            f"Étape {step}: préparer les {rng.choice(ingredients)} puis cuire {rng.randint(5, 40)} minutes."
+            for step in range(1, rng.randint(4, 8))
+        ),
+        "auteur_id": auteur["id"],
+        "auteur_nom": auteur["nom"],
+        "categorie": rng.choice(CATEGORIES),
+        "image": None,
+        "approuve": approuve,
+        "note_moyenne": 0.0,
+        "nb_votes": 0,
+        "version": 1,
+        "created_at": created_at,
+    }
+
+
+async def _insert_batched(collection, documents: list, batch_size: int = 1000) -> None:
+    for start in range(0, len(documents), batch_size):
+        await collection.insert_many(documents[start:start + batch_size], ordered=False)
+
+
+async def seed_database(db, config: SeedConfig) -> dict:
+    """Drop the benchmark collections and fill them with synthetic data"""
+    rng = random.Random(config.seed)
+    now = datetime.now(timezone.utc)
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+    for name in ("users", "recettes", "votes", "commentaires"):
+        await db[name].delete_many({})
+
+    users = [
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "nom": f"Cuisinier {index}",
+            "email": bench_email(index),
+            "role": "admin" if index == 0 else "client",
+            "created_at": now,
+            "password": password_hash,
+        }
+        for index in range(config.users)
+    ]
+
+    recettes, votes, commentaires = [], [], []
+    for index in range(config.recipes):
+        created_at = now - timedelta(minutes=index * 7)
+        recette = _recette(rng, rng.choice(users), created_at, rng.random() >= config.pending_ratio)
+        if recette["approuve"]:
+            voters = rng.sample(users, min(len(users), config.votes_per_recipe))
+            notes = [rng.randint(1, 5) for _ in voters]
+            votes.extend(
+                {
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "recette_id": recette["id"],
+                    "user_id": voter["id"],
+                    "note": note,
+                    "created_at": created_at,
+                }
+                for voter, note in zip(voters, notes)
+            )
+            if notes:
+                recette["note_moyenne"] = sum(notes) / len(notes)
+                recette["nb_votes"] = len(notes)
+            commentaires.extend(
+                {
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "recette_id": recette["id"],
+                    "auteur_nom": rng.choice(users)["nom"],
+                    "commentaire": rng.choice(COMMENTAIRES),
+                    "created_at": created_at + timedelta(minutes=offset),
+                }
+                for offset in range(config.comments_per_recipe)
+            )
+        recettes.append(recette)
+
+    await _insert_batched(db.users, users)
+    await _insert_batched(db.recettes, recettes)
+    await _insert_batched(db.votes, votes)
+    await _insert_batched(db.commentaires, commentaires)
+
+    return {
+        "users": len(users),
+        "recettes": len(recettes),
+        "votes": len(votes),
+        "commentaires": len(commentaires),
+    }
@@ -0,0 +1,151 @@
+"""Boot server.py as a local benchmark stack.
+
+Runs the real FastAPI app under uvicorn against either a local mongod or an
+in-memory mongomock-motor database, with the fake LLM provider instead of
+Gemini and rate limiting disabled. The database is seeded on startup, then a
+single ``BENCH_READY <json>`` line is printed on stdout for the load generator.
+
+With ``--workers N`` (N > 1) the stack runs the multi-worker deployment mode
+instead: the database is seeded first, then gunicorn.conf.py is started with
+N uvicorn workers sharing state through COORDINATION_BACKEND (mongo unless
+set). This mode needs a real mongod.
+
+    python -m benchmarks.stack --mongomock --recipes 2000 --port 8765
+    python -m benchmarks.stack --workers 4 --port 8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="recettes_bench")
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory mongomock-motor database")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--recipes", type=int, default=2000)
+    parser.add_argument("--votes-per-recipe", type=int, default=5)
+    parser.add_argument("--comments-per-recipe", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ai-latency", type=float, default=0.8, help="seconds spent by the fake LLM per call")
+    parser.add_argument("--ai-error-rate", type=float, default=0.0)
+    parser.add_argument("--ai-malformed-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1, help="run under gunicorn with this many workers")
+    return parser
+
+
+async def seed_and_describe(db, config) -> dict:
+    from benchmarks.seed import seed_database
+
+    started = time.perf_counter()
+    counts = await seed_database(db, config)
+    recette_ids = await db.recettes.distinct("id", {"approuve": True})
+    return {
+        "counts": counts,
+        "seed_seconds": round(time.perf_counter() - started, 2),
+        "recette_ids": recette_ids[:1000],
+    }
+
+
+def use_database(module, db) -> None:
+    """Point ``module.db`` and every object built from it (jobs, caches, coordination) at ``db``"""
+    previous = module.db
+    module.db = db
+    pending = list(vars(module).values())
+    while pending:
+        singleton = pending.pop()
+        if getattr(singleton, "db", None) is previous:
+            singleton.db = db
+            # Nested helpers built from the same database, such as coordination's rate limiter
+            pending.extend(getattr(singleton, "__dict__", {}).values())
+
+
+def run_workers(args, config) -> None:
+    """Seed from this process, then exec gunicorn in its place"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    if args.mongomock:
+        sys.exit("--workers ne fonctionne pas avec --mongomock (la base en mémoire n'est pas partagée)")
+    os.environ.setdefault("COORDINATION_BACKEND", "mongo")
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    os.environ["BIND"] = f"{args.host}:{args.port}"
+
+    async def seed():
+        client = AsyncIOMotorClient(args.mongo_url)
+        try:
+            return await seed_and_describe(client[args.db_name], config)
+        finally:
+            client.close()
+
+    ready = asyncio.run(seed())
+    print("BENCH_READY " + json.dumps(ready), flush=True)
+    os.chdir(BACKEND_DIR)
+    os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "server:app"])
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db_name
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["AI_PROVIDER"] = "fake"
+    os.environ["FAKE_AI_LATENCY_MS"] = str(args.ai_latency * 1000)
+    os.environ["FAKE_AI_ERROR_RATE"] = str(args.ai_error_rate)
+    os.environ["FAKE_AI_MALFORMED_RATE"] = str(args.ai_malformed_rate)
+    os.environ["FAKE_AI_SEED"] = str(args.seed)
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    from benchmarks.seed import SeedConfig
+
+    config = SeedConfig(
+        users=args.users,
+        recipes=args.recipes,
+        votes_per_recipe=args.votes_per_recipe,
+        comments_per_recipe=args.comments_per_recipe,
+        seed=args.seed
+    )
+    if args.workers > 1:
+        run_workers(args, config)
+        return
+
+    import uvicorn
+    import server
+
+    if args.mongomock:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--mongomock nécessite le paquet mongomock-motor (pip install mongomock-motor)")
+        server.client = AsyncMongoMockClient()
+        use_database(server, server.client[args.db_name])
+        # mongomock has no change streams
+        server.CHANGE_STREAMS_ENABLED = False
+
+    ready = {}
+
+    async def seed():
+        ready.update(await seed_and_describe(server.db, config))
+
+    async def announce():
+        print("BENCH_READY " + json.dumps(ready), flush=True)
+
+    # Seed before the other startup hooks, so the indexes, backfills and
+    # in-memory caches they build cover the seeded catalog
+    server.app.router.on_startup.insert(0, seed)
+    server.app.router.on_startup.append(announce)
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Bulk export and import of the recipe catalog as NDJSON.
+
+The export streams one JSON recipe per line straight from a Motor cursor,
+optionally gzip-compressed on the fly, so memory stays constant whatever the
+catalog size. The import reads NDJSON (gzip detected from the magic bytes),
+validates each line with the ``Recette`` model and inserts batches with an
+unordered ``insert_many``; the unique index on ``recettes.id`` turns recipes
+that already exist into reported duplicates, which makes an import safe to
+replay.
+
+Both are exposed as admin endpoints by server.py and as a command line tool
+working directly against MONGO_URL/DB_NAME:
+
+    python -m catalog export recettes.ndjson.gz --approuvees
+    python -m catalog import recettes.ndjson.gz
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Callable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from ingredients import ingredient_fields
+from models import Recette
+
+GZIP_MAGIC = b"\x1f\x8b"
+DUPLICATE_KEY = 11000
+MAX_REPORTED_ERRORS = 100
+
+# Derived fields are recomputed on import rather than trusted
+EXPORT_PROJECTION = {"_id": 0, "ingredient_tokens": 0, "ingredient_tokens_version": 0, "votes_archives": 0}
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} non sérialisable")
+
+
+def error_message(error: Exception) -> str:
+    """Short message for a rejected line: first validation error only"""
+    if isinstance(error, ValidationError):
+        first = error.errors()[0]
+        return f"{'.'.join(str(part) for part in first['loc'])}: {first['msg']}"
+    return str(error)
+
+
+async def export_ndjson(db, query: Optional[dict] = None, compress: bool = False,
+                        batch_size: int = 500) -> AsyncIterator[bytes]:
+    """NDJSON chunks of the matching recipes, one chunk per cursor batch"""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    lines = []
+    async for recette in db.recettes.find(query or {}, EXPORT_PROJECTION).batch_size(batch_size):
+        lines.append(json.dumps(recette, default=_default, ensure_ascii=False))
+        if len(lines) >= batch_size:
+            chunk = ("\n".join(lines) + "\n").encode()
+            lines = []
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = ("\n".join(lines) + "\n").encode() if lines else b""
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Lines of a byte stream, gunzipped when it starts with the gzip magic"""
+    decompressor = None
+    pending = b""
+    first = True
+    async for chunk in chunks:
+        if first and chunk:
+            first = False
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(wbits=31)
+        if decompressor:
+            chunk = decompressor.decompress(chunk)
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if decompressor:
+        pending += decompressor.flush()
+    for line in pending.split(b"\n"):
+        yield line
+
+
+async def insert_batch(db, batch: List[dict]) -> Tuple[List[dict], int, List[Tuple[int, str]]]:
+    """Unordered ``insert_many``: (inserted recipes, duplicates, [(batch index, error)])"""
+    try:
+        await db.recettes.insert_many(batch, ordered=False)
+        return batch, 0, []
+    except BulkWriteError as e:
+        failures = e.details["writeErrors"]
+        failed = {failure["index"] for failure in failures}
+        duplicates = sum(1 for failure in failures if failure["code"] == DUPLICATE_KEY)
+        errors = [(failure["index"], failure["errmsg"]) for failure in failures if failure["code"] != DUPLICATE_KEY]
+        return [recette for index, recette in enumerate(batch) if index not in failed], duplicates, errors
+
+
+async def import_ndjson(db, lines: AsyncIterable[bytes], model: Callable, batch_size: int = 1000,
+                        on_insert: Optional[Callable[[List[dict]], None]] = None) -> dict:
+    """Validate and insert recipes, one ``insert_many`` per batch
+
+    ``on_insert`` receives the recipes of each batch that were actually inserted.
+    """
+    started = time.perf_counter()
+    report = {"importees": 0, "doublons": 0, "invalides": 0, "erreurs": []}
+
+    def error(numero: int, message: str) -> None:
+        report["invalides"] += 1
+        if len(report["erreurs"]) < MAX_REPORTED_ERRORS:
+            report["erreurs"].append({"ligne": numero, "erreur": message})
+
+    async def flush(batch: List[dict], numeros: List[int]) -> None:
+        inserted, duplicates, errors = await insert_batch(db, batch)
+        report["importees"] += len(inserted)
+        report["doublons"] += duplicates
+        for index, message in errors:
+            error(numeros[index], message)
+        if on_insert and inserted:
+            on_insert(inserted)
+
+    batch, numeros = [], []
+    numero = 0
+    async for line in lines:
+        numero += 1
+        if not line.strip():
+            continue
+        try:
+            recette = model(**json.loads(line)).dict()
+        except (ValueError, TypeError) as e:
+            # ValidationError is a ValueError, like json.JSONDecodeError
+            error(numero, error_message(e))
+            continue
+        recette.update(ingredient_fields(recette["ingredients"]))
+        batch.append(recette)
+        numeros.append(numero)
+        if len(batch) >= batch_size:
+            await flush(batch, numeros)
+            batch, numeros = [], []
+    if batch:
+        await flush(batch, numeros)
+
+    report["duree_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+async def _read_file(path: str, chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+    with open(path, "rb") if path != "-" else sys.stdin.buffer as source:
+        while chunk := await asyncio.to_thread(source.read, chunk_size):
+            yield chunk
+
+
+def database_from_env():
+    """Database of MONGO_URL/DB_NAME (backend/.env is read like server.py does)"""
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+    return AsyncIOMotorClient(os.environ["MONGO_URL"])[os.environ["DB_NAME"]]
+
+
+async def command_export(args) -> None:
+    db = database_from_env()
+    query = {"approuve": True} if args.approuvees else {}
+    compress = args.output.endswith(".gz")
+    count = 0
+    with open(args.output, "wb") if args.output != "-" else sys.stdout.buffer as target:
+        async for chunk in export_ndjson(db, query, compress=compress):
+            target.write(chunk)
+            count += 1
+    print(f"Export terminé: {args.output} ({count} blocs)", file=sys.stderr)
+
+
+async def command_import(args) -> None:
+    db = database_from_env()
+    await db.recettes.create_index("id", unique=True)
+    report = await import_ndjson(db, iter_lines(_read_file(args.input)), Recette, batch_size=args.batch_size)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="write the catalog as NDJSON (.gz compresses)")
+    export.add_argument("output", help="target file, - for stdout")
+    export.add_argument("--approuvees", action="store_true", help="approved recipes only")
+    export.set_defaults(func=command_export)
+
+    load = commands.add_parser("import", help="insert recipes from NDJSON (gzip detected)")
+    load.add_argument("input", help="source file, - for stdin")
+    load.add_argument("--batch-size", type=int, default=1000)
+    load.set_defaults(func=command_import)
+    return parser
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Change-stream driven invalidation and live updates.
+
+``ChangeStreamWatcher`` follows the Mongo change stream of the recipe, vote
+and comment collections, so it also sees writes made by other workers. Each
+change is normalized into an event and published on the in-process
+``ChangeBus``. Cache owners subscribe there to invalidate, and live-update
+streams (SSE) receive the client-facing events derived from them.
+
+Each worker persists its own resume token in ``db.change_stream_state``,
+keyed by ``worker_id`` (the hostname by default) and its gunicorn slot
+(WORKER_SLOT, set by ``gunicorn.conf.py``), so positions of different workers
+never overwrite each other and a recycled worker resumes from its
+predecessor's. Without a slot the pid is used: a restarted process starts from
+now, which is fine since it rebuilds its caches at startup. Tokens not saved
+for ``STATE_TTL_DAYS`` are reaped by a TTL index. If the history is gone,
+a ``reset`` event tells subscribers to drop everything. Change streams need a
+replica set (Atlas always is one); on a standalone mongod the watcher logs a
+warning and stays idle.
+"""
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+CHANGE_STREAM_NOT_SUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+STATE_TTL_DAYS = 7
+
+
+class ChangeBus:
+    """In-process fan-out of change events (to caches) and live events (to clients)"""
+
+    def __init__(self):
+        self._subscribers = []
+        self._streams = {}
+
+    def subscribe(self, callback: Callable, collections: Optional[Iterable[str]] = None) -> None:
+        """Call ``callback(event)`` (sync or async) for changes on these collections (all if None)"""
+        self._subscribers.append((callback, set(collections) if collections else None))
+
+    async def publish(self, event: dict) -> None:
+        for callback, collections in self._subscribers:
+            if collections is not None and event["collection"] not in collections and event["operation"] != "reset":
+                continue
+            try:
+                result = callback(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Erreur dans un abonné aux changements (%s)", getattr(callback, "__name__", callback))
+
+    def open_stream(self, predicate: Callable[[dict], bool], maxsize: int = 100) -> asyncio.Queue:
+        """Queue receiving the live events accepted by ``predicate``"""
+        queue = asyncio.Queue(maxsize=maxsize)
+        self._streams[queue] = predicate
+        return queue
+
+    def close_stream(self, queue: asyncio.Queue) -> None:
+        self._streams.pop(queue, None)
+
+    def broadcast(self, live_event: dict) -> None:
+        for queue, predicate in list(self._streams.items()):
+            if not predicate(live_event):
+                continue
+            if queue.full():
+                # Slow client: drop its oldest event rather than block everyone
+                queue.get_nowait()
+            queue.put_nowait(live_event)
+
+    @property
+    def listeners(self) -> int:
+        return len(self._streams)
+
+
+def normalize_change(change: dict) -> dict:
+    """Reduce a raw change document to what subscribers need"""
+    collection = change["ns"]["coll"]
+    document = change.get("fullDocument") or {}
+    document.pop("_id", None)
+    recette_id = document.get("id") if collection == "recettes" else document.get("recette_id")
+    update = change.get("updateDescription") or {}
+    return {
+        "collection": collection,
+        "operation": change["operationType"],
+        "id": document.get("id"),
+        "object_id": (change.get("documentKey") or {}).get("_id"),
+        "recette_id": recette_id,
+        "updated_fields": sorted(update.get("updatedFields", {})),
+        "document": document,
+    }
+
+
+class ChangeStreamWatcher:
+    def __init__(self, db, bus: ChangeBus, collections=("recettes", "votes", "commentaires"),
+                 name: str = "recettes", worker_id: Optional[str] = None, save_interval: float = 5.0,
+                 retry_delay: float = 5.0):
+        self.db = db
+        self.bus = bus
+        self.collections = list(collections)
+        self.name = name
+        self.worker_id = worker_id
+        self.save_interval = save_interval
+        self.retry_delay = retry_delay
+        self.available = False
+        self._resume_token = None
+        self._last_saved = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def state_key(self) -> str:
+        # Resolved lazily: the slot and pid are only known once the worker has forked
+        worker = self.worker_id or socket.gethostname()
+        return f"{self.name}:{worker}:{os.environ.get('WORKER_SLOT') or os.getpid()}"
+
+    async def create_indexes(self) -> None:
+        await self.db.change_stream_state.create_index("name", unique=True)
+        await self.db.change_stream_state.create_index("updated_at", expireAfterSeconds=STATE_TTL_DAYS * 86400)
+
+    @property
+    def pipeline(self) -> list:
+        return [
+            {"$match": {"ns.coll": {"$in": self.collections}}},
+            # Inline base64 images are useless to subscribers and heavy to ship
+            {"$project": {"fullDocument.image": 0, "updateDescription.updatedFields.image": 0}},
+        ]
+
+    async def _load_token(self):
+        state = await self.db.change_stream_state.find_one({"name": self.state_key})
+        return state["resume_token"] if state else None
+
+    async def _save_token(self, force: bool = False) -> None:
+        if self._resume_token is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_saved < self.save_interval:
+            return
+        self._last_saved = now
+        await self.db.change_stream_state.update_one(
+            {"name": self.state_key},
+            {"$set": {"resume_token": self._resume_token, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+    async def _follow(self) -> None:
+        options = {"full_document": "updateLookup"}
+        if self._resume_token is not None:
+            options["resume_after"] = self._resume_token
+        async with self.db.watch(self.pipeline, **options) as stream:
+            self.available = True
+            logger.info("Suivi des changements actif sur %s", ", ".join(self.collections))
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                await self.bus.publish(normalize_change(change))
+                await self._save_token()
+
+    async def _run(self) -> None:
+        self._resume_token = await self._load_token()
+        while True:
+            try:
+                await self._follow()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_NOT_SUPPORTED:
+                    logger.warning("Change streams indisponibles (replica set requis), invalidation inter-workers désactivée")
+                    self.available = False
+                    return
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Historique du change stream perdu, reprise depuis maintenant")
+                    self._resume_token = None
+                    await self.db.change_stream_state.delete_one({"name": self.state_key})
+                    await self.bus.publish({
+                        "collection": "*", "operation": "reset", "id": None, "object_id": None,
+                        "recette_id": None, "updated_fields": [], "document": {},
+                    })
+                    continue
+                logger.exception("Erreur du change stream, nouvelle tentative dans %ss", self.retry_delay)
+            except PyMongoError:
+                logger.exception("Erreur du change stream, nouvelle tentative dans %ss", self.retry_delay)
+            self.available = False
+            await asyncio.sleep(self.retry_delay)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._save_token(force=True)
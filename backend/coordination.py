@@ -0,0 +1,247 @@
+"""Shared state for multi-worker deployments.
+
+Job locks, job freshness flags and rate-limit buckets go through a
+coordination backend so that every worker sees the same state:
+
+- ``LocalCoordination``: in-process, for a single worker (default)
+- ``MongoCoordination``: stored in the application database, no extra service
+- ``RedisCoordination``: any Redis-compatible server (needs the ``redis`` package)
+
+The backend is chosen with COORDINATION_BACKEND (local, mongo or redis) and
+REDIS_URL. Cached values must be JSON-compatible; callers must not mutate
+values returned by ``get``.
+"""
+import asyncio
+import json
+import os
+import secrets
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Any, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from rate_limit import MemoryRateLimitBackend, MongoRateLimitBackend
+
+
+class LockNotAcquired(Exception):
+    """Another worker holds the lock"""
+
+
+class CoordinationBackend(ABC):
+    name = "base"
+    rate_limiter = None
+
+    async def setup(self) -> None:
+        """Create indexes or connections, called once per worker at startup"""
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Cached value, None when missing or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """Cache ``value`` for ``ttl`` seconds"""
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        """Drop cached values"""
+
+    @abstractmethod
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        """Return an owner token if the lock was taken, None if someone else holds it"""
+
+    @abstractmethod
+    async def release_lock(self, name: str, token: str) -> None:
+        """Release the lock if ``token`` still owns it"""
+
+    @asynccontextmanager
+    async def lock(self, name: str, ttl: float = 30.0, wait: float = 0.0, poll: float = 0.05):
+        """Hold a lock for the block; raise LockNotAcquired after waiting ``wait`` seconds"""
+        deadline = time.monotonic() + wait
+        token = await self.acquire_lock(name, ttl)
+        while token is None and time.monotonic() < deadline:
+            await asyncio.sleep(poll)
+            token = await self.acquire_lock(name, ttl)
+        if token is None:
+            raise LockNotAcquired(name)
+        try:
+            yield token
+        finally:
+            await self.release_lock(name, token)
+
+
+class LocalCoordination(CoordinationBackend):
+    name = "local"
+
+    def __init__(self):
+        self.rate_limiter = MemoryRateLimitBackend()
+        self._cache = {}
+        self._locks = {}
+
+    async def get(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._cache[key]
+            return None
+        return value
+
+    async def set(self, key, value, ttl):
+        self._cache[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self._cache.pop(key, None)
+
+    async def acquire_lock(self, name, ttl):
+        now = time.monotonic()
+        holder = self._locks.get(name)
+        if holder is not None and holder[1] > now:
+            return None
+        token = secrets.token_hex(8)
+        self._locks[name] = (token, now + ttl)
+        return token
+
+    async def release_lock(self, name, token):
+        holder = self._locks.get(name)
+        if holder is not None and holder[0] == token:
+            del self._locks[name]
+
+
+class MongoCoordination(CoordinationBackend):
+    name = "mongo"
+
+    def __init__(self, db):
+        self.db = db
+        self.rate_limiter = MongoRateLimitBackend(db)
+
+    async def setup(self):
+        await self.db.coord_cache.create_index("key", unique=True)
+        await self.db.coord_cache.create_index("expires_at", expireAfterSeconds=0)
+        await self.db.coord_locks.create_index("key", unique=True)
+        await self.rate_limiter.create_indexes()
+
+    async def get(self, key):
+        entry = await self.db.coord_cache.find_one(
+            {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"_id": 0, "value": 1}
+        )
+        return entry["value"] if entry else None
+
+    async def set(self, key, value, ttl):
+        await self.db.coord_cache.update_one(
+            {"key": key},
+            {"$set": {"value": value, "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+
+    async def delete(self, *keys):
+        await self.db.coord_cache.delete_many({"key": {"$in": list(keys)}})
+
+    async def acquire_lock(self, name, ttl):
+        now = datetime.now(timezone.utc)
+        token = secrets.token_hex(8)
+        try:
+            # Matches only a missing or expired lock; a live one makes the upsert collide
+            await self.db.coord_locks.update_one(
+                {"key": name, "expires_at": {"$lte": now}},
+                {"$set": {"owner": token, "expires_at": now + timedelta(seconds=ttl)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return None
+        return token
+
+    async def release_lock(self, name, token):
+        await self.db.coord_locks.delete_one({"key": name, "owner": token})
+
+
+class RedisRateLimitBackend:
+    """Token bucket evaluated atomically in a Lua script"""
+
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, redis):
+        self._script = redis.register_script(self.SCRIPT)
+
+    async def hit(self, key, capacity, refill_rate):
+        allowed, tokens = await self._script(keys=[f"rl:{key}"], args=[capacity, refill_rate, time.time()])
+        if allowed:
+            return True, 0.0
+        return False, (1 - float(tokens)) / refill_rate
+
+
+class RedisCoordination(CoordinationBackend):
+    name = "redis"
+
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("COORDINATION_BACKEND=redis nécessite le paquet redis (pip install redis)") from e
+        self.redis = redis_asyncio.from_url(url, decode_responses=True)
+        self.rate_limiter = RedisRateLimitBackend(self.redis)
+        self._release = self.redis.register_script(self.RELEASE_SCRIPT)
+
+    async def close(self):
+        await self.redis.aclose()
+
+    async def get(self, key):
+        value = await self.redis.get(f"cache:{key}")
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key, value, ttl):
+        await self.redis.set(f"cache:{key}", json.dumps(value, default=str), px=int(ttl * 1000))
+
+    async def delete(self, *keys):
+        if keys:
+            await self.redis.delete(*(f"cache:{key}" for key in keys))
+
+    async def acquire_lock(self, name, ttl):
+        token = secrets.token_hex(8)
+        acquired = await self.redis.set(f"lock:{name}", token, nx=True, px=int(ttl * 1000))
+        return token if acquired else None
+
+    async def release_lock(self, name, token):
+        await self._release(keys=[f"lock:{name}"], args=[token])
+
+
+def coordination_from_env(db) -> CoordinationBackend:
+    kind = os.environ.get("COORDINATION_BACKEND", "local")
+    if kind == "mongo":
+        return MongoCoordination(db)
+    if kind == "redis":
+        return RedisCoordination(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    if kind != "local":
+        raise ValueError(f"COORDINATION_BACKEND inconnu: {kind}")
+    return LocalCoordination()
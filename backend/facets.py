@@ -0,0 +1,78 @@
+"""Faceted counts for the recipe filter sidebar.
+
+One ``$facet`` aggregation returns, for the current search, the number of
+recipes per category and per rating bucket instead of one ``count_documents``
+per category. The category facet ignores the selected category, so the
+sidebar keeps showing the alternatives; the rating buckets and the total
+honour it.
+
+Results are cached in memory per worker. Approvals, deletions and edits of
+titles, ingredients or categories (seen locally or through the change stream)
+clear the cache; rating changes only show up after ``ttl`` seconds.
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+# A recipe rated 3.6 falls in bucket "3", only a perfect 5.0 in bucket "5";
+# unrated recipes have note_moyenne 0
+RATING_BOUNDARIES = [0, 1, 2, 3, 4, 5, 5.01]
+INVALIDATING_FIELDS = {"approuve", "categorie", "titre", "ingredients"}
+
+
+class FacetCounter:
+    def __init__(self, db, categories: List[str], ttl: float = 60.0, max_entries: int = 1000):
+        self.db = db
+        self.categories = categories
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache: Dict[Tuple, Tuple[float, dict]] = {}
+
+    def invalidate(self) -> None:
+        self._cache.clear()
+
+    def apply_change(self, event: dict) -> None:
+        """Change-bus subscriber for the recettes collection"""
+        if event["operation"] == "update" and not INVALIDATING_FIELDS & set(event["updated_fields"]):
+            return
+        self.invalidate()
+
+    async def _aggregate(self, base_filter: dict, categorie: Optional[str]) -> dict:
+        selected = [{"$match": {"categorie": categorie}}] if categorie else []
+        pipeline = [
+            {"$match": base_filter},
+            {"$facet": {
+                "categories": [{"$group": {"_id": "$categorie", "count": {"$sum": 1}}}],
+                "notes": selected + [{"$bucket": {
+                    "groupBy": "$note_moyenne",
+                    "boundaries": RATING_BOUNDARIES,
+                    "default": 0,
+                    "output": {"count": {"$sum": 1}}
+                }}],
+                "total": selected + [{"$count": "count"}]
+            }}
+        ]
+        result = (await self.db.recettes.aggregate(pipeline).to_list(1))[0]
+
+        categories = {name: 0 for name in self.categories}
+        for groupe in result["categories"]:
+            categories[groupe["_id"]] = groupe["count"]
+        notes = {"non_notees": 0, **{str(bucket): 0 for bucket in RATING_BOUNDARIES[1:-1]}}
+        for bucket in result["notes"]:
+            notes["non_notees" if bucket["_id"] == 0 else str(int(bucket["_id"]))] += bucket["count"]
+        return {
+            "total": result["total"][0]["count"] if result["total"] else 0,
+            "categories": categories,
+            "notes": notes
+        }
+
+    async def counts(self, base_filter: dict, categorie: Optional[str] = None, cache_key: Tuple = ()) -> dict:
+        key = (cache_key, categorie)
+        entry = self._cache.get(key)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        facettes = await self._aggregate(base_filter, categorie)
+        if len(self._cache) >= self.max_entries:
+            self._cache.clear()
+        self._cache[key] = (now + self.ttl, facettes)
+        return facettes
@@ -0,0 +1,145 @@
+"""Garbage collection of documents whose recipe no longer exists.
+
+Recipes used to be deleted without their votes and comments, and derived
+collections (rankings, similarity lists) can also outlive a recipe. The
+collector walks each collection grouped by ``recette_id`` (an index scan on
+the ``recette_id`` indexes), checks a batch of ids against ``db.recettes``,
+and deletes the documents of the missing ones, pausing between batches so
+that a large cleanup does not starve the application's queries.
+
+In dry-run mode nothing is deleted; the report gives the number of orphaned
+documents per collection and an estimate of the reclaimable bytes (from the
+collection's average document size).
+
+Images are stored inline in the recipe documents, so they go with them and
+never become orphans.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pymongo.errors import PyMongoError
+
+from coordination import CoordinationBackend, LockNotAcquired
+
+logger = logging.getLogger(__name__)
+
+ORPHAN_COLLECTIONS = (
+    "votes", "commentaires", "votes_archive", "commentaires_archive", "recette_rankings", "recette_similaires"
+)
+
+
+class OrphanCollector:
+    def __init__(self, db, coordination: CoordinationBackend, collections=ORPHAN_COLLECTIONS,
+                 batch_size: int = 500, pause: float = 0.1, interval: float = 24 * 3600):
+        self.db = db
+        self.coordination = coordination
+        self.collections = list(collections)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.last_report: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def create_indexes(self) -> None:
+        # Also serve the per-recipe reads (comment listing, rating recomputation)
+        await self.db.votes.create_index("recette_id")
+        await self.db.commentaires.create_index([("recette_id", 1), ("created_at", -1)])
+
+    async def _average_size(self, collection: str) -> Optional[float]:
+        try:
+            stats = await self.db.command({"collStats": collection})
+        except (PyMongoError, NotImplementedError):
+            return None
+        return stats.get("avgObjSize")
+
+    async def _collect_batch(self, collection: str, counts: dict, dry_run: bool) -> List[str]:
+        existing = set(await self.db.recettes.distinct("id", {"id": {"$in": list(counts)}}))
+        missing = [recette_id for recette_id in counts if recette_id not in existing]
+        if missing and not dry_run:
+            await self.db[collection].delete_many({"recette_id": {"$in": missing}})
+        return missing
+
+    async def _collect(self, collection: str, dry_run: bool) -> dict:
+        pipeline = [
+            {"$sort": {"recette_id": 1}},
+            {"$group": {"_id": "$recette_id", "count": {"$sum": 1}}}
+        ]
+        recettes_disparues, orphelins = 0, 0
+        counts = {}
+
+        async def flush():
+            nonlocal recettes_disparues, orphelins
+            missing = await self._collect_batch(collection, counts, dry_run)
+            recettes_disparues += len(missing)
+            orphelins += sum(counts[recette_id] for recette_id in missing)
+            counts.clear()
+            await asyncio.sleep(self.pause)
+
+        async for groupe in self.db[collection].aggregate(pipeline, allowDiskUse=True):
+            counts[groupe["_id"]] = groupe["count"]
+            if len(counts) >= self.batch_size:
+                await flush()
+        if counts:
+            await flush()
+
+        average_size = await self._average_size(collection)
+        return {
+            "documents_orphelins": orphelins,
+            "recettes_disparues": recettes_disparues,
+            "octets_estimes": round(orphelins * average_size) if average_size else None
+        }
+
+    async def collect(self, dry_run: bool = True) -> dict:
+        """Find (and unless ``dry_run``, delete) orphaned documents in every collection"""
+        started = time.perf_counter()
+        report = {
+            "dry_run": dry_run,
+            "started_at": datetime.now(timezone.utc),
+            "collections": {}
+        }
+        for collection in self.collections:
+            report["collections"][collection] = await self._collect(collection, dry_run)
+        report["duree_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        total = sum(stats["documents_orphelins"] for stats in report["collections"].values())
+        logger.info(
+            "Nettoyage des orphelins%s: %d documents en %.0f ms",
+            " (simulation)" if dry_run else "", total, report["duree_ms"]
+        )
+        self.last_report = report
+        return report
+
+    async def run_once(self, dry_run: bool = False) -> Optional[dict]:
+        """Collect unless another worker is already doing it (None then)"""
+        try:
+            async with self.coordination.lock("orphan-gc", ttl=3600.0):
+                return await self.collect(dry_run=dry_run)
+        except LockNotAcquired:
+            return None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # A fresh marker keeps the other workers from repeating the daily run
+                if not await self.coordination.get("orphan-gc:fresh"):
+                    if await self.run_once() is not None:
+                        await self.coordination.set("orphan-gc:fresh", True, ttl=self.interval * 0.9)
+            except Exception:
+                logger.exception("Erreur lors du nettoyage des orphelins")
+            await asyncio.sleep(min(self.interval, 3600.0))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
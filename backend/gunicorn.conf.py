@@ -0,0 +1,55 @@
+"""Gunicorn configuration for the multi-worker deployment mode.
+
+    cd backend && gunicorn -c gunicorn.conf.py server:app
+
+One uvicorn worker per core by default (WEB_CONCURRENCY overrides it). Shared
+state must go through a shared coordination backend, so this mode expects
+COORDINATION_BACKEND=mongo or redis; Prometheus metrics are aggregated across
+workers through PROMETHEUS_MULTIPROC_DIR.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth (image processing buffers)
+max_requests = int(os.environ.get("MAX_REQUESTS", "10000"))
+max_requests_jitter = 1000
+accesslog = "-" if os.environ.get("ACCESS_LOG", "false").lower() == "true" else None
+
+if workers > 1 and os.environ.get("COORDINATION_BACKEND", "local") == "local":
+    raise RuntimeError(
+        "Plusieurs workers nécessitent un état partagé: définissez COORDINATION_BACKEND=mongo ou redis"
+    )
+
+# Must be set before the workers import prometheus_client
+if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="recettes-metrics-")
+
+
+def on_starting(server):
+    # Start from a clean directory, stale files would be aggregated otherwise
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def pre_fork(server, worker):
+    # Stable slot per worker, reused by its replacement: keys the change stream resume token
+    taken = {getattr(other, "slot", None) for other in server.WORKERS.values()}
+    worker.slot = min(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    os.environ["WORKER_SLOT"] = str(worker.slot)
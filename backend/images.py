@@ -0,0 +1,31 @@
+"""Recipe image pipeline.
+
+Kept free of the web stack so that bulk tools can run it in worker
+processes (see ingest.py) without importing server.py.
+"""
+import base64
+import io
+
+from PIL import Image
+
+MAX_SIZE = (800, 600)
+
+
+def compress_image(image_data: bytes) -> str:
+    """Resize to fit MAX_SIZE, re-encode as JPEG and return it base64-encoded"""
+    img = Image.open(io.BytesIO(image_data))
+    
+    # Resize if too large
+    img.thumbnail(MAX_SIZE, Image.Resampling.LANCZOS)
+    
+    # Convert to RGB if needed
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    
+    # Save to bytes with compression
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=80, optimize=True)
+    output.seek(0)
+    
+    # Convert to base64
+    return base64.b64encode(output.getvalue()).decode('utf-8')
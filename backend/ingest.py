@@ -0,0 +1,153 @@
+"""Bulk ingestion of a directory of recipe JSON files and their images.
+
+Each ``*.json`` file holds one recipe object or a list of them, with the
+fields of ``POST /api/recettes`` (titre, ingredients, instructions,
+categorie). ``image`` names an image file relative to the JSON file; a
+single-recipe file without it picks up a sibling image with the same stem
+(``tarte.json`` + ``tarte.jpg``).
+
+Recipes are validated first, then their images go through the same
+``compress_image`` pipeline as the upload endpoint, spread over a process
+pool. While one batch is being written with an unordered ``insert_many``, the
+images of the next batch are already being processed. Progress and the final
+report give the throughput in recipes per second.
+
+    python -m ingest ./catalogue --auteur admin@recettes.com --approuve --workers 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from catalog import MAX_REPORTED_ERRORS, database_from_env, error_message, insert_batch
+from images import compress_image
+from ingredients import ingredient_fields
+from models import Recette
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+
+
+def load_image(path: str) -> str:
+    """Read and compress one image (runs in a pool worker)"""
+    return compress_image(Path(path).read_bytes())
+
+
+def read_recettes(path: Path, label: str) -> Iterator[Tuple[str, dict, Optional[Path]]]:
+    """(source label, recipe fields, image path) for every recipe of one JSON file"""
+    content = json.loads(path.read_text(encoding="utf-8"))
+    recettes = content if isinstance(content, list) else [content]
+    for position, recette in enumerate(recettes):
+        image = recette.pop("image", None) if isinstance(recette, dict) else None
+        if image:
+            image = path.parent / image
+        elif not isinstance(content, list):
+            image = next((path.with_suffix(suffix) for suffix in IMAGE_SUFFIXES
+                          if path.with_suffix(suffix).exists()), None)
+        yield f"{label}[{position}]" if isinstance(content, list) else label, recette, image
+
+
+async def ingest(db, directory: Path, model: Callable, defaults: dict, workers: Optional[int] = None,
+                 batch_size: int = 200, progress: Optional[Callable[[dict], None]] = None) -> dict:
+    started = time.perf_counter()
+    report = {"importees": 0, "doublons": 0, "invalides": 0, "images": 0, "erreurs": []}
+
+    def error(label: str, message: str) -> None:
+        report["invalides"] += 1
+        if len(report["erreurs"]) < MAX_REPORTED_ERRORS:
+            report["erreurs"].append({"source": label, "erreur": message})
+
+    # Validate everything up front so that no CPU is spent on images of invalid recipes
+    valid: List[Tuple[str, dict, Optional[Path]]] = []
+    for path in sorted(directory.rglob("*.json")):
+        try:
+            entries = list(read_recettes(path, str(path.relative_to(directory))))
+        except (OSError, ValueError) as e:
+            error(str(path.relative_to(directory)), str(e))
+            continue
+        for label, fields, image in entries:
+            try:
+                valid.append((label, model(**{**defaults, **fields}).dict(), image))
+            except (ValueError, TypeError) as e:
+                error(label, error_message(e))
+
+    loop = asyncio.get_running_loop()
+    chunks = [valid[start:start + batch_size] for start in range(0, len(valid), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit(chunk):
+            return [loop.run_in_executor(pool, load_image, str(image)) if image else None for _, _, image in chunk]
+
+        pending = submit(chunks[0]) if chunks else []
+        for position, chunk in enumerate(chunks):
+            images, pending = pending, submit(chunks[position + 1]) if position + 1 < len(chunks) else []
+            batch, labels = [], []
+            for (label, recette, _), future in zip(chunk, images):
+                if future is not None:
+                    try:
+                        recette["image"] = await future
+                        report["images"] += 1
+                    except Exception as e:
+                        error(label, f"Image illisible: {e}")
+                        continue
+                recette.update(ingredient_fields(recette["ingredients"]))
+                batch.append(recette)
+                labels.append(label)
+            if batch:
+                inserted, duplicates, errors = await insert_batch(db, batch)
+                report["importees"] += len(inserted)
+                report["doublons"] += duplicates
+                for index, message in errors:
+                    error(labels[index], message)
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress({**report, "recettes_par_seconde": round(report["importees"] / elapsed, 1)})
+
+    elapsed = time.perf_counter() - started
+    report["duree_s"] = round(elapsed, 2)
+    report["recettes_par_seconde"] = round(report["importees"] / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+async def command_ingest(args) -> None:
+    db = database_from_env()
+    await db.recettes.create_index("id", unique=True)
+    auteur = await db.users.find_one({"email": args.auteur} if args.auteur else {"role": "admin"})
+    if auteur is None:
+        sys.exit(f"Auteur introuvable: {args.auteur or 'aucun administrateur'}")
+    defaults = {"auteur_id": auteur["id"], "auteur_nom": auteur["nom"], "approuve": args.approuve}
+
+    def progress(report: dict) -> None:
+        print(
+            f"{report['importees']} importées, {report['invalides']} invalides, "
+            f"{report['recettes_par_seconde']} recettes/s",
+            file=sys.stderr
+        )
+
+    report = await ingest(
+        db, Path(args.directory), Recette, defaults,
+        workers=args.workers, batch_size=args.batch_size, progress=progress
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory of recipe JSON files and images")
+    parser.add_argument("--auteur", help="author's email (default: the first administrator)")
+    parser.add_argument("--approuve", action="store_true", help="publish without moderation")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="image processes")
+    parser.add_argument("--batch-size", type=int, default=200)
+    return parser
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    asyncio.run(command_ingest(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Ingredient extraction for pantry matching.
+
+Recipes store their ingredients as free text ("200 g de farine", "3 œufs",
+"1 c. à soupe d'huile d'olive"). ``extract_ingredients`` turns that text into
+a sorted list of normalized tokens (``["farine", "huile", "oeuf", "olive"]``)
+stored on the recipe as ``ingredient_tokens`` and covered by a multikey index.
+Pantry queries are normalized the same way, so "Tomates" matches "tomate".
+
+Normalization lowercases, folds accents and ligatures, drops quantities,
+units and filler words, and reduces regular French plurals to the singular.
+It aims at consistency (singular and plural map to the same token), not at
+linguistic correctness. Recipes tokenized by an older version of these rules
+(``ingredient_tokens_version``) are re-tokenized at startup.
+"""
+import re
+import unicodedata
+from typing import List
+
+from pymongo import UpdateOne
+
+LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "’": "'"})
+
+UNITS = {
+    "g", "gr", "gramme", "kg", "kilo", "mg", "l", "litre", "dl", "cl", "ml",
+    "cuillere", "cuilleree", "cas", "cac", "cs", "cc", "c", "soupe", "cafe", "the",
+    "tasse", "verre", "bol", "pincee", "poignee", "gousse", "tranche", "rondelle",
+    "sachet", "boite", "pot", "paquet", "brique", "botte", "brin", "branche", "feuille",
+    "morceau", "filet", "zeste", "bouquet", "piece", "douzaine",
+}
+
+# Units only when a complement follows ("une noisette de beurre"), ingredients otherwise
+CONTEXTUAL_UNITS = {"noisette"}
+
+STOPWORDS = {
+    "a", "au", "aux", "d", "de", "du", "des", "en", "et", "l", "la", "le", "les",
+    "ou", "pour", "par", "sur", "un", "une", "avec", "sans", "selon", "gout",
+    "environ", "bien", "tres", "peu", "plus", "moins", "facultatif", "optionnel",
+    "frais", "fraiche", "fin", "fine", "gros", "grosse", "petit", "petite", "moyen", "moyenne",
+    "grand", "grande", "hache", "haches", "emince", "coupe", "rape", "fondu", "mou", "molle",
+    "entier", "entiere", "mur", "mure", "sec", "seche", "quelque", "moulu", "cuit", "cru",
+    "pele", "epluche", "concasse", "ecrase", "surgele", "tiede", "battu",
+}
+
+# Singular and plural are the same word
+INVARIABLE = {
+    "ananas", "anis", "brebis", "cassis", "couscous", "doux", "gras", "houmous", "jus",
+    "mais", "noix", "pastis", "pois", "radis", "riz",
+}
+
+PLURAL_SUFFIXES = (("eaux", "eau"), ("oux", "ou"), ("eux", "eu"))
+TOKENIZER_VERSION = 2
+
+QUANTITY = re.compile(r"\d+(?:[.,/]\d+)?|[¼½¾⅓⅔⅛]")
+PARENTHESES = re.compile(r"\([^)]*\)")
+WORD = re.compile(r"[a-z]+")
+
+
+def fold(text: str) -> str:
+    """Lowercase, expand ligatures and strip accents"""
+    text = text.lower().translate(LIGATURES)
+    return "".join(
+        char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char)
+    )
+
+
+def singular(word: str) -> str:
+    if len(word) <= 3 or word in INVARIABLE:
+        return word
+    for plural, replacement in PLURAL_SUFFIXES:
+        if word.endswith(plural):
+            return word[: -len(plural)] + replacement
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def is_filler(word: str) -> bool:
+    """Unit or filler word, including feminine forms of the participles ("rapee")"""
+    if word in STOPWORDS or word in UNITS:
+        return True
+    return word.endswith("ee") and word[:-1] in STOPWORDS
+
+
+def normalize_terms(text: str) -> List[str]:
+    """Ingredient tokens of one line or phrase, in order of appearance"""
+    text = PARENTHESES.sub(" ", fold(text))
+    text = QUANTITY.sub(" ", text)
+    words = WORD.findall(text)
+    tokens = []
+    for position, word in enumerate(words):
+        # Before and after singularizing: "frais" must not become "frai"
+        if is_filler(word):
+            continue
+        word = singular(word)
+        if len(word) < 2 or is_filler(word):
+            continue
+        if word in CONTEXTUAL_UNITS and words[position + 1:position + 2] in (["de"], ["d"]):
+            continue
+        if word not in tokens:
+            tokens.append(word)
+    return tokens
+
+
+def extract_ingredients(text: str) -> List[str]:
+    """Sorted, deduplicated ingredient tokens of a recipe's ingredient list"""
+    tokens = set()
+    for line in re.split(r"[\n;,]", text or ""):
+        tokens.update(normalize_terms(line))
+    return sorted(tokens)
+
+
+def ingredient_fields(text: str) -> dict:
+    """Fields stored on a recipe for its ingredient list"""
+    return {"ingredient_tokens": extract_ingredients(text), "ingredient_tokens_version": TOKENIZER_VERSION}
+
+
+async def backfill_ingredient_tokens(db, batch_size: int = 500) -> int:
+    """Tokenize recipes saved before the ingredient index existed, or with older rules"""
+    operations = []
+    updated = 0
+    async for recette in db.recettes.find(
+        {"ingredient_tokens_version": {"$ne": TOKENIZER_VERSION}}, {"_id": 0, "id": 1, "ingredients": 1}
+    ):
+        operations.append(UpdateOne(
+            {"id": recette["id"]},
+            {"$set": ingredient_fields(recette.get("ingredients", ""))}
+        ))
+        if len(operations) >= batch_size:
+            await db.recettes.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await db.recettes.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return updated
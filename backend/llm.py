@@ -0,0 +1,169 @@
+"""LLM providers used by the AI endpoints.
+
+``GeminiProvider`` calls Google Gemini through its async API. ``FakeLLMProvider``
+answers locally with configurable latency, streaming chunking, error rate and
+malformed-JSON rate, so the AI paths can be benchmarked and exercised offline.
+The provider is chosen with AI_PROVIDER (gemini by default, or fake).
+"""
+import asyncio
+import json
+import os
+import random
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+
+class LLMError(Exception):
+    """The provider failed to produce an answer"""
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LLMProvider:
+    name = "base"
+    model = "-"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    async def generate(self, prompt: str) -> LLMResponse:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str], model: str = "gemini-2.0-flash-exp"):
+        self.api_key = api_key
+        self.model = model
+        self._genai = None
+        if api_key:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            self._genai = genai
+
+    @property
+    def available(self) -> bool:
+        return self._genai is not None
+
+    async def generate(self, prompt: str) -> LLMResponse:
+        model = self._genai.GenerativeModel(self.model)
+        try:
+            response = await model.generate_content_async(prompt)
+            text = response.text
+        except Exception as e:
+            raise LLMError(str(e)) from e
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            text=text,
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            completion_tokens=getattr(usage, "candidates_token_count", 0) or 0
+        )
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        model = self._genai.GenerativeModel(self.model)
+        try:
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise LLMError(str(e)) from e
+
+
+FAKE_RECETTE = {
+    "titre": "Gratin de légumes du marché",
+    "ingredients": "500 g de courgettes\n300 g de tomates\n200 g de comté râpé\n20 cl de crème fraîche\nSel, poivre",
+    "instructions": "Préchauffer le four à 180°C.\nCouper les légumes en rondelles.\n"
+                    "Les disposer dans un plat beurré.\nNapper de crème, parsemer de comté.\nCuire 35 minutes.",
+    "categorie": "Plat principal"
+}
+
+FAKE_SUGGESTION = (
+    "**Gratin de légumes du marché**\n\n"
+    "Ingrédients :\n- 500 g de courgettes\n- 300 g de tomates\n- 200 g de comté râpé\n- 20 cl de crème fraîche\n\n"
+    "Préparation :\n1. Préchauffer le four à 180°C.\n2. Couper les légumes en rondelles.\n"
+    "3. Les disposer dans un plat, napper de crème et parsemer de comté.\n4. Cuire 35 minutes."
+)
+
+
+class FakeLLMProvider(LLMProvider):
+    """Deterministic local stand-in for the real model"""
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.8, jitter: float = 0.0, error_rate: float = 0.0,
+                 malformed_rate: float = 0.0, chunk_size: int = 40, chunk_delay: float = 0.02,
+                 seed: Optional[int] = None, model: str = "fake-chef"):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.model = model
+        self._rng = random.Random(seed)
+
+    def _answer(self, prompt: str) -> str:
+        if "JSON" not in prompt:
+            return FAKE_SUGGESTION
+        text = json.dumps(FAKE_RECETTE, ensure_ascii=False, indent=2)
+        if self._rng.random() < self.malformed_rate:
+            # Truncated output, like a model cut off mid-answer
+            return "```json\n" + text[: len(text) // 2]
+        return "```json\n" + text + "\n```"
+
+    async def _wait(self, seconds: float) -> None:
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def _maybe_fail(self) -> None:
+        if self._rng.random() < self.error_rate:
+            raise LLMError("Erreur simulée du fournisseur IA")
+
+    async def generate(self, prompt: str) -> LLMResponse:
+        await self._wait(self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        self._maybe_fail()
+        text = self._answer(prompt)
+        return LLMResponse(text=text, prompt_tokens=len(prompt) // 4, completion_tokens=len(text) // 4)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        # Time to first token, then one chunk every chunk_delay
+        await self._wait(self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        self._maybe_fail()
+        text = self._answer(prompt)
+        for start in range(0, len(text), self.chunk_size):
+            if start:
+                await self._wait(self.chunk_delay)
+            yield text[start:start + self.chunk_size]
+
+
+def provider_from_env() -> LLMProvider:
+    kind = os.environ.get("AI_PROVIDER", "gemini")
+    if kind == "fake":
+        seed = os.environ.get("FAKE_AI_SEED")
+        return FakeLLMProvider(
+            latency=float(os.environ.get("FAKE_AI_LATENCY_MS", "800")) / 1000,
+            jitter=float(os.environ.get("FAKE_AI_JITTER_MS", "0")) / 1000,
+            error_rate=float(os.environ.get("FAKE_AI_ERROR_RATE", "0")),
+            malformed_rate=float(os.environ.get("FAKE_AI_MALFORMED_RATE", "0")),
+            chunk_size=int(os.environ.get("FAKE_AI_CHUNK_SIZE", "40")),
+            chunk_delay=float(os.environ.get("FAKE_AI_CHUNK_DELAY_MS", "20")) / 1000,
+            seed=int(seed) if seed is not None else None
+        )
+    if kind != "gemini":
+        raise ValueError(f"AI_PROVIDER inconnu: {kind}")
+    return GeminiProvider(
+        os.environ.get("GOOGLE_GEMINI_API_KEY"),
+        model=os.environ.get("GEMINI_MODEL", "gemini-2.0-flash-exp")
+    )
@@ -0,0 +1,132 @@
+"""Event-loop blocking detector.
+
+A heartbeat task ticks on the event loop while a daemon thread watches it.
+When the heartbeat stalls longer than the threshold, the thread samples the
+stack of the loop thread (the blocking call is still running at that moment),
+resolves the FastAPI route whose handler is on that stack, then logs and
+counts the episode. Sampling only happens during a stall, so the steady-state
+cost is one timer per interval.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from metrics import EVENT_LOOP_BLOCKED, EVENT_LOOP_BLOCKED_DURATION
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = str(Path(__file__).parent)
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, stack_depth: int = 20,
+                 max_reports: int = 100):
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_depth = stack_depth
+        self.reports = deque(maxlen=max_reports)
+        self._endpoints = {}
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def register_routes(self, routes) -> None:
+        """Map handler code objects to their route path, to name the route from a stack"""
+        for route in routes:
+            endpoint = getattr(route, "endpoint", None)
+            code = getattr(endpoint, "__code__", None)
+            if code is not None:
+                self._endpoints[code] = getattr(route, "path", endpoint.__name__)
+
+    def start(self) -> None:
+        """Start watching the running loop (must be called from the loop)"""
+        if self._thread is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    async def _beat(self) -> None:
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _describe(self, frame):
+        """Return (route, function, formatted stack) for the blocked loop thread"""
+        route = "-"
+        culprit = None
+        current = frame
+        # Walk outward from the innermost frame: the first frame of our own code is the
+        # culprit, and the route handler (if any) bounds the search
+        while current is not None:
+            code = current.f_code
+            if culprit is None and code.co_filename.startswith(APP_DIR) \
+                    and not code.co_filename.endswith("loop_watchdog.py"):
+                culprit = current
+            if code in self._endpoints:
+                route = self._endpoints[code]
+                culprit = culprit or current
+                break
+            current = current.f_back
+
+        culprit = culprit or frame
+        function = f"{Path(culprit.f_code.co_filename).name}:{culprit.f_code.co_name}"
+        stack = traceback.extract_stack(frame)
+        formatted = "".join(traceback.format_list(stack[-self.stack_depth:]))
+        return route, function, formatted
+
+    def _watch(self) -> None:
+        episode = None
+        while not self._stop.wait(self.interval):
+            stalled_for = time.monotonic() - self._last_beat - self.interval
+            if stalled_for >= self.threshold and episode is None:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                route, function, stack = self._describe(frame)
+                episode = {"route": route, "function": function, "beat": self._last_beat}
+                EVENT_LOOP_BLOCKED.labels(route, function).inc()
+                logger.warning(
+                    "Boucle d'événements bloquée depuis %.0f ms (route %s, fonction %s)\n%s",
+                    stalled_for * 1000, route, function, stack
+                )
+                self.reports.append({
+                    "detected_at": datetime.now(timezone.utc),
+                    "route": route,
+                    "function": function,
+                    "stack": stack,
+                    "duration": None
+                })
+            elif episode is not None and self._last_beat != episode["beat"]:
+                duration = self._last_beat - episode["beat"] - self.interval
+                EVENT_LOOP_BLOCKED_DURATION.labels(episode["route"]).observe(duration)
+                if self.reports:
+                    self.reports[-1]["duration"] = round(duration, 4)
+                logger.warning("Boucle d'événements débloquée après %.0f ms (route %s)",
+                               duration * 1000, episode["route"])
+                episode = None
@@ -0,0 +1,197 @@
+"""Prometheus metrics.
+
+Exposes per-route request latency and in-flight gauges, Mongo command timings
+(through pymongo command monitoring), Gemini latency and token usage, timings
+of CPU-bound helpers (bcrypt, image processing) and event-loop lag.
+"""
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+from pymongo import monitoring
+from starlette.responses import Response
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Durée de traitement des requêtes HTTP",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requêtes HTTP en cours",
+    ["method", "route"],
+    multiprocess_mode="livesum"
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds",
+    "Durée des commandes MongoDB",
+    ["collection", "command", "outcome"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+AI_REQUEST_DURATION = Histogram(
+    "ai_request_duration_seconds",
+    "Durée des appels au modèle IA",
+    ["endpoint", "model", "outcome"],
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+)
+AI_TOKENS = Counter(
+    "ai_tokens_total",
+    "Tokens consommés par les appels IA",
+    ["endpoint", "model", "kind"]
+)
+CPU_TASK_DURATION = Histogram(
+    "cpu_task_duration_seconds",
+    "Durée des traitements CPU (bcrypt, images)",
+    ["task"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Retard de la boucle d'événements",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+EVENT_LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total",
+    "Blocages de la boucle d'événements détectés par le watchdog",
+    ["route", "function"]
+)
+EVENT_LOOP_BLOCKED_DURATION = Histogram(
+    "event_loop_blocked_duration_seconds",
+    "Durée des blocages de la boucle d'événements",
+    ["route"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+
+def route_template(scope) -> str:
+    """Return the path template of the route matching this request (bounded label cardinality)"""
+    if "route_template" in scope:
+        return scope["route_template"]
+    template = "unmatched"
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            template = getattr(route, "path", scope["path"])
+            break
+    # Cached on the scope so that every middleware matches the routes only once
+    scope["route_template"] = template
+    return template
+
+
+class PrometheusMiddleware:
+    """ASGI middleware recording latency and concurrency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(method, route, str(status["code"])).observe(time.perf_counter() - start)
+            in_progress.dec()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener timing each command per collection and operation"""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else "-"
+        self._pending[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, outcome):
+        collection = self._pending.pop((event.connection_id, event.request_id), "-")
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name, outcome).observe(
+            event.duration_micros / 1_000_000
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+
+@contextmanager
+def track_ai_call(endpoint: str, model: str):
+    """Time an AI call; yields a callback to record token usage from the response"""
+    outcome = "success"
+    start = time.perf_counter()
+
+    def record_usage(response):
+        AI_TOKENS.labels(endpoint, model, "prompt").inc(response.prompt_tokens)
+        AI_TOKENS.labels(endpoint, model, "completion").inc(response.completion_tokens)
+
+    try:
+        yield record_usage
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        AI_REQUEST_DURATION.labels(endpoint, model, outcome).observe(time.perf_counter() - start)
+
+
+def timed(task: str):
+    """Decorator recording the duration of a synchronous CPU-bound helper"""
+    def decorator(func):
+        histogram = CPU_TASK_DURATION.labels(task)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Measure how late the loop wakes up compared to the requested sleep"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+
+def metrics_response() -> Response:
+    """Render the metrics, aggregating all workers in multiprocess mode"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,111 @@
+"""Pydantic models and constants shared by the API and the command line tools.
+
+Importing this module has no side effect (no database client, no
+environment), so catalog.py and ingest.py validate recipes with the same
+``Recette`` model as server.py without loading the application.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, EmailStr, Field
+
+# Recipe categories offered by the forms and the filters
+CATEGORIES = [
+    "Entrée",
+    "Plat principal",
+    "Dessert",
+    "Boisson",
+    "Apéritif",
+    "Petit-déjeuner",
+    "Goûter",
+    "Sauce",
+    "Autre"
+]
+
+
+class User(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    nom: str
+    email: EmailStr
+    role: str = "client"
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class UserCreate(BaseModel):
+    nom: str
+    email: EmailStr
+    password: str
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+class Recette(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    titre: str
+    ingredients: str
+    instructions: str
+    auteur_id: str
+    auteur_nom: str
+    categorie: str
+    image: Optional[str] = None
+    approuve: bool = False
+    note_moyenne: float = 0.0
+    nb_votes: int = 0
+    version: int = 1
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class RecetteAvecNote(Recette):
+    ma_note: Optional[int] = None
+
+class RecetteCreate(BaseModel):
+    titre: str
+    ingredients: str
+    instructions: str
+    categorie: str
+
+class RecetteNote(BaseModel):
+    note: int = Field(ge=1, le=5)
+
+class CommentaireCreate(BaseModel):
+    commentaire: str
+
+class Commentaire(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    recette_id: str
+    auteur_nom: str
+    commentaire: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class RecetteBatchRequest(BaseModel):
+    ids: List[str] = Field(max_length=100)
+    # Anything else is rejected with a 422 rather than silently ignored
+    include: List[Literal["commentaires", "ma_note"]] = []
+
+class ModerationBatch(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=500)
+
+class SuggestionIA(BaseModel):
+    ingredients: str
+
+class RecetteCompleteIA(BaseModel):
+    titre: str
+    ingredients: str
+    instructions: str
+    categorie: str
+
+class PasswordResetRequest(BaseModel):
+    email: EmailStr
+
+class PasswordReset(BaseModel):
+    token: str
+    new_password: str
+
+class PasswordResetToken(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    email: str
+    token_hash: str
+    expires_at: datetime
+    used: bool = False
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,267 @@
+"""Asynchronous email outbox.
+
+Requests only insert a message document into ``db.email_outbox``; a background
+worker claims pending messages and delivers them through a pluggable transport,
+retrying failures with exponential backoff.
+
+Bodies may hold secrets (password reset links), so they are only stored until
+the message is sent or abandoned; the recipient, subject and delivery status
+are kept for debugging, a week for sent messages and a month for abandoned
+ones.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import smtplib
+import uuid
+from datetime import datetime, timezone, timedelta
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+class EmailTransport:
+    """Base class for delivery backends"""
+
+    async def send(self, message: dict) -> None:
+        raise NotImplementedError
+
+
+class LogTransport(EmailTransport):
+    """Only log the message (development default)"""
+
+    async def send(self, message: dict) -> None:
+        logger.info("Email pour %s - %s\n%s", message["to"], message["subject"], message["body"])
+
+
+class FileTransport(EmailTransport):
+    """Write each message as a JSON file in a directory, for tests and local debugging"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    async def send(self, message: dict) -> None:
+        path = self.directory / f"{message['id']}.json"
+        content = json.dumps(
+            {key: message[key] for key in ("id", "to", "subject", "body")},
+            ensure_ascii=False,
+            indent=2
+        )
+        await asyncio.to_thread(path.write_text, content, encoding="utf-8")
+
+
+class SMTPTransport(EmailTransport):
+    """Deliver through an SMTP server (works with `python -m aiosmtpd -n` for debugging)"""
+
+    def __init__(self, host: str, port: int, sender: str, username: Optional[str] = None,
+                 password: Optional[str] = None, use_tls: bool = False, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def _send_sync(self, message: dict) -> None:
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message["to"]
+        email["Subject"] = message["subject"]
+        email.set_content(message["body"])
+
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(email)
+
+    async def send(self, message: dict) -> None:
+        # smtplib is blocking, keep it off the event loop
+        await asyncio.to_thread(self._send_sync, message)
+
+
+def transport_from_env() -> EmailTransport:
+    """Build the transport selected by EMAIL_TRANSPORT (log, file or smtp)"""
+    kind = os.environ.get('EMAIL_TRANSPORT', 'log')
+    if kind == 'file':
+        return FileTransport(os.environ.get('EMAIL_OUTBOX_DIR', 'outbox_emails'))
+    if kind == 'smtp':
+        return SMTPTransport(
+            host=os.environ.get('SMTP_HOST', 'localhost'),
+            port=int(os.environ.get('SMTP_PORT', '1025')),
+            sender=os.environ.get('SMTP_FROM', 'noreply@recettes.com'),
+            username=os.environ.get('SMTP_USER'),
+            password=os.environ.get('SMTP_PASSWORD'),
+            use_tls=os.environ.get('SMTP_TLS', 'false').lower() == 'true'
+        )
+    return LogTransport()
+
+
+class EmailOutbox:
+    """Mongo-backed outbox with a retrying background delivery worker"""
+
+    def __init__(self, db, transport: EmailTransport, concurrency: int = 4, max_attempts: int = 5,
+                 base_delay: float = 2.0, poll_interval: float = 5.0, lock_timeout: float = 60.0):
+        self.db = db
+        self.transport = transport
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+    @property
+    def collection(self):
+        return self.db.email_outbox
+
+    async def create_indexes(self) -> None:
+        await self.collection.create_index([("status", 1), ("next_attempt_at", 1)])
+        # Delivered messages are kept a week for debugging, then reaped by Mongo
+        await self.collection.create_index("sent_at", expireAfterSeconds=7 * 24 * 3600)
+        # Abandoned ones a month, long enough to investigate delivery problems
+        await self.collection.create_index("failed_at", expireAfterSeconds=30 * 24 * 3600)
+        await self.collection.update_many(
+            {"status": "failed", "failed_at": {"$exists": False}}, {"$set": {"failed_at": datetime.now(timezone.utc)}}
+        )
+
+    async def redact_finished(self) -> int:
+        """Drop the bodies of messages finished before bodies were redacted on delivery"""
+        result = await self.collection.update_many(
+            {"status": {"$in": ["sent", "failed"]}, "body": {"$exists": True}}, {"$unset": {"body": ""}}
+        )
+        return result.modified_count
+
+    async def enqueue(self, to: str, subject: str, body: str) -> str:
+        """Queue a message for delivery; this is the only work done in the request"""
+        now = datetime.now(timezone.utc)
+        message = {
+            "id": str(uuid.uuid4()),
+            "to": to,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now
+        }
+        await self.collection.insert_one(message)
+        self._wakeup.set()
+        return message["id"]
+
+    async def _claim(self) -> Optional[dict]:
+        """Atomically take the next due message (or one whose sender died mid-delivery)"""
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "locked_until": {"$lte": now}}
+            ]},
+            {"$set": {
+                "status": "sending",
+                "locked_until": now + timedelta(seconds=self.lock_timeout)
+            }},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _deliver(self, message: dict) -> None:
+        try:
+            await self.transport.send(message)
+        except Exception as e:
+            attempts = message.get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                update = {
+                    "status": "failed",
+                    "attempts": attempts,
+                    "last_error": str(e),
+                    "failed_at": datetime.now(timezone.utc)
+                }
+                logger.error("Email %s abandonné après %d tentatives: %s", message["id"], attempts, e)
+            else:
+                delay = self.base_delay * (2 ** (attempts - 1)) * (1 + random.random() / 2)
+                update = {
+                    "status": "pending",
+                    "attempts": attempts,
+                    "last_error": str(e),
+                    "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay)
+                }
+                logger.warning("Échec d'envoi de l'email %s (tentative %d): %s", message["id"], attempts, e)
+            unset = {"locked_until": ""}
+            if update["status"] == "failed":
+                unset["body"] = ""
+            await self.collection.update_one({"id": message["id"]}, {"$set": update, "$unset": unset})
+            return
+
+        await self.collection.update_one(
+            {"id": message["id"]},
+            {
+                "$set": {"status": "sent", "sent_at": datetime.now(timezone.utc)},
+                "$inc": {"attempts": 1},
+                "$unset": {"locked_until": "", "last_error": "", "body": ""}
+            }
+        )
+
+    async def _deliver_and_release(self, message: dict) -> None:
+        try:
+            await self._deliver(message)
+        finally:
+            self._semaphore.release()
+
+    async def drain(self) -> int:
+        """Dispatch every message currently due, return how many were dispatched"""
+        dispatched = 0
+        while True:
+            await self._semaphore.acquire()
+            try:
+                message = await self._claim()
+            except Exception:
+                self._semaphore.release()
+                raise
+            if message is None:
+                self._semaphore.release()
+                break
+            task = asyncio.create_task(self._deliver_and_release(message))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            dispatched += 1
+        return dispatched
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.drain()
+            except Exception:
+                logger.exception("Erreur dans le worker d'envoi d'emails")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
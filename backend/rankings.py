@@ -0,0 +1,187 @@
+"""Precomputed recipe rankings.
+
+A background job periodically scores every approved recipe and materializes
+the scores in ``db.recette_rankings``, indexed for ``sort=top`` and
+``sort=trending`` listings:
+
+- ``score_top``: Bayesian average of the rating, ``(v * R + m * C) / (v + m)``
+  where R and v are the recipe's average and vote count, C the mean rating of
+  the catalog and m the prior weight in votes. A single 5-star vote no longer
+  beats a recipe rated 4.7 by fifty people.
+- ``score_trending``: votes and comments of the last ``window_days``, each
+  weighted by ``0.5 ** (age / half_life)`` so recent activity dominates.
+
+With several workers the job runs in each of them, but a coordination lock
+and a freshness marker make sure a single worker computes per interval.
+Recipes approved or imported since the last run have no ranking yet;
+``unranked`` lists them so that listings can show them after the ranked ones.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional
+
+from pymongo import ReplaceOne
+
+from coordination import CoordinationBackend, LockNotAcquired
+
+logger = logging.getLogger(__name__)
+
+RANKING_SORTS = {
+    "top": [("score_top", -1), ("score_trending", -1)],
+    "trending": [("score_trending", -1), ("score_top", -1)],
+}
+
+
+class RankingJob:
+    def __init__(self, db, coordination: CoordinationBackend, interval: float = 600.0,
+                 prior_votes: float = 5.0, half_life_hours: float = 72.0, window_days: int = 30,
+                 comment_weight: float = 0.5, batch_size: int = 500):
+        self.db = db
+        self.coordination = coordination
+        self.interval = interval
+        self.prior_votes = prior_votes
+        self.half_life = half_life_hours * 3600
+        self.window_days = window_days
+        self.comment_weight = comment_weight
+        self.batch_size = batch_size
+        self.last_run: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def collection(self):
+        return self.db.recette_rankings
+
+    async def create_indexes(self) -> None:
+        await self.collection.create_index("recette_id", unique=True)
+        for sort in RANKING_SORTS.values():
+            await self.collection.create_index(sort)
+            await self.collection.create_index([("categorie", 1)] + sort)
+        # Only the activity window is scanned for trending scores
+        await self.db.votes.create_index("created_at")
+        await self.db.commentaires.create_index("created_at")
+
+    def _decay(self, created_at: datetime, now: datetime) -> float:
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        age = max((now - created_at).total_seconds(), 0.0)
+        return 0.5 ** (age / self.half_life)
+
+    async def _trending_scores(self, now: datetime) -> dict:
+        since = now - timedelta(days=self.window_days)
+        scores = {}
+        async for vote in self.db.votes.find(
+            {"created_at": {"$gte": since}}, {"_id": 0, "recette_id": 1, "note": 1, "created_at": 1}
+        ):
+            # A 5-star vote counts fully, a 1-star vote is still some activity
+            weight = vote.get("note", 0) / 5
+            scores[vote["recette_id"]] = scores.get(vote["recette_id"], 0.0) + weight * self._decay(vote["created_at"], now)
+        async for commentaire in self.db.commentaires.find(
+            {"created_at": {"$gte": since}}, {"_id": 0, "recette_id": 1, "created_at": 1}
+        ):
+            scores[commentaire["recette_id"]] = (
+                scores.get(commentaire["recette_id"], 0.0)
+                + self.comment_weight * self._decay(commentaire["created_at"], now)
+            )
+        return scores
+
+    async def compute(self) -> dict:
+        """Score every approved recipe and replace the ranking collection's content"""
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        run_id = str(uuid.uuid4())
+
+        recettes = await self.db.recettes.find(
+            {"approuve": True}, {"_id": 0, "id": 1, "categorie": 1, "note_moyenne": 1, "nb_votes": 1}
+        ).to_list(None)
+        total_votes = sum(recette.get("nb_votes", 0) for recette in recettes)
+        total_notes = sum(recette.get("note_moyenne", 0.0) * recette.get("nb_votes", 0) for recette in recettes)
+        mean = total_notes / total_votes if total_votes else 0.0
+        trending = await self._trending_scores(now)
+
+        operations = []
+        for recette in recettes:
+            votes = recette.get("nb_votes", 0)
+            score_top = (votes * recette.get("note_moyenne", 0.0) + self.prior_votes * mean) / (votes + self.prior_votes)
+            operations.append(ReplaceOne(
+                {"recette_id": recette["id"]},
+                {
+                    "recette_id": recette["id"],
+                    "categorie": recette["categorie"],
+                    "score_top": round(score_top, 6),
+                    "score_trending": round(trending.get(recette["id"], 0.0), 6),
+                    "run_id": run_id,
+                    "computed_at": now
+                },
+                upsert=True
+            ))
+            if len(operations) >= self.batch_size:
+                await self.collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+        # Recipes deleted or unapproved since the previous run
+        removed = await self.collection.delete_many({"run_id": {"$ne": run_id}})
+
+        self.last_run = {
+            "computed_at": now,
+            "recettes": len(recettes),
+            "supprimees": removed.deleted_count,
+            "note_moyenne_globale": round(mean, 4),
+            "duree_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        logger.info("Classements recalculés: %d recettes en %.0f ms", len(recettes), self.last_run["duree_ms"])
+        return self.last_run
+
+    async def run_once(self, force: bool = False) -> Optional[dict]:
+        """Compute unless another worker already did in this interval; None when skipped"""
+        if not force and await self.coordination.get("rankings:fresh"):
+            return None
+        try:
+            async with self.coordination.lock("rankings", ttl=max(self.interval, 60.0)):
+                result = await self.compute()
+                await self.coordination.set("rankings:fresh", True, ttl=self.interval * 0.9)
+                return result
+        except LockNotAcquired:
+            return None
+
+    async def ranked_ids(self, sort: str, categorie: Optional[str] = None, skip: int = 0, limit: int = 100) -> list:
+        query = {"categorie": categorie} if categorie else {}
+        rankings = await self.collection.find(query, {"_id": 0, "recette_id": 1}).sort(
+            RANKING_SORTS[sort]
+        ).skip(skip).to_list(limit)
+        return [ranking["recette_id"] for ranking in rankings]
+
+    async def unranked(self, query: dict, limit: int) -> List[dict]:
+        """Recipes matching ``query`` that no run has scored yet, newest first"""
+        return await self.db.recettes.aggregate([
+            {"$match": query},
+            {"$sort": {"created_at": -1}},
+            {"$lookup": {"from": "recette_rankings", "localField": "id", "foreignField": "recette_id", "as": "ranking"}},
+            {"$match": {"ranking": {"$size": 0}}},
+            {"$limit": limit},
+            {"$project": {"ranking": 0}}
+        ]).to_list(limit)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Erreur lors du calcul des classements")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
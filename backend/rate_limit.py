@@ -0,0 +1,166 @@
+"""Token-bucket rate limiting for expensive endpoints.
+
+Rules match a method and a path pattern and carry one or more policies keyed
+by client IP or authenticated user. Buckets live in memory by default, or in
+Mongo when several workers must share the same limits.
+"""
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import jwt
+from pymongo import ReturnDocument
+from starlette.responses import JSONResponse
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    name: str
+    capacity: int
+    per_seconds: float
+    key: str = "ip"  # "ip" or "user" (falls back to the IP for anonymous calls)
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    methods: Tuple[str, ...]
+    pattern: str
+    policies: Tuple[RateLimitPolicy, ...]
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and re.fullmatch(self.pattern, path) is not None
+
+
+class MemoryRateLimitBackend:
+    """Per-process buckets, exact but not shared between workers"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # Least recently hit first: evicting from the front keeps every hit O(1),
+        # even when a client sprays new keys
+        self._buckets: OrderedDict = OrderedDict()
+
+    async def hit(self, key: str, capacity: int, refill_rate: float) -> Tuple[bool, float]:
+        """Consume one token, return (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / refill_rate
+
+
+class MongoRateLimitBackend:
+    """Buckets shared by all workers, updated atomically with a pipeline update"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def collection(self):
+        return self.db.rate_limits
+
+    async def create_indexes(self) -> None:
+        await self.collection.create_index("key", unique=True)
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def hit(self, key: str, capacity: int, refill_rate: float) -> Tuple[bool, float]:
+        now = datetime.now(timezone.utc)
+        elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        refilled = {"$min": [
+            capacity,
+            {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, refill_rate]}]}
+        ]}
+        bucket = await self.collection.find_one_and_update(
+            {"key": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    # A bucket untouched until it is full again can be reaped
+                    "expires_at": now + timedelta(seconds=capacity / refill_rate)
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        allowed = bucket["allowed"]
+        return allowed, 0.0 if allowed else (1 - bucket["tokens"]) / refill_rate
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with Retry-After when a bucket is empty"""
+
+    def __init__(self, app, rules: Iterable[RateLimitRule], backend, jwt_secret: str,
+                 trust_proxy: bool = False, enabled: bool = True):
+        self.app = app
+        self.rules: List[RateLimitRule] = list(rules)
+        self.backend = backend
+        self.jwt_secret = jwt_secret
+        self.trust_proxy = trust_proxy
+        self.enabled = enabled
+
+    def _client_ip(self, scope) -> str:
+        headers = dict(scope.get("headers") or [])
+        if self.trust_proxy and b"x-forwarded-for" in headers:
+            return headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "inconnu"
+
+    def _user_id(self, scope) -> Optional[str]:
+        # Only the signature is checked here, no database round trip
+        headers = dict(scope.get("headers") or [])
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if not authorization.lower().startswith("bearer "):
+            return None
+        try:
+            payload = jwt.decode(authorization[7:], self.jwt_secret, algorithms=["HS256"])
+        except jwt.PyJWTError:
+            return None
+        return payload.get("user_id")
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        policies = [policy for rule in self.rules if rule.matches(method, path) for policy in rule.policies]
+        if policies:
+            ip = self._client_ip(scope)
+            user_id = None
+            if any(policy.key == "user" for policy in policies):
+                user_id = self._user_id(scope)
+
+            retry_after = 0.0
+            for policy in policies:
+                identity = f"user:{user_id}" if policy.key == "user" and user_id else f"ip:{ip}"
+                allowed, wait = await self.backend.hit(
+                    f"{policy.name}:{identity}", policy.capacity, policy.refill_rate
+                )
+                if not allowed:
+                    retry_after = max(retry_after, wait)
+
+            if retry_after:
+                response = JSONResponse(
+                    {"detail": "Trop de requêtes, veuillez réessayer plus tard"},
+                    status_code=429,
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
@@ -1,29 +1,63 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, Query, Header, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import List, Optional, Union
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
 import bcrypt
-import base64
 import secrets
-import google.generativeai as genai
-from PIL import Image
-import io
+import hashlib
+import difflib
+import json
+import re
+from outbox import EmailOutbox, transport_from_env
+from metrics import (
+    MongoCommandMetrics, PrometheusMiddleware, metrics_response, monitor_event_loop_lag, timed, track_ai_call
+)
+from llm import LLMError, LLMResponse, provider_from_env
+from loop_watchdog import LoopWatchdog
+from tracing import MongoTracingListener, TracingMiddleware, setup_tracing, shutdown_tracing, traced, tracer
+from rate_limit import RateLimitMiddleware, RateLimitPolicy, RateLimitRule
+from coordination import coordination_from_env
+from change_events import ChangeBus, ChangeStreamWatcher
+from rankings import RANKING_SORTS, RankingJob
+from ingredients import backfill_ingredient_tokens, extract_ingredients, ingredient_fields
+from autocomplete import AutocompleteIndex
+from facets import FacetCounter
+from similarity import SimilarityIndex
+from garbage import OrphanCollector
+from archive import ArchiveJob, rating_totals, restore_vote
+from catalog import export_ndjson, import_ndjson, iter_lines
+from images import compress_image
+from versions import etag_version, parse_if_match, version_filter, versioned_update
+from models import (
+    CATEGORIES, User, UserCreate, UserLogin, Recette, RecetteAvecNote, RecetteCreate, RecetteNote,
+    CommentaireCreate, Commentaire, RecetteBatchRequest, ModerationBatch, SuggestionIA, RecetteCompleteIA,
+    PasswordResetRequest, PasswordReset, PasswordResetToken
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Tracing must be configured before the Mongo client registers its listeners
+TRACING_ENABLED = setup_tracing()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+mongo_listeners = [MongoCommandMetrics()]
+if TRACING_ENABLED:
+    mongo_listeners.append(MongoTracingListener())
+client = AsyncIOMotorClient(mongo_url, event_listeners=mongo_listeners)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -35,91 +69,90 @@ api_router = APIRouter(prefix="/api")
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'secret_key_super_securise_pour_jwt_token_recettes_2025')
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Shared job locks, freshness flags and rate-limit buckets (local, mongo or redis)
+coordination = coordination_from_env(db)
+
+# Change streams: every worker follows recettes/votes/commentaires to invalidate
+# its in-process caches and to push live rating/comment updates (SSE)
+CHANGE_STREAMS_ENABLED = os.environ.get('CHANGE_STREAMS_ENABLED', 'true').lower() == 'true'
+LIVE_KEEPALIVE_SECONDS = 15
+change_bus = ChangeBus()
+change_watcher = ChangeStreamWatcher(db, change_bus, worker_id=os.environ.get('WORKER_ID'))
+
+# Per-category and per-rating counts for the filter sidebar, cached per worker
+facet_counter = FacetCounter(db, CATEGORIES, ttl=float(os.environ.get('FACETS_CACHE_TTL_SECONDS', '60')))
+
+# Search-as-you-type over approved titles and ingredients, kept in memory per worker
+autocomplete_index = AutocompleteIndex()
+
+# Precomputed top/trending rankings, refreshed by a background job
+RANKINGS_ENABLED = os.environ.get('RANKINGS_ENABLED', 'true').lower() == 'true'
+ranking_job = RankingJob(
+    db,
+    coordination,
+    interval=float(os.environ.get('RANKINGS_INTERVAL_SECONDS', '600')),
+    prior_votes=float(os.environ.get('RANKINGS_PRIOR_VOTES', '5')),
+    half_life_hours=float(os.environ.get('RANKINGS_HALF_LIFE_HOURS', '72')),
+    window_days=int(os.environ.get('RANKINGS_WINDOW_DAYS', '30'))
+)
+
+# Precomputed "similar recipes" lists (TF-IDF over titles and ingredients)
+SIMILARITY_ENABLED = os.environ.get('SIMILARITY_ENABLED', 'true').lower() == 'true'
+similarity_index = SimilarityIndex(
+    db,
+    coordination,
+    k=int(os.environ.get('SIMILARITY_K', '10')),
+    rebuild_interval=float(os.environ.get('SIMILARITY_REBUILD_HOURS', '6')) * 3600,
+    poll_interval=float(os.environ.get('SIMILARITY_POLL_SECONDS', '60'))
+)
+
+# Background removal of votes/comments/derived documents whose recipe is gone
+GC_ENABLED = os.environ.get('GC_ENABLED', 'true').lower() == 'true'
+orphan_collector = OrphanCollector(
+    db,
+    coordination,
+    batch_size=int(os.environ.get('GC_BATCH_SIZE', '500')),
+    pause=float(os.environ.get('GC_PAUSE_MS', '100')) / 1000,
+    interval=float(os.environ.get('GC_INTERVAL_HOURS', '24')) * 3600
+)
+
+# Archiving of old comments and votes; both stay hot for the trending window
+ARCHIVE_ENABLED = os.environ.get('ARCHIVE_ENABLED', 'true').lower() == 'true'
+archive_job = ArchiveJob(
+    db,
+    coordination,
+    comments_retention_days=max(int(os.environ.get('ARCHIVE_COMMENTS_DAYS', '180')), ranking_job.window_days),
+    votes_retention_days=max(int(os.environ.get('ARCHIVE_VOTES_DAYS', '90')), ranking_job.window_days),
+    keep_comments=int(os.environ.get('ARCHIVE_KEEP_COMMENTS', '100')),
+    interval=float(os.environ.get('ARCHIVE_INTERVAL_HOURS', '24')) * 3600
+)
+
+# Email outbox: requests enqueue, a background worker delivers
+FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+email_outbox = EmailOutbox(
+    db,
+    transport_from_env(),
+    concurrency=int(os.environ.get('EMAIL_CONCURRENCY', '4')),
+    max_attempts=int(os.environ.get('EMAIL_MAX_ATTEMPTS', '5'))
+)
+
+# Event-loop watchdog: reports handlers that block the loop
+LOOP_WATCHDOG_ENABLED = os.environ.get('LOOP_WATCHDOG_ENABLED', 'true').lower() == 'true'
+LOOP_WATCHDOG_DEBUG = os.environ.get('LOOP_WATCHDOG_DEBUG', 'false').lower() == 'true'
+loop_watchdog = LoopWatchdog(threshold=float(os.environ.get('LOOP_WATCHDOG_THRESHOLD_MS', '100')) / 1000)
 
 # Google Gemini Configuration
-GOOGLE_GEMINI_API_KEY = os.environ.get('GOOGLE_GEMINI_API_KEY')
-if GOOGLE_GEMINI_API_KEY:
-    genai.configure(api_key=GOOGLE_GEMINI_API_KEY)
-
-# Models
-class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    nom: str
-    email: EmailStr
-    role: str = "client"
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class UserCreate(BaseModel):
-    nom: str
-    email: EmailStr
-    password: str
-
-class UserLogin(BaseModel):
-    email: EmailStr
-    password: str
-
-class Recette(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    titre: str
-    ingredients: str
-    instructions: str
-    auteur_id: str
-    auteur_nom: str
-    categorie: str
-    image: Optional[str] = None
-    approuve: bool = False
-    note_moyenne: float = 0.0
-    nb_votes: int = 0
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class RecetteCreate(BaseModel):
-    titre: str
-    ingredients: str
-    instructions: str
-    categorie: str
-
-class RecetteNote(BaseModel):
-    note: int = Field(ge=1, le=5)
-
-class CommentaireCreate(BaseModel):
-    commentaire: str
-
-class Commentaire(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    recette_id: str
-    auteur_nom: str
-    commentaire: str
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class SuggestionIA(BaseModel):
-    ingredients: str
-
-class RecetteCompleteIA(BaseModel):
-    titre: str
-    ingredients: str
-    instructions: str
-    categorie: str
-
-class PasswordResetRequest(BaseModel):
-    email: EmailStr
-
-class PasswordReset(BaseModel):
-    token: str
-    new_password: str
-
-class PasswordResetToken(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    email: str
-    token: str
-    expires_at: datetime
-    used: bool = False
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+# AI_PROVIDER=fake swaps in a local simulated model for benchmarks and offline tests
+llm_provider = provider_from_env()
 
 # Helper functions
+@timed("bcrypt_hash")
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
+@timed("bcrypt_verify")
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
@@ -143,31 +176,108 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Token invalide")
 
+async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Return the current user when a valid token is sent, None otherwise"""
+    if credentials is None:
+        return None
+    try:
+        return await get_current_user(credentials)
+    except HTTPException:
+        return None
+
 async def get_admin_user(current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Accès administrateur requis")
     return current_user
 
+async def get_notes_utilisateur(user_id: str, recette_ids: List[str]) -> dict:
+    """Map recipe id -> the user's vote for these recipes, using a single $in query"""
+    if not recette_ids:
+        return {}
+    votes = await db.votes.find(
+        {"user_id": user_id, "recette_id": {"$in": recette_ids}},
+        {"_id": 0, "recette_id": 1, "note": 1}
+    ).to_list(len(recette_ids))
+    notes = {vote["recette_id"]: vote["note"] for vote in votes}
+    archived = [recette_id for recette_id in recette_ids if recette_id not in notes]
+    if archived:
+        votes = await db.votes_archive.find(
+            {"user_id": user_id, "recette_id": {"$in": archived}},
+            {"_id": 0, "recette_id": 1, "note": 1}
+        ).to_list(len(archived))
+        notes.update({vote["recette_id"]: vote["note"] for vote in votes})
+    return notes
+
+async def attach_ma_note(recettes: List[dict], current_user: Optional[User]) -> List[RecetteAvecNote]:
+    """Build listing items carrying the current user's vote (None when not rated)"""
+    notes = {}
+    if current_user:
+        notes = await get_notes_utilisateur(current_user.id, [recette["id"] for recette in recettes])
+    return [RecetteAvecNote(**recette, ma_note=notes.get(recette["id"])) for recette in recettes]
+
+def normaliser_recherche(search: Optional[str]) -> Optional[str]:
+    """Search text as matched: trimmed and lowercased, the match being literal and case-insensitive"""
+    search = search.strip().lower() if search else ""
+    return search or None
+
+def filtre_recettes_publiques(categorie: Optional[str] = None, search: Optional[str] = None) -> dict:
+    filter_query = {"approuve": True}
+    
+    if categorie:
+        filter_query["categorie"] = categorie
+    
+    search = normaliser_recherche(search)
+    if search:
+        pattern = re.escape(search)
+        filter_query["$or"] = [
+            {"titre": {"$regex": pattern, "$options": "i"}},
+            {"ingredients": {"$regex": pattern, "$options": "i"}}
+        ]
+    return filter_query
+
+async def get_recettes_classees(filter_query: dict, sort: str, categorie: Optional[str], limit: int = 100) -> List[dict]:
+    """Recipes matching the filter, in precomputed ranking order"""
+    recettes = []
+    skip = 0
+    # Walk the ranking index in chunks until enough recipes pass the filter (search)
+    while len(recettes) < limit:
+        ids = await ranking_job.ranked_ids(sort, categorie, skip=skip, limit=200)
+        if not ids:
+            break
+        skip += len(ids)
+        found = await db.recettes.find({**filter_query, "id": {"$in": ids}}).to_list(len(ids))
+        by_id = {recette["id"]: recette for recette in found}
+        recettes.extend(by_id[recette_id] for recette_id in ids if recette_id in by_id)
+    if len(recettes) < limit:
+        # Approved since the last ranking run: listed after the ranked ones until the next run
+        recettes.extend(await ranking_job.unranked(filter_query, limit - len(recettes)))
+    return recettes[:limit]
+
+# Every write to a recipe increments its version: ETags and conditional updates rely on it
+RATING_UPDATE_ATTEMPTS = 5
+
+async def modifier_recette(recette_id: str, update: dict, version: Optional[int] = None,
+                           projection: Optional[dict] = None) -> Optional[dict]:
+    """Apply ``update`` and bump the version, only if the recipe is still at ``version`` when given"""
+    query = {"id": recette_id}
+    if version is not None:
+        query["version"] = version_filter(version)
+    recette = await db.recettes.find_one_and_update(
+        query,
+        versioned_update(update, version),
+        projection=projection,
+        return_document=ReturnDocument.AFTER
+    )
+    if recette is None and version is not None and await db.recettes.count_documents({"id": recette_id}, limit=1):
+        raise HTTPException(status_code=412, detail="La recette a été modifiée entre-temps")
+    return recette
+
+@timed("process_image")
+@traced("image.process")
 def process_image(image_data: bytes) -> str:
     """Process and compress image, return base64 string"""
     try:
-        img = Image.open(io.BytesIO(image_data))
-        
-        # Resize if too large
-        max_size = (800, 600)
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        # Convert to RGB if needed
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Save to bytes with compression
-        output = io.BytesIO()
-        img.save(output, format='JPEG', quality=80, optimize=True)
-        output.seek(0)
-        
-        # Convert to base64
-        return base64.b64encode(output.getvalue()).decode('utf-8')
+        return compress_image(image_data)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erreur lors du traitement de l'image: {str(e)}")
 
@@ -175,15 +285,20 @@ def generate_reset_token() -> str:
     """Generate a secure random token for password reset"""
     return secrets.token_urlsafe(32)
 
-def send_password_reset_email(email: str, token: str) -> bool:
-    """
-    Simulate sending password reset email
-    In production, replace with actual email service (SendGrid, etc.)
-    """
-    # For now, just log the token (in production, send via email)
-    print(f"Password reset token for {email}: {token}")
-    print(f"Reset URL: http://localhost:3000/reset-password?token={token}")
-    return True
+def hash_reset_token(token: str) -> str:
+    """Only the SHA-256 digest of a reset token is stored, never the token itself"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+async def send_password_reset_email(email: str, token: str) -> str:
+    """Queue the password reset email in the outbox, delivery happens in the background"""
+    reset_url = f"{FRONTEND_URL}/reset-password?token={token}"
+    body = (
+        "Bonjour,\n\n"
+        "Vous avez demandé la réinitialisation de votre mot de passe.\n"
+        f"Cliquez sur ce lien pour choisir un nouveau mot de passe (valable 1 heure) :\n{reset_url}\n\n"
+        "Si vous n'êtes pas à l'origine de cette demande, ignorez cet email."
+    )
+    return await email_outbox.enqueue(email, "Réinitialisation de votre mot de passe", body)
 
 # Authentication routes
 @api_router.post("/auth/register")
@@ -247,31 +362,37 @@ async def forgot_password(request_data: PasswordResetRequest):
     reset_token = generate_reset_token()
     expires_at = datetime.now(timezone.utc) + timedelta(hours=1)  # Token expires in 1 hour
     
+    # Invalidate any previous outstanding token for this user
+    await db.password_reset_tokens.delete_many({"user_id": user["id"], "used": False})
+    
     # Create reset token record
     token_record = PasswordResetToken(
         user_id=user["id"],
         email=request_data.email,
-        token=reset_token,
+        token_hash=hash_reset_token(reset_token),
         expires_at=expires_at
     )
     
     # Save token to database
     await db.password_reset_tokens.insert_one(token_record.dict())
     
-    # Send email (simulated for now)
-    send_password_reset_email(request_data.email, reset_token)
+    # Queue email, delivered by the outbox worker
+    await send_password_reset_email(request_data.email, reset_token)
     
     return {"message": "Si cet email existe, un lien de réinitialisation a été envoyé"}
 
 @api_router.post("/auth/reset-password")
 async def reset_password(reset_data: PasswordReset):
     """Complete password reset with token"""
-    # Find valid token
-    token_record = await db.password_reset_tokens.find_one({
-        "token": reset_data.token,
-        "used": False,
-        "expires_at": {"$gt": datetime.now(timezone.utc)}
-    })
+    # Find valid token and mark it as used in the same atomic step
+    token_record = await db.password_reset_tokens.find_one_and_update(
+        {
+            "token_hash": hash_reset_token(reset_data.token),
+            "used": False,
+            "expires_at": {"$gt": datetime.now(timezone.utc)}
+        },
+        {"$set": {"used": True}}
+    )
     
     if not token_record:
         raise HTTPException(status_code=400, detail="Token invalide ou expiré")
@@ -290,19 +411,13 @@ async def reset_password(reset_data: PasswordReset):
         {"$set": {"password": hashed_password}}
     )
     
-    # Mark token as used
-    await db.password_reset_tokens.update_one(
-        {"token": reset_data.token},
-        {"$set": {"used": True}}
-    )
-    
     return {"message": "Mot de passe mis à jour avec succès"}
 
 @api_router.get("/auth/verify-reset-token/{token}")
 async def verify_reset_token(token: str):
     """Verify if reset token is valid"""
     token_record = await db.password_reset_tokens.find_one({
-        "token": token,
+        "token_hash": hash_reset_token(token),
         "used": False,
         "expires_at": {"$gt": datetime.now(timezone.utc)}
     })
@@ -339,26 +454,190 @@ async def create_recette(
         image=image_data
     )
     
-    await db.recettes.insert_one(recette.dict())
+    recette_dict = recette.dict()
+    recette_dict.update(ingredient_fields(ingredients))
+    await db.recettes.insert_one(recette_dict)
     
     return {"message": "Recette ajoutée, en attente de validation par un administrateur", "recette": recette}
 
-@api_router.get("/recettes", response_model=List[Recette])
-async def get_recettes_publiques(categorie: Optional[str] = None, search: Optional[str] = None):
-    filter_query = {"approuve": True}
+# An author's edit keeping less than this share of a text (difflib ratio), or replacing
+# the image, sends an approved recipe back to moderation; typo fixes stay published
+REMODERATION_THRESHOLD = float(os.environ.get('REMODERATION_THRESHOLD', '0.8'))
+CHAMPS_TEXTE = ("titre", "ingredients", "instructions")
+
+def modification_importante(avant: str, apres: str) -> bool:
+    return difflib.SequenceMatcher(None, avant, apres).ratio() < REMODERATION_THRESHOLD
+
+@api_router.patch("/recettes/{recette_id}")
+async def editer_recette(
+    recette_id: str,
+    titre: Optional[str] = Form(None),
+    ingredients: Optional[str] = Form(None),
+    instructions: Optional[str] = Form(None),
+    categorie: Optional[str] = Form(None),
+    image: Optional[UploadFile] = File(None),
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Partial update by the author (or an admin); the stored image is kept unless a new one is sent"""
+    recette = await db.recettes.find_one({"id": recette_id}, {"_id": 0, "image": 0})
+    if not recette:
+        raise HTTPException(status_code=404, detail="Recette non trouvée")
+    if recette["auteur_id"] != current_user.id and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Vous ne pouvez modifier que vos propres recettes")
+    version = parse_if_match(if_match)
+    if version is not None and recette.get("version", 1) != version:
+        raise HTTPException(status_code=412, detail="La recette a été modifiée entre-temps")
     
-    if categorie:
-        filter_query["categorie"] = categorie
+    # Only the fields that actually differ are written and invalidated
+    changes = {
+        champ: valeur
+        for champ, valeur in (("titre", titre), ("ingredients", ingredients), ("instructions", instructions), ("categorie", categorie))
+        if valeur is not None and valeur != recette.get(champ)
+    }
+    if image and image.content_type.startswith('image/'):
+        changes["image"] = process_image(await image.read())
+    if not changes:
+        return {"message": "Aucune modification", "version": recette.get("version", 1), "modifications": []}
     
-    if search:
-        filter_query["$or"] = [
-            {"titre": {"$regex": search, "$options": "i"}},
-            {"ingredients": {"$regex": search, "$options": "i"}}
-        ]
+    remoderation = recette["approuve"] and current_user.role != "admin" and (
+        "image" in changes
+        or any(modification_importante(recette[champ], changes[champ]) for champ in CHAMPS_TEXTE if champ in changes)
+    )
+    modifications = sorted(changes)
+    if remoderation:
+        changes["approuve"] = False
+    if "ingredients" in changes:
+        changes.update(ingredient_fields(changes["ingredients"]))
+    
+    recette = await modifier_recette(recette_id, {"$set": changes}, version=version, projection={"image": 0})
+    if recette is None:
+        raise HTTPException(status_code=404, detail="Recette non trouvée")
+    
+    facet_counter.apply_change({"operation": "update", "updated_fields": list(changes)})
+    if recette["approuve"]:
+        if {"titre", "ingredient_tokens"} & set(changes):
+            autocomplete_index.add(recette)
+    else:
+        autocomplete_index.remove(recette_id)
+    if {"titre", "ingredients"} & set(changes):
+        await similarity_index.mark_stale(recette_id)
+    if "categorie" in changes:
+        await db.recette_rankings.update_one({"recette_id": recette_id}, {"$set": {"categorie": changes["categorie"]}})
+    
+    return {
+        "message": "Recette modifiée, en attente de validation par un administrateur" if remoderation
+        else "Recette modifiée avec succès",
+        "version": recette["version"],
+        "modifications": modifications,
+        "en_attente": not recette["approuve"]
+    }
+
+# Recette first: plain items stay plain, only avec_ma_note items carry ma_note
+@api_router.get("/recettes", response_model=List[Union[Recette, RecetteAvecNote]])
+async def get_recettes_publiques(
+    categorie: Optional[str] = None,
+    search: Optional[str] = None,
+    sort: str = "recent",
+    avec_ma_note: bool = False,
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    if sort != "recent" and sort not in RANKING_SORTS:
+        raise HTTPException(status_code=400, detail="Tri inconnu (recent, top ou trending)")
     
-    recettes = await db.recettes.find(filter_query).sort("created_at", -1).to_list(100)
+    filter_query = filtre_recettes_publiques(categorie, search)
+    
+    if sort == "recent":
+        recettes = await db.recettes.find(filter_query).sort("created_at", -1).to_list(100)
+    else:
+        recettes = await get_recettes_classees(filter_query, sort, categorie)
+    if avec_ma_note:
+        return await attach_ma_note(recettes, current_user)
     return [Recette(**recette) for recette in recettes]
 
+@api_router.get("/recettes/autocomplete")
+async def autocomplete_recettes(q: str, limit: int = Query(8, ge=1, le=20)):
+    """Title and ingredient suggestions for the search box, served from memory"""
+    return {"suggestions": autocomplete_index.suggest(q, limit)}
+
+@api_router.get("/recettes/par-ingredients")
+async def get_recettes_par_ingredients(ingredients: str, limit: int = Query(20, ge=1, le=50)):
+    """Approved recipes ranked by how much of their ingredient list the pantry covers"""
+    pantry = extract_ingredients(ingredients)
+    if not pantry:
+        raise HTTPException(status_code=400, detail="Aucun ingrédient reconnu")
+    
+    # The $in match uses the multikey index, coverage is computed on the candidates only
+    pipeline = [
+        {"$match": {"approuve": True, "ingredient_tokens": {"$in": pantry}}},
+        {"$addFields": {"nb_trouves": {"$size": {"$filter": {
+            "input": "$ingredient_tokens", "as": "token", "cond": {"$in": ["$$token", pantry]}
+        }}}}},
+        {"$addFields": {"couverture": {"$divide": ["$nb_trouves", {"$size": "$ingredient_tokens"}]}}},
+        {"$sort": {"couverture": -1, "nb_trouves": -1, "note_moyenne": -1}},
+        {"$limit": limit}
+    ]
+    resultats = []
+    async for recette in db.recettes.aggregate(pipeline):
+        resultats.append({
+            "recette": Recette(**recette),
+            "couverture": round(recette["couverture"], 3),
+            "manquants": [token for token in recette["ingredient_tokens"] if token not in pantry]
+        })
+    return {"ingredients": pantry, "recettes": resultats}
+
+@api_router.post("/recettes/batch")
+async def get_recettes_batch(
+    batch_data: RecetteBatchRequest,
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    """Resolve several recipes (and optionally their comments and the user's vote) in one call"""
+    ids = list(dict.fromkeys(batch_data.ids))
+    include = set(batch_data.include)
+    
+    # Approved recipes are public, pending ones are only visible to their author
+    visibility = [{"approuve": True}]
+    if current_user:
+        visibility.append({"auteur_id": current_user.id})
+    
+    recettes = await db.recettes.find(
+        {"id": {"$in": ids}, "$or": visibility}
+    ).to_list(len(ids))
+    
+    resultats = {
+        recette["id"]: {"recette": Recette(**recette)}
+        for recette in recettes
+    }
+    found_ids = list(resultats)
+    
+    if "commentaires" in include:
+        # Newest 100 comments per recipe, grouped server side in a single aggregation;
+        # $topN keeps at most 100 per group in memory (MongoDB 5.2+)
+        pipeline = [
+            {"$match": {"recette_id": {"$in": found_ids}}},
+            {"$group": {"_id": "$recette_id", "commentaires": {
+                "$topN": {"n": 100, "sortBy": {"created_at": -1}, "output": "$$ROOT"}
+            }}}
+        ]
+        for entry in resultats.values():
+            entry["commentaires"] = []
+        async for groupe in db.commentaires.aggregate(pipeline):
+            resultats[groupe["_id"]]["commentaires"] = [
+                Commentaire(**commentaire) for commentaire in groupe["commentaires"]
+            ]
+    
+    if "ma_note" in include:
+        notes = {}
+        if current_user:
+            notes = await get_notes_utilisateur(current_user.id, found_ids)
+        for recette_id, entry in resultats.items():
+            entry["ma_note"] = notes.get(recette_id)
+    
+    return {
+        "recettes": resultats,
+        "introuvables": [recette_id for recette_id in ids if recette_id not in resultats]
+    }
+
 @api_router.get("/recettes/mes", response_model=List[Recette])
 async def get_mes_recettes(current_user: User = Depends(get_current_user)):
     recettes = await db.recettes.find({"auteur_id": current_user.id}).sort("created_at", -1).to_list(100)
@@ -366,19 +645,38 @@ async def get_mes_recettes(current_user: User = Depends(get_current_user)):
 
 @api_router.get("/recettes/categories")
 async def get_categories():
-    return {
-        "categories": [
-            "Entrée",
-            "Plat principal", 
-            "Dessert",
-            "Boisson",
-            "Apéritif",
-            "Petit-déjeuner",
-            "Goûter",
-            "Sauce",
-            "Autre"
-        ]
-    }
+    return {"categories": CATEGORIES}
+
+@api_router.get("/recettes/facettes")
+async def get_facettes(categorie: Optional[str] = None, search: Optional[str] = None):
+    """Recipe counts per category and rating bucket for the current search"""
+    # The cache key is the exact value the filter matches on
+    search = normaliser_recherche(search)
+    return await facet_counter.counts(filtre_recettes_publiques(search=search), categorie, cache_key=(search,))
+
+@api_router.get("/recettes/{recette_id}", response_model=Recette)
+async def get_recette(
+    recette_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    """One recipe, with its version as ETag; a matching If-None-Match gets a 304 without the body"""
+    visibility = [{"approuve": True}]
+    if current_user:
+        visibility.append({"auteur_id": current_user.id})
+    query = {"id": recette_id, "$or": visibility}
+    
+    if if_none_match:
+        entete = await db.recettes.find_one(query, {"_id": 0, "version": 1})
+        if entete and etag_version(entete.get("version", 1)) in if_none_match:
+            return Response(status_code=304, headers={"ETag": etag_version(entete.get("version", 1))})
+    
+    recette = await db.recettes.find_one(query)
+    if not recette:
+        raise HTTPException(status_code=404, detail="Recette non trouvée")
+    response.headers["ETag"] = etag_version(recette.get("version", 1))
+    return Recette(**recette)
 
 @api_router.post("/recettes/{recette_id}/noter")
 async def noter_recette(
@@ -391,8 +689,10 @@ async def noter_recette(
     if not recette:
         raise HTTPException(status_code=404, detail="Recette non trouvée")
     
-    # Check if user already voted
+    # Check if user already voted (an archived vote comes back to the hot collection)
     existing_vote = await db.votes.find_one({"recette_id": recette_id, "user_id": current_user.id})
+    if not existing_vote:
+        existing_vote = await restore_vote(db, recette_id, current_user.id)
     
     if existing_vote:
         # Update existing vote
@@ -410,17 +710,27 @@ async def noter_recette(
             "created_at": datetime.now(timezone.utc)
         })
     
-    # Recalculate average rating
-    votes = await db.votes.find({"recette_id": recette_id}).to_list(1000)
-    if votes:
-        total_notes = sum(vote["note"] for vote in votes)
-        nb_votes = len(votes)
-        note_moyenne = total_notes / nb_votes
-        
-        await db.recettes.update_one(
-            {"id": recette_id},
-            {"$set": {"note_moyenne": note_moyenne, "nb_votes": nb_votes}}
-        )
+    # Recalculate average rating, archived votes included. The write only applies to the
+    # version read before counting; a concurrent vote bumps it and we count again.
+    for _ in range(RATING_UPDATE_ATTEMPTS):
+        version = (await db.recettes.find_one({"id": recette_id}, {"_id": 0, "version": 1}) or {}).get("version", 1)
+        totals = await rating_totals(db, recette_id)
+        if not totals["nb"]:
+            break
+        try:
+            await modifier_recette(
+                recette_id,
+                {"$set": {"note_moyenne": totals["somme"] / totals["nb"], "nb_votes": totals["nb"]}},
+                version=version,
+                projection={"_id": 1}
+            )
+            break
+        except HTTPException as e:
+            if e.status_code != 412:
+                raise
+    else:
+        # The vote is saved; voting again recounts the average
+        raise HTTPException(status_code=409, detail="Trop de votes simultanés, la moyenne n'a pas pu être mise à jour")
     
     return {"message": "Note enregistrée avec succès"}
 
@@ -444,78 +754,179 @@ async def add_commentaire(
     await db.commentaires.insert_one(commentaire.dict())
     return {"message": "Commentaire ajouté avec succès", "commentaire": commentaire}
 
+@api_router.get("/recettes/{recette_id}/similaires")
+async def get_recettes_similaires(recette_id: str, limit: int = Query(6, ge=1, le=20)):
+    """Most similar approved recipes, read from the precomputed neighbour list"""
+    similaires = await similarity_index.similaires(recette_id)
+    scores = {similaire["recette_id"]: similaire["score"] for similaire in similaires}
+    # Neighbours deleted or unapproved since the list was computed are skipped
+    recettes = await db.recettes.find({"id": {"$in": list(scores)}, "approuve": True}).to_list(len(scores))
+    by_id = {recette["id"]: recette for recette in recettes}
+    return [
+        {"recette": Recette(**by_id[similaire_id]), "score": score}
+        for similaire_id, score in scores.items() if similaire_id in by_id
+    ][:limit]
+
 @api_router.get("/recettes/{recette_id}/commentaires", response_model=List[Commentaire])
 async def get_commentaires(recette_id: str):
     commentaires = await db.commentaires.find({"recette_id": recette_id}).sort("created_at", -1).to_list(100)
     return [Commentaire(**commentaire) for commentaire in commentaires]
 
+def live_update(event: dict) -> Optional[dict]:
+    """Client-facing update for a change event, None if clients don't care"""
+    document = event["document"]
+    if event["collection"] == "recettes" and {"note_moyenne", "nb_votes"} & set(event["updated_fields"]):
+        return {
+            "type": "note",
+            "recette_id": event["recette_id"],
+            "note_moyenne": document.get("note_moyenne", 0.0),
+            "nb_votes": document.get("nb_votes", 0)
+        }
+    if event["collection"] == "commentaires" and event["operation"] == "insert":
+        return {
+            "type": "commentaire",
+            "recette_id": event["recette_id"],
+            "commentaire": jsonable_encoder(Commentaire(**document))
+        }
+    return None
+
+def broadcast_live_update(event: dict):
+    update = live_update(event)
+    if update:
+        change_bus.broadcast(update)
+
+change_bus.subscribe(broadcast_live_update, collections=("recettes", "commentaires"))
+
+async def update_autocomplete(event: dict):
+    if event["operation"] == "reset":
+        await autocomplete_index.build(db)
+    else:
+        autocomplete_index.apply_change(event)
+
+change_bus.subscribe(update_autocomplete, collections=("recettes",))
+change_bus.subscribe(facet_counter.apply_change, collections=("recettes",))
+
+@api_router.get("/recettes/{recette_id}/live")
+async def live_recette(recette_id: str, request: Request):
+    """Server-Sent Events stream of rating and comment updates for a recipe"""
+    async def events():
+        queue = change_bus.open_stream(lambda update: update["recette_id"] == recette_id)
+        try:
+            # Tells EventSource how long to wait before reconnecting
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    update = await asyncio.wait_for(queue.get(), timeout=LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeping proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {update['type']}\ndata: {json.dumps(update)}\n\n"
+        finally:
+            change_bus.close_stream(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # AI Suggestions
+def prompt_suggestion(ingredients: str) -> str:
+    return f"""Vous êtes un chef cuisinier expert qui suggère des recettes créatives et savoureuses basées sur les ingrédients disponibles. 
+
+Suggérez-moi une recette délicieuse avec ces ingrédients : {ingredients}
+
+Donnez-moi le titre, la liste des ingrédients nécessaires, et les instructions de préparation étape par étape.
+Répondez en français."""
+
+def prompt_recette_complete(ingredients: str) -> str:
+    return f"""Vous êtes un chef cuisinier expert. Créez une recette complète avec ces ingrédients : {ingredients}
+
+Répondez UNIQUEMENT en format JSON avec cette structure exacte :
+{{
+    "titre": "Nom de la recette",
+    "ingredients": "Liste complète des ingrédients avec quantités (séparés par des retours à la ligne)",
+    "instructions": "Instructions de préparation étape par étape (séparées par des retours à la ligne)", 
+    "categorie": "Catégorie parmi: Entrée, Plat principal, Dessert, Boisson, Apéritif, Petit-déjeuner, Goûter, Sauce, Autre"
+}}
+
+Incluez TOUS les ingrédients nécessaires, pas seulement ceux fournis. Répondez en français."""
+
+async def generate_ia(endpoint: str, prompt: str) -> LLMResponse:
+    """Call the configured LLM provider with tracing and metrics"""
+    with tracer.start_as_current_span(
+        "llm.generate", attributes={"ai.provider": llm_provider.name, "ai.model": llm_provider.model}
+    ), track_ai_call(endpoint, llm_provider.model) as record_usage:
+        response = await llm_provider.generate(prompt)
+        record_usage(response)
+    return response
+
 @api_router.post("/ia/suggestions")
 async def get_suggestions_ia(suggestion_data: SuggestionIA):
-    if not GOOGLE_GEMINI_API_KEY:
+    if not llm_provider.available:
         raise HTTPException(status_code=503, detail="Service IA non disponible")
     
     try:
-        # Use Google Gemini directly
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        prompt = f"""Vous êtes un chef cuisinier expert qui suggère des recettes créatives et savoureuses basées sur les ingrédients disponibles. 
-
-Suggérez-moi une recette délicieuse avec ces ingrédients : {suggestion_data.ingredients}
-
-Donnez-moi le titre, la liste des ingrédients nécessaires, et les instructions de préparation étape par étape.
-Répondez en français."""
-        
-        response = model.generate_content(prompt)
-        
+        response = await generate_ia("suggestions", prompt_suggestion(suggestion_data.ingredients))
         return {"suggestion": response.text}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération de suggestions: {str(e)}")
 
+@api_router.post("/ia/suggestions/stream")
+async def stream_suggestions_ia(suggestion_data: SuggestionIA):
+    """Same as /ia/suggestions but streams the text as the model produces it"""
+    if not llm_provider.available:
+        raise HTTPException(status_code=503, detail="Service IA non disponible")
+    
+    prompt = prompt_suggestion(suggestion_data.ingredients)
+    
+    async def chunks():
+        with tracer.start_as_current_span(
+            "llm.stream", attributes={"ai.provider": llm_provider.name, "ai.model": llm_provider.model}
+        ), track_ai_call("suggestions-stream", llm_provider.model):
+            try:
+                async for chunk in llm_provider.stream(prompt):
+                    yield chunk
+            except LLMError as e:
+                yield f"\n[Erreur lors de la génération de suggestions: {str(e)}]"
+    
+    return StreamingResponse(chunks(), media_type="text/plain; charset=utf-8")
+
+
+@traced("ia.parse_json")
+def parse_recette_ia(text: str) -> dict:
+    """Extract the recipe JSON from a model answer, raise ValueError if unusable"""
+    # Clean the response to extract JSON
+    cleaned_response = text.strip()
+    if cleaned_response.startswith('```json'):
+        cleaned_response = cleaned_response[7:]
+    if cleaned_response.endswith('```'):
+        cleaned_response = cleaned_response[:-3]
+    
+    recette_data = json.loads(cleaned_response)
+    
+    # Validate required fields
+    required_fields = ['titre', 'ingredients', 'instructions', 'categorie']
+    for field in required_fields:
+        if field not in recette_data:
+            raise ValueError(f"Champ manquant: {field}")
+    
+    return recette_data
 
 @api_router.post("/ia/generer-recette")
 async def generer_recette_complete(suggestion_data: SuggestionIA):
     """Génère une recette complète avec ingrédients et instructions séparément structurés"""
-    if not GOOGLE_GEMINI_API_KEY:
+    if not llm_provider.available:
         raise HTTPException(status_code=503, detail="Service IA non disponible")
     
     try:
-        # Use Google Gemini directly
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        prompt = f"""Vous êtes un chef cuisinier expert. Créez une recette complète avec ces ingrédients : {suggestion_data.ingredients}
-
-Répondez UNIQUEMENT en format JSON avec cette structure exacte :
-{{
-    "titre": "Nom de la recette",
-    "ingredients": "Liste complète des ingrédients avec quantités (séparés par des retours à la ligne)",
-    "instructions": "Instructions de préparation étape par étape (séparées par des retours à la ligne)", 
-    "categorie": "Catégorie parmi: Entrée, Plat principal, Dessert, Boisson, Apéritif, Petit-déjeuner, Goûter, Sauce, Autre"
-}}
-
-Incluez TOUS les ingrédients nécessaires, pas seulement ceux fournis. Répondez en français."""
-        
-        response = model.generate_content(prompt)
+        response = await generate_ia("generer-recette", prompt_recette_complete(suggestion_data.ingredients))
         
         # Try to parse JSON response
         try:
-            import json
-            # Clean the response to extract JSON
-            cleaned_response = response.text.strip()
-            if cleaned_response.startswith('```json'):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith('```'):
-                cleaned_response = cleaned_response[:-3]
-            
-            recette_data = json.loads(cleaned_response)
-            
-            # Validate required fields
-            required_fields = ['titre', 'ingredients', 'instructions', 'categorie']
-            for field in required_fields:
-                if field not in recette_data:
-                    raise ValueError(f"Champ manquant: {field}")
-            
+            recette_data = parse_recette_ia(response.text)
             return {"recette": recette_data, "raw_response": response.text}
             
         except (json.JSONDecodeError, ValueError) as e:
@@ -538,26 +949,137 @@ async def get_recettes_en_attente(admin_user: User = Depends(get_admin_user)):
     return [Recette(**recette) for recette in recettes]
 
 @api_router.post("/admin/recettes/{recette_id}/approuver")
-async def approuver_recette(recette_id: str, admin_user: User = Depends(get_admin_user)):
-    result = await db.recettes.update_one(
-        {"id": recette_id},
-        {"$set": {"approuve": True}}
+async def approuver_recette(
+    recette_id: str,
+    if_match: Optional[str] = Header(None),
+    admin_user: User = Depends(get_admin_user)
+):
+    # With If-Match, approve only the version the moderator reviewed
+    recette = await modifier_recette(
+        recette_id, {"$set": {"approuve": True}}, version=parse_if_match(if_match), projection={"image": 0}
     )
     
-    if result.matched_count == 0:
+    if recette is None:
         raise HTTPException(status_code=404, detail="Recette non trouvée")
     
-    return {"message": "Recette approuvée avec succès"}
+    autocomplete_index.add(recette)
+    facet_counter.invalidate()
+    similarity_index.wakeup()
+    return {"message": "Recette approuvée avec succès", "version": recette["version"]}
+
+async def supprimer_recettes(recette_ids: List[str]) -> int:
+    """Delete recipes with their votes, comments and derived rankings/similarity lists"""
+    result = await db.recettes.delete_many({"id": {"$in": recette_ids}})
+    await db.votes.delete_many({"recette_id": {"$in": recette_ids}})
+    await db.commentaires.delete_many({"recette_id": {"$in": recette_ids}})
+    await db.votes_archive.delete_many({"recette_id": {"$in": recette_ids}})
+    await db.commentaires_archive.delete_many({"recette_id": {"$in": recette_ids}})
+    await db.recette_rankings.delete_many({"recette_id": {"$in": recette_ids}})
+    await db.recette_similaires.delete_many({"recette_id": {"$in": recette_ids}})
+    for recette_id in recette_ids:
+        autocomplete_index.remove(recette_id)
+    facet_counter.invalidate()
+    return result.deleted_count
 
 @api_router.delete("/admin/recettes/{recette_id}")
 async def rejeter_recette(recette_id: str, admin_user: User = Depends(get_admin_user)):
-    result = await db.recettes.delete_one({"id": recette_id})
-    
-    if result.deleted_count == 0:
+    # Votes, comments and derived documents go with the recipe
+    if await supprimer_recettes([recette_id]) == 0:
         raise HTTPException(status_code=404, detail="Recette non trouvée")
     
     return {"message": "Recette rejetée et supprimée"}
 
+@api_router.post("/admin/recettes/approuver")
+async def approuver_recettes(batch: ModerationBatch, admin_user: User = Depends(get_admin_user)):
+    """Approve a batch of recipes with a single update_many"""
+    ids = list(dict.fromkeys(batch.ids))
+    existantes = {
+        recette["id"]: recette["approuve"]
+        for recette in await db.recettes.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "approuve": 1}).to_list(len(ids))
+    }
+    a_approuver = [recette_id for recette_id, approuve in existantes.items() if not approuve]
+    if a_approuver:
+        await db.recettes.update_many(
+            {"id": {"$in": a_approuver}, "approuve": False},
+            {"$set": {"approuve": True}, "$inc": {"version": 1}}
+        )
+        async for recette in db.recettes.find({"id": {"$in": a_approuver}}, {"image": 0}):
+            autocomplete_index.add(recette)
+        facet_counter.invalidate()
+        similarity_index.wakeup()
+    
+    resultats = {}
+    for recette_id in ids:
+        if recette_id not in existantes:
+            resultats[recette_id] = "introuvable"
+        elif existantes[recette_id]:
+            resultats[recette_id] = "deja_approuvee"
+        else:
+            resultats[recette_id] = "approuvee"
+    return {"approuvees": len(a_approuver), "resultats": resultats}
+
+@api_router.post("/admin/recettes/rejeter")
+async def rejeter_recettes(batch: ModerationBatch, admin_user: User = Depends(get_admin_user)):
+    """Reject (delete) a batch of recipes and everything attached to them"""
+    ids = list(dict.fromkeys(batch.ids))
+    existantes = await db.recettes.distinct("id", {"id": {"$in": ids}})
+    supprimees = await supprimer_recettes(existantes) if existantes else 0
+    existantes = set(existantes)
+    return {
+        "rejetees": supprimees,
+        "resultats": {
+            recette_id: "rejetee" if recette_id in existantes else "introuvable"
+            for recette_id in ids
+        }
+    }
+
+@api_router.post("/admin/nettoyage")
+async def nettoyer_orphelins(dry_run: bool = True, admin_user: User = Depends(get_admin_user)):
+    """Report (dry_run) or delete documents left behind by deleted recipes"""
+    rapport = await orphan_collector.run_once(dry_run=dry_run)
+    if rapport is None:
+        raise HTTPException(status_code=409, detail="Nettoyage déjà en cours")
+    return rapport
+
+@api_router.get("/admin/nettoyage")
+async def get_dernier_nettoyage(admin_user: User = Depends(get_admin_user)):
+    """Report of the last cleanup run by this worker"""
+    return {"rapport": orphan_collector.last_report}
+
+@api_router.get("/admin/export")
+async def exporter_recettes(approuvees: bool = False, gzip: bool = False, admin_user: User = Depends(get_admin_user)):
+    """Stream the catalog as NDJSON (one recipe per line), gzip-compressed on request"""
+    query = {"approuve": True} if approuvees else {}
+    filename = "recettes.ndjson.gz" if gzip else "recettes.ndjson"
+    return StreamingResponse(
+        export_ndjson(db, query, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.post("/admin/import")
+async def importer_recettes(request: Request, admin_user: User = Depends(get_admin_user)):
+    """Insert recipes from an NDJSON body (plain or gzip), validated line by line"""
+    def indexer(recettes: List[dict]) -> None:
+        # Only the inserted recipes are indexed, rather than rebuilding the whole index
+        for recette in recettes:
+            if recette["approuve"]:
+                autocomplete_index.add(recette)
+
+    rapport = await import_ndjson(db, iter_lines(request.stream()), Recette, on_insert=indexer)
+    if rapport["importees"]:
+        facet_counter.invalidate()
+        similarity_index.wakeup()
+    return rapport
+
+@api_router.post("/admin/archivage")
+async def archiver(admin_user: User = Depends(get_admin_user)):
+    """Archive old comments and votes now instead of waiting for the daily run"""
+    rapport = await archive_job.run_once()
+    if rapport is None:
+        raise HTTPException(status_code=409, detail="Archivage déjà en cours")
+    return rapport
+
 @api_router.get("/admin/stats")
 async def get_admin_stats(admin_user: User = Depends(get_admin_user)):
     total_users = await db.users.count_documents({})
@@ -572,6 +1094,19 @@ async def get_admin_stats(admin_user: User = Depends(get_admin_user)):
         "recettes_en_attente": recettes_en_attente
     }
 
+@api_router.post("/admin/classements/recalculer")
+async def recalculer_classements(admin_user: User = Depends(get_admin_user)):
+    """Recompute the top/trending rankings now instead of waiting for the job"""
+    resultat = await ranking_job.run_once(force=True)
+    if resultat is None:
+        raise HTTPException(status_code=409, detail="Calcul des classements déjà en cours")
+    return resultat
+
+@api_router.get("/admin/boucle/blocages")
+async def get_blocages_boucle(admin_user: User = Depends(get_admin_user)):
+    """Most recent event-loop stalls detected by the watchdog"""
+    return {"seuil_ms": loop_watchdog.threshold * 1000, "blocages": list(reversed(loop_watchdog.reports))}
+
 # Initialize admin user on startup
 @api_router.post("/init-admin")
 async def init_admin():
@@ -604,6 +1139,36 @@ async def init_admin():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Rate limiting of expensive endpoints (bcrypt, emails, LLM calls, image processing).
+# Added before CORS so that 429 responses still carry the CORS headers.
+RATE_LIMIT_RULES = [
+    RateLimitRule(("POST",), r"/api/auth/login", (
+        RateLimitPolicy("login-ip", capacity=10, per_seconds=60),
+    )),
+    RateLimitRule(("POST",), r"/api/auth/(forgot-password|reset-password)", (
+        RateLimitPolicy("password-reset-ip", capacity=5, per_seconds=900),
+    )),
+    RateLimitRule(("POST",), r"/api/ia/.+", (
+        RateLimitPolicy("ia-user", capacity=5, per_seconds=300, key="user"),
+        RateLimitPolicy("ia-ip", capacity=20, per_seconds=300),
+    )),
+    RateLimitRule(("POST",), r"/api/recettes", (
+        RateLimitPolicy("upload-user", capacity=10, per_seconds=3600, key="user"),
+    )),
+    # Edits can upload an image too: same bucket as creations
+    RateLimitRule(("PATCH",), r"/api/recettes/[^/]+", (
+        RateLimitPolicy("upload-user", capacity=10, per_seconds=3600, key="user"),
+    )),
+]
+app.add_middleware(
+    RateLimitMiddleware,
+    rules=RATE_LIMIT_RULES,
+    backend=coordination.rate_limiter,
+    jwt_secret=JWT_SECRET,
+    trust_proxy=os.environ.get('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true',
+    enabled=os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -612,6 +1177,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
+# Outermost middleware so that every response (including 429s) is measured
+app.add_middleware(PrometheusMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -619,6 +1194,86 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    # Recipe lookups by id; also makes catalog imports safe to replay
+    await db.recettes.create_index("id", unique=True)
+    # Recipes written before versioning start at version 1
+    await db.recettes.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+    # Per-user vote lookups for listings ($in on the page's recipe ids)
+    await db.votes.create_index([("user_id", 1), ("recette_id", 1)])
+    # Reset tokens: digest lookup, per-user invalidation, and expiry reaped by Mongo
+    await db.password_reset_tokens.create_index("token_hash", unique=True, sparse=True)
+    await db.password_reset_tokens.create_index([("user_id", 1), ("used", 1)])
+    await db.password_reset_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await email_outbox.create_indexes()
+    await coordination.setup()
+    await change_watcher.create_indexes()
+    await ranking_job.create_indexes()
+    await similarity_index.create_indexes()
+    await orphan_collector.create_indexes()
+    await archive_job.create_indexes()
+    # Pantry matching: multikey index on the normalized ingredient tokens
+    await db.recettes.create_index([("ingredient_tokens", 1), ("approuve", 1)])
+    await backfill_ingredient_tokens(db)
+
+@app.on_event("startup")
+async def start_email_outbox():
+    await email_outbox.redact_finished()
+    email_outbox.start()
+
+@app.on_event("startup")
+async def build_autocomplete_index():
+    count = await autocomplete_index.build(db)
+    logger.info("Index d'autocomplétion construit: %d recettes", count)
+
+@app.on_event("startup")
+async def start_change_watcher():
+    if CHANGE_STREAMS_ENABLED:
+        change_watcher.start()
+
+@app.on_event("startup")
+async def start_ranking_job():
+    if RANKINGS_ENABLED:
+        ranking_job.start()
+
+@app.on_event("startup")
+async def start_similarity_index():
+    if SIMILARITY_ENABLED:
+        similarity_index.start()
+
+@app.on_event("startup")
+async def start_orphan_collector():
+    if GC_ENABLED:
+        orphan_collector.start()
+
+@app.on_event("startup")
+async def start_archive_job():
+    if ARCHIVE_ENABLED:
+        archive_job.start()
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    app.state.loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    if LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.register_routes(app.routes)
+        loop_watchdog.start()
+    if LOOP_WATCHDOG_DEBUG:
+        # asyncio debug mode additionally logs every callback slower than the threshold
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = loop_watchdog.threshold
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    app.state.loop_lag_monitor.cancel()
+    await loop_watchdog.stop()
+    await email_outbox.stop()
+    await change_watcher.stop()
+    await ranking_job.stop()
+    await similarity_index.stop()
+    await orphan_collector.stop()
+    await archive_job.stop()
+    await coordination.close()
+    client.close()
+    shutdown_tracing()
\ No newline at end of file
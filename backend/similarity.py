@@ -0,0 +1,302 @@
+"""Precomputed "similar recipes" lists.
+
+Each approved recipe is represented by a TF-IDF vector of its title words
+(counted twice) and ingredient tokens, stored as rows of a SciPy sparse
+matrix. Since rows are L2-normalized, cosine similarities of a block of
+recipes against the catalog are one sparse matrix product; the ``k`` best
+neighbours of every recipe are written to ``db.recette_similaires`` and the
+endpoint only reads that list.
+
+A full rebuild (vocabulary, IDF weights and all neighbour lists) runs every
+``rebuild_interval``. In between, recipes approved since then are vectorized
+with the stored vocabulary and inserted: they get their own list and are
+pushed into their neighbours' lists, which Mongo keeps sorted and capped at
+``k``. Terms first seen in the meantime only count after the next rebuild,
+which runs right away while the vocabulary is empty (fresh deployment).
+An edited recipe is marked stale: it is pulled from the other lists and
+inserted again like a new one, its old row no longer matching anything.
+
+Whether a recipe is already indexed is read from ``db.recette_similaires``,
+not from the worker's matrix: recipes inserted by another worker are loaded
+into the matrix instead of being inserted twice, and a recipe is pulled from
+a neighbour's list before being pushed into it.
+
+The vocabulary and IDF weights are stored in ``db.similarity_model`` so that
+any worker holding the coordination lock can continue incrementally without
+recomputing all pairs.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+from pymongo import ReplaceOne, UpdateOne
+
+from coordination import CoordinationBackend, LockNotAcquired
+from ingredients import extract_ingredients, normalize_terms
+
+logger = logging.getLogger(__name__)
+
+TITLE_WEIGHT = 2
+
+
+def recette_terms(recette: dict) -> List[str]:
+    tokens = recette.get("ingredient_tokens")
+    if tokens is None:
+        tokens = extract_ingredients(recette.get("ingredients", ""))
+    return normalize_terms(recette.get("titre", "")) * TITLE_WEIGHT + list(tokens)
+
+
+def fit_idf(documents: List[List[str]]) -> Tuple[Dict[str, int], np.ndarray]:
+    document_frequency = Counter()
+    for terms in documents:
+        document_frequency.update(set(terms))
+    terms = sorted(document_frequency)
+    count = len(documents)
+    idf = np.array([math.log((1 + count) / (1 + document_frequency[term])) + 1 for term in terms])
+    return {term: column for column, term in enumerate(terms)}, idf
+
+
+def vectorize(documents: List[List[str]], vocabulary: Dict[str, int], idf: np.ndarray) -> sparse.csr_matrix:
+    """L2-normalized TF-IDF rows (sublinear term frequency); unknown terms are ignored"""
+    indptr, indices, values = [0], [], []
+    for terms in documents:
+        counts = Counter(term for term in terms if term in vocabulary)
+        columns = [vocabulary[term] for term in counts]
+        weights = np.array([(1 + math.log(counts[term])) for term in counts]) * idf[columns] if columns else np.array([])
+        norm = np.linalg.norm(weights)
+        indices.extend(columns)
+        values.extend(weights / norm if norm else weights)
+        indptr.append(len(indices))
+    return sparse.csr_matrix((values, indices, indptr), shape=(len(documents), len(vocabulary)))
+
+
+def top_neighbours(rows: sparse.csr_matrix, matrix: sparse.csr_matrix, k: int, min_score: float,
+                   exclude_offset: int = 0, block: int = 256) -> List[List[Tuple[int, float]]]:
+    """Best ``k`` rows of ``matrix`` for each row of ``rows``
+
+    Row ``i`` of ``rows`` is row ``exclude_offset + i`` of ``matrix`` when the
+    block is part of the catalog; it is left out of its own neighbours.
+    """
+    transposed = matrix.T.tocsc()
+    neighbours = []
+    for start in range(0, rows.shape[0], block):
+        scores = (rows[start:start + block] @ transposed).tocsr()
+        for offset in range(scores.shape[0]):
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            columns, values = scores.indices[begin:end], scores.data[begin:end]
+            keep = (values >= min_score) & (columns != exclude_offset + start + offset)
+            columns, values = columns[keep], values[keep]
+            if len(values) > k:
+                best = np.argpartition(-values, k)[:k]
+                columns, values = columns[best], values[best]
+            order = np.argsort(-values, kind="stable")
+            neighbours.append([(int(columns[i]), float(values[i])) for i in order])
+    return neighbours
+
+
+class SimilarityIndex:
+    def __init__(self, db, coordination: CoordinationBackend, k: int = 10, rebuild_interval: float = 6 * 3600,
+                 poll_interval: float = 60.0, min_score: float = 0.05, fanout: int = 50, batch_size: int = 500):
+        self.db = db
+        self.coordination = coordination
+        self.k = k
+        self.rebuild_interval = rebuild_interval
+        self.poll_interval = poll_interval
+        self.min_score = min_score
+        # An inserted recipe is pushed into the lists of at most this many neighbours
+        self.fanout = fanout
+        self.batch_size = batch_size
+        self._model_id: Optional[str] = None
+        self._vocabulary: Dict[str, int] = {}
+        self._idf = np.array([])
+        self._matrix: Optional[sparse.csr_matrix] = None
+        self._ids: List[str] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def create_indexes(self) -> None:
+        await self.db.recette_similaires.create_index("recette_id", unique=True)
+        await self.db.recette_similaires.create_index("similaires.recette_id")
+
+    async def _load_recettes(self, query: Optional[dict] = None) -> List[dict]:
+        return await self.db.recettes.find(
+            {"approuve": True, **(query or {})},
+            {"_id": 0, "id": 1, "titre": 1, "ingredients": 1, "ingredient_tokens": 1}
+        ).to_list(None)
+
+    async def _write_lists(self, lists: Dict[str, List[dict]], computed_at: datetime) -> None:
+        operations = []
+        for recette_id, similaires in lists.items():
+            operations.append(ReplaceOne(
+                {"recette_id": recette_id},
+                {"recette_id": recette_id, "similaires": similaires, "computed_at": computed_at},
+                upsert=True
+            ))
+            if len(operations) >= self.batch_size:
+                await self.db.recette_similaires.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.db.recette_similaires.bulk_write(operations, ordered=False)
+
+    def _fit(self, recettes: List[dict]):
+        documents = [recette_terms(recette) for recette in recettes]
+        vocabulary, idf = fit_idf(documents)
+        matrix = vectorize(documents, vocabulary, idf)
+        return vocabulary, idf, matrix, top_neighbours(matrix, matrix, self.k, self.min_score)
+
+    async def rebuild(self) -> dict:
+        """Refit the vocabulary and recompute every neighbour list"""
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        recettes = await self._load_recettes()
+        vocabulary, idf, matrix, neighbours = await asyncio.to_thread(self._fit, recettes)
+        ids = [recette["id"] for recette in recettes]
+
+        await self._write_lists({
+            ids[row]: [{"recette_id": ids[column], "score": round(score, 4)} for column, score in found]
+            for row, found in enumerate(neighbours)
+        }, now)
+        await self.db.recette_similaires.delete_many({"computed_at": {"$lt": now}})
+        model_id = now.isoformat()
+        await self.db.similarity_model.replace_one(
+            {"_id": "tfidf"},
+            {"_id": "tfidf", "model_id": model_id, "vocabulary": list(vocabulary), "idf": idf.tolist(),
+             "terms": len(vocabulary), "built_at": now},
+            upsert=True
+        )
+        self._model_id, self._vocabulary, self._idf, self._matrix, self._ids = model_id, vocabulary, idf, matrix, ids
+
+        duration = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("Recettes similaires recalculées: %d recettes, %d termes en %.0f ms", len(ids), len(vocabulary), duration)
+        return {"recettes": len(ids), "termes": len(vocabulary), "duree_ms": duration}
+
+    async def _load_model(self, model: dict) -> None:
+        """Rebuild the in-memory matrix from a model fitted by another worker"""
+        vocabulary = {term: column for column, term in enumerate(model["vocabulary"])}
+        idf = np.array(model["idf"])
+        indexed = await self.db.recette_similaires.distinct("recette_id")
+        recettes = await self._load_recettes({"id": {"$in": indexed}})
+        matrix = await asyncio.to_thread(vectorize, [recette_terms(r) for r in recettes], vocabulary, idf)
+        self._model_id, self._vocabulary, self._idf, self._matrix = model["model_id"], vocabulary, idf, matrix
+        self._ids = [recette["id"] for recette in recettes]
+
+    async def mark_stale(self, recette_id: str) -> None:
+        """Recompute a recipe's neighbours after its title or ingredients changed"""
+        await self.db.recette_similaires.update_many(
+            {"similaires.recette_id": recette_id}, {"$pull": {"similaires": {"recette_id": recette_id}}}
+        )
+        await self.db.recette_similaires.update_one({"recette_id": recette_id}, {"$set": {"stale": True}})
+        self.wakeup()
+
+    async def _catch_up(self, indexed: Set[str]) -> None:
+        """Add the recipes inserted by other workers since the model was loaded to the matrix"""
+        missing = indexed - set(self._ids)
+        if not missing:
+            return
+        recettes = await self._load_recettes({"id": {"$in": list(missing)}})
+        rows = vectorize([recette_terms(recette) for recette in recettes], self._vocabulary, self._idf)
+        self._matrix = sparse.vstack([self._matrix, rows]).tocsr()
+        self._ids = self._ids + [recette["id"] for recette in recettes]
+
+    async def insert_new(self) -> int:
+        """Give recipes approved (or edited) since the last rebuild their neighbours"""
+        indexed = set(await self.db.recette_similaires.distinct("recette_id", {"stale": {"$ne": True}}))
+        await self._catch_up(indexed)
+        # Rows of edited, unpublished or deleted recipes no longer match anything
+        stale = set(self._ids) - indexed
+        new_ids = [recette_id for recette_id in await self.db.recettes.distinct("id", {"approuve": True})
+                   if recette_id not in indexed]
+        if not new_ids:
+            return 0
+        recettes = await self._load_recettes({"id": {"$in": new_ids}})
+        rows = vectorize([recette_terms(recette) for recette in recettes], self._vocabulary, self._idf)
+        matrix = self._matrix
+        if stale:
+            # Old vectors of edited recipes stay as empty rows so that positions don't move
+            keep = np.array([0.0 if recette_id in stale else 1.0 for recette_id in self._ids])
+            matrix = (sparse.diags(keep) @ matrix).tocsr()
+        catalog = sparse.vstack([matrix, rows]).tocsr()
+        ids = self._ids + [recette["id"] for recette in recettes]
+        neighbours = await asyncio.to_thread(
+            top_neighbours, rows, catalog, max(self.k, self.fanout), self.min_score, len(self._ids)
+        )
+
+        now = datetime.now(timezone.utc)
+        lists, pushes = {}, []
+        for offset, found in enumerate(neighbours):
+            recette_id = ids[len(self._ids) + offset]
+            lists[recette_id] = [{"recette_id": ids[column], "score": round(score, 4)} for column, score in found[:self.k]]
+            for column, score in found:
+                if column < len(self._ids):
+                    # Pull first: the list may already hold the recipe (edited, or an interrupted run)
+                    pushes.append(UpdateOne(
+                        {"recette_id": ids[column]}, {"$pull": {"similaires": {"recette_id": recette_id}}}
+                    ))
+                    pushes.append(UpdateOne({"recette_id": ids[column]}, {"$push": {"similaires": {
+                        "$each": [{"recette_id": recette_id, "score": round(score, 4)}],
+                        "$sort": {"score": -1},
+                        "$slice": self.k
+                    }}}))
+        await self._write_lists(lists, now)
+        for start in range(0, len(pushes), 2 * self.batch_size):
+            # Ordered, so that each pull runs before its push
+            await self.db.recette_similaires.bulk_write(pushes[start:start + 2 * self.batch_size])
+        self._matrix, self._ids = catalog, ids
+        return len(recettes)
+
+    async def run_once(self, force_rebuild: bool = False) -> Optional[dict]:
+        """Rebuild when due, otherwise insert new recipes; None when another worker holds the lock"""
+        try:
+            async with self.coordination.lock("similarity", ttl=600.0):
+                model = await self.db.similarity_model.find_one(
+                    {"_id": "tfidf"}, {"model_id": 1, "built_at": 1, "terms": 1}
+                )
+                built_at = model["built_at"].replace(tzinfo=timezone.utc) if model else None
+                # An empty vocabulary (model fitted on an empty catalog) gives no neighbours at all
+                if (force_rebuild or model is None or not model.get("terms")
+                        or built_at + timedelta(seconds=self.rebuild_interval) < datetime.now(timezone.utc)):
+                    return await self.rebuild()
+                if self._model_id != model["model_id"]:
+                    await self._load_model(await self.db.similarity_model.find_one({"_id": "tfidf"}))
+                return {"nouvelles": await self.insert_new()}
+        except LockNotAcquired:
+            return None
+
+    async def similaires(self, recette_id: str) -> List[dict]:
+        entry = await self.db.recette_similaires.find_one({"recette_id": recette_id}, {"_id": 0, "similaires": 1})
+        return entry["similaires"] if entry else []
+
+    def wakeup(self) -> None:
+        """Process newly approved recipes now rather than at the next poll"""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Erreur lors du calcul des recettes similaires")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
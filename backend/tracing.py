@@ -0,0 +1,186 @@
+"""OpenTelemetry tracing.
+
+Spans are created for every HTTP request, every Mongo command, every Gemini
+call and the image processing step. Tracing is configured from the
+environment:
+
+- TRACING_EXPORTER: none (default), otlp, json or console
+- TRACING_OTLP_ENDPOINT: OTLP/HTTP collector (default http://localhost:4318/v1/traces)
+- TRACING_JSON_PATH: JSON lines file for offline analysis (default traces.jsonl)
+- TRACING_SAMPLE_RATIO: fraction of new traces kept, children follow their parent
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+from typing import Sequence
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+)
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from pymongo import monitoring
+
+from metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("recettes")
+
+
+class JsonFileSpanExporter(SpanExporter):
+    """Append finished spans as JSON lines to a local file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = [json.dumps(json.loads(span.to_json()), ensure_ascii=False) for span in spans]
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as output:
+                output.write("\n".join(lines) + "\n")
+        except OSError:
+            logger.exception("Impossible d'écrire les spans dans %s", self.path)
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _exporter_from_env(kind: str) -> SpanExporter:
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(
+            endpoint=os.environ.get("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        )
+    if kind == "json":
+        return JsonFileSpanExporter(os.environ.get("TRACING_JSON_PATH", "traces.jsonl"))
+    if kind == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"TRACING_EXPORTER inconnu: {kind}")
+
+
+def setup_tracing(service_name: str = "recettes-backend") -> bool:
+    """Install the tracer provider described by the environment, return whether tracing is on"""
+    kind = os.environ.get("TRACING_EXPORTER", "none")
+    if kind == "none":
+        return False
+
+    ratio = float(os.environ.get("TRACING_SAMPLE_RATIO", "1.0"))
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(ratio))
+    )
+    provider.add_span_processor(BatchSpanProcessor(_exporter_from_env(kind)))
+    trace.set_tracer_provider(provider)
+    _propagate_context_to_motor()
+    return True
+
+
+def shutdown_tracing() -> None:
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
+
+
+def _propagate_context_to_motor() -> None:
+    """Run Motor's executor jobs inside the caller's context so Mongo spans get their parent"""
+    from motor.frameworks import asyncio as motor_asyncio
+
+    if getattr(motor_asyncio.run_on_executor, "_propagates_context", False):
+        return
+    original = motor_asyncio.run_on_executor
+
+    def run_on_executor(loop, fn, *args, **kwargs):
+        context = contextvars.copy_context()
+        return original(loop, context.run, functools.partial(fn, *args, **kwargs))
+
+    run_on_executor._propagates_context = True
+    motor_asyncio.run_on_executor = run_on_executor
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per request (W3C traceparent is honoured)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers") or []}
+        route = route_template(scope)
+        attributes = {
+            "http.method": scope["method"],
+            "http.route": route,
+            "http.target": scope["path"],
+        }
+
+        with tracer.start_as_current_span(
+            f"{scope['method']} {route}",
+            context=propagate.extract(headers),
+            kind=SpanKind.SERVER,
+            attributes=attributes
+        ) as span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+class MongoTracingListener(monitoring.CommandListener):
+    """pymongo command listener emitting one client span per command"""
+
+    def __init__(self):
+        self._spans = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else "-"
+        span = tracer.start_span(
+            f"mongo {event.command_name} {collection}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.mongodb.collection": collection,
+            }
+        )
+        self._spans[(event.connection_id, event.request_id)] = span
+
+    def succeeded(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.end()
+
+    def failed(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.set_status(Status(StatusCode.ERROR, str(event.failure)))
+            span.end()
+
+
+def traced(name: str):
+    """Decorator wrapping a synchronous function in a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,35 @@
+"""Recipe versions: ETags, If-Match parsing and compare-and-set filters.
+
+Every write to a recipe increments its ``version`` field. Recipes written
+before versioning existed have no such field and count as version 1, so
+the compare-and-set filter for version 1 also matches a missing field.
+"""
+from typing import Optional, Union
+
+from fastapi import HTTPException
+
+
+def etag_version(version: int) -> str:
+    return f'"v{version}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Version required by an If-Match header (None when absent or "*")"""
+    if not if_match or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"').removeprefix("v"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="En-tête If-Match invalide")
+
+
+def version_filter(version: int) -> Union[int, dict]:
+    """Query on ``version`` matching a recipe still at ``version``"""
+    return {"$in": [1, None]} if version == 1 else version
+
+
+def versioned_update(update: dict, version: Optional[int] = None) -> dict:
+    """``update`` plus the version bump: set to ``version + 1`` when the write is conditional"""
+    if version is None:
+        return {**update, "$inc": {"version": 1}}
+    return {**update, "$set": {**update.get("$set", {}), "version": version + 1}}
@@ -1,6 +1,8 @@
 import requests
 import sys
 import json
+import hashlib
+import secrets
 from datetime import datetime
 import base64
 import io
@@ -321,7 +323,7 @@ class RecipeAPITester:
         mongo_url = os.environ['MONGO_URL']
         db_name = os.environ['DB_NAME']
         
-        # Connect to MongoDB Atlas to extract the reset token
+        # Connect to MongoDB Atlas to set a known reset token
         try:
             mongo_client = pymongo.MongoClient(mongo_url)
             db = mongo_client[db_name]
@@ -363,18 +365,19 @@ class RecipeAPITester:
             if not success:
                 return False
             
-            # Extract the token from database
-            token_record = db.password_reset_tokens.find_one(
+            # Only a hash is stored and the emailed link is not kept at rest,
+            # so swap in the hash of a token generated here
+            reset_token = secrets.token_urlsafe(32)
+            result = db.password_reset_tokens.update_one(
                 {"email": test_email, "used": False},
-                sort=[("created_at", -1)]
+                {"$set": {"token_hash": hashlib.sha256(reset_token.encode('utf-8')).hexdigest()}}
             )
             
-            if not token_record:
+            if not result.modified_count:
                 print("   ❌ No reset token found in database")
                 return False
             
-            reset_token = token_record["token"]
-            print(f"   ✅ Reset token extracted: {reset_token[:10]}...")
+            print(f"   ✅ Reset token replaced: {reset_token[:10]}...")
             
             # Test token verification
             success, response = self.run_test(
@@ -29,6 +29,7 @@ const Admin = () => {
   });
   const [loading, setLoading] = useState(true);
   const [expandedRecette, setExpandedRecette] = useState(null);
+  const [selection, setSelection] = useState([]);
 
   useEffect(() => {
     fetchAdminData();
@@ -93,6 +94,39 @@ const Admin = () => {
     }
   };
 
+  const toggleSelection = (recetteId) => {
+    setSelection(prev =>
+      prev.includes(recetteId) ? prev.filter(id => id !== recetteId) : [...prev, recetteId]
+    );
+  };
+
+  const moderationGroupee = async (action) => {
+    if (action === 'rejeter' && !window.confirm(`Rejeter et supprimer ${selection.length} recette(s) ?`)) {
+      return;
+    }
+
+    try {
+      // One request for the whole selection, with a result per recipe
+      const response = await axios.post(`/admin/recettes/${action}`, { ids: selection });
+      const traitees = Object.keys(response.data.resultats);
+      const nombre = action === 'approuver' ? response.data.approuvees : response.data.rejetees;
+
+      setRecettesEnAttente(prev => prev.filter(r => !traitees.includes(r.id)));
+      setStats(prev => ({
+        ...prev,
+        total_recettes: action === 'rejeter' ? prev.total_recettes - nombre : prev.total_recettes,
+        recettes_approuvees: action === 'approuver' ? prev.recettes_approuvees + nombre : prev.recettes_approuvees,
+        recettes_en_attente: prev.recettes_en_attente - nombre
+      }));
+      setSelection([]);
+
+      toast.success(action === 'approuver' ? `${nombre} recette(s) approuvée(s)` : `${nombre} recette(s) rejetée(s)`);
+    } catch (error) {
+      console.error('Erreur lors de la modération groupée:', error);
+      toast.error('Erreur lors de la modération groupée');
+    }
+  };
+
   const getCategoryColor = (categorie) => {
     const categories = {
       'Entrée': 'bg-green-100 text-green-800 border-green-200',
@@ -208,6 +242,38 @@ const Admin = () => {
                 {recettesEnAttente.length}
               </Badge>
             </CardTitle>
+            {recettesEnAttente.length > 0 && (
+              <div className="flex flex-wrap items-center gap-3 pt-2">
+                <Button
+                  variant="outline"
+                  size="sm"
+                  onClick={() => setSelection(
+                    selection.length === recettesEnAttente.length ? [] : recettesEnAttente.map(r => r.id)
+                  )}
+                >
+                  {selection.length === recettesEnAttente.length ? 'Tout désélectionner' : 'Tout sélectionner'}
+                </Button>
+                <Button
+                  size="sm"
+                  disabled={selection.length === 0}
+                  onClick={() => moderationGroupee('approuver')}
+                  className="bg-green-500 hover:bg-green-600 text-white"
+                >
+                  <CheckCircle className="h-4 w-4 mr-2" />
+                  Approuver la sélection ({selection.length})
+                </Button>
+                <Button
+                  size="sm"
+                  disabled={selection.length === 0}
+                  onClick={() => moderationGroupee('rejeter')}
+                  variant="destructive"
+                  className="bg-red-500 hover:bg-red-600 text-white"
+                >
+                  <Trash2 className="h-4 w-4 mr-2" />
+                  Rejeter la sélection ({selection.length})
+                </Button>
+              </div>
+            )}
           </CardHeader>
           
           <CardContent className="p-6">
@@ -248,9 +314,17 @@ const Admin = () => {
                         <div className="flex-1 min-w-0">
                           <div className="flex items-start justify-between mb-3">
                             <div>
-                              <h3 className="playfair text-xl font-semibold text-gray-900 mb-2">
-                                {recette.titre}
-                              </h3>
+                              <label className="flex items-center space-x-3 mb-2 cursor-pointer">
+                                <input
+                                  type="checkbox"
+                                  checked={selection.includes(recette.id)}
+                                  onChange={() => toggleSelection(recette.id)}
+                                  className="h-4 w-4 accent-red-500"
+                                />
+                                <h3 className="playfair text-xl font-semibold text-gray-900">
+                                  {recette.titre}
+                                </h3>
+                              </label>
                               <div className="flex items-center space-x-3 mb-3">
                                 <Badge className={getCategoryColor(recette.categorie)}>
                                   {recette.categorie}
@@ -37,6 +37,26 @@ const RecetteDetail = () => {
     checkUser();
   }, [id]);
 
+  useEffect(() => {
+    // Live rating and comment updates pushed by the server (Server-Sent Events)
+    const source = new EventSource(`${axios.defaults.baseURL}/recettes/${id}/live`);
+    source.addEventListener('note', (event) => {
+      const data = JSON.parse(event.data);
+      setRecette(current => current && {
+        ...current,
+        note_moyenne: data.note_moyenne,
+        nb_votes: data.nb_votes
+      });
+    });
+    source.addEventListener('commentaire', (event) => {
+      const data = JSON.parse(event.data);
+      setCommentaires(current =>
+        current.some(c => c.id === data.commentaire.id) ? current : [data.commentaire, ...current]
+      );
+    });
+    return () => source.close();
+  }, [id]);
+
   const checkUser = () => {
     const token = localStorage.getItem('token');
     if (token) {
@@ -48,26 +68,21 @@ const RecetteDetail = () => {
 
   const fetchRecetteDetail = async () => {
     try {
-      // Fetch recette details
-      const recettesResponse = await axios.get('/recettes');
-      const foundRecette = recettesResponse.data.find(r => r.id === id);
+      // Fetch recette details and comments in a single call
+      const response = await axios.post('/recettes/batch', {
+        ids: [id],
+        include: ['commentaires']
+      });
+      const entry = response.data.recettes[id];
       
-      if (!foundRecette) {
+      if (!entry) {
         toast.error('Recette introuvable');
         navigate('/recettes');
         return;
       }
       
-      setRecette(foundRecette);
-      
-      // Fetch comments
-      try {
-        const commentsResponse = await axios.get(`/recettes/${id}/commentaires`);
-        setCommentaires(commentsResponse.data);
-      } catch (error) {
-        console.log('Pas de commentaires disponibles');
-        setCommentaires([]);
-      }
+      setRecette(entry.recette);
+      setCommentaires(entry.commentaires || []);
       
     } catch (error) {
       console.error('Erreur lors du chargement:', error);
@@ -104,7 +119,7 @@ const RecetteDetail = () => {
       await axios.post(`/recettes/${id}/noter`, { note });
       setRating(note);
       toast.success('Note enregistrée !');
-      
+
       // Refresh recette data to get updated rating
       fetchRecetteDetail();
     } catch (error) {
@@ -128,13 +143,14 @@ const RecetteDetail = () => {
 
     setSubmittingComment(true);
     try {
-      await axios.post(`/recettes/${id}/commentaires`, { 
+      const response = await axios.post(`/recettes/${id}/commentaires`, { 
         commentaire: comment.trim() 
       });
       setComment('');
       setShowCommentForm(false);
       toast.success('Commentaire ajouté !');
-      fetchRecetteDetail(); // Refresh to show new comment
+      // Show it right away, the live stream skips comments already listed
+      setCommentaires(current => [response.data.commentaire, ...current]);
     } catch (error) {
       toast.error('Erreur lors de l\'ajout du commentaire');
     } finally {
@@ -21,6 +21,9 @@ const Recettes = () => {
   const [categories, setCategories] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchInput, setSearchInput] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
+  const [categoryCounts, setCategoryCounts] = useState({});
   const [selectedCategory, setSelectedCategory] = useState('');
   const [sortBy, setSortBy] = useState('recent'); // recent, rating, popular
   const [user, setUser] = useState(null);
@@ -34,6 +37,27 @@ const Recettes = () => {
     fetchRecettes();
   }, [searchTerm, selectedCategory, sortBy]);
 
+  useEffect(() => {
+    // Counts per category for the current search, one cached aggregation server side
+    axios.get('/recettes/facettes', { params: searchTerm ? { search: searchTerm } : {} })
+      .then(response => setCategoryCounts(response.data.categories))
+      .catch(() => setCategoryCounts({}));
+  }, [searchTerm]);
+
+  useEffect(() => {
+    // Cheap suggestions on every keystroke, the full search once typing pauses
+    const query = searchInput.trim();
+    if (query.length >= 2) {
+      axios.get('/recettes/autocomplete', { params: { q: query } })
+        .then(response => setSuggestions(response.data.suggestions))
+        .catch(() => setSuggestions([]));
+    } else {
+      setSuggestions([]);
+    }
+    const timer = setTimeout(() => setSearchTerm(searchInput), 300);
+    return () => clearTimeout(timer);
+  }, [searchInput]);
+
   const checkUser = () => {
     const token = localStorage.getItem('token');
     if (token) {
@@ -74,28 +98,19 @@ const Recettes = () => {
         params.append('search', searchTerm);
       }
       
+      // Rankings are precomputed server side (Bayesian rating, recent activity)
+      if (sortBy === 'rating') {
+        params.append('sort', 'top');
+      } else if (sortBy === 'popular') {
+        params.append('sort', 'trending');
+      }
+      
       if (params.toString()) {
         url += '?' + params.toString();
       }
       
       const response = await axios.get(url);
-      let recettes = response.data;
-      
-      // Sort results
-      switch (sortBy) {
-        case 'rating':
-          recettes = recettes.sort((a, b) => b.note_moyenne - a.note_moyenne);
-          break;
-        case 'popular':
-          recettes = recettes.sort((a, b) => b.nb_votes - a.nb_votes);
-          break;
-        case 'recent':
-        default:
-          recettes = recettes.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
-          break;
-      }
-      
-      setRecettes(recettes);
+      setRecettes(response.data);
     } catch (error) {
       console.error('Erreur lors de la recherche:', error);
       toast.error('Erreur lors de la recherche');
@@ -103,7 +118,7 @@ const Recettes = () => {
   };
 
   const handleSearch = (e) => {
-    setSearchTerm(e.target.value);
+    setSearchInput(e.target.value);
   };
 
   const handleCategoryFilter = (category) => {
@@ -167,11 +182,17 @@ const Recettes = () => {
               <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 h-4 w-4 sm:h-5 sm:w-5 text-gray-400" />
               <Input
                 type="text"
-                value={searchTerm}
+                value={searchInput}
                 onChange={handleSearch}
+                list="suggestions-recettes"
                 className="pl-9 sm:pl-10 h-10 sm:h-12 border-gray-200 focus:border-red-500 focus:ring-red-500 text-sm sm:text-base"
                 placeholder="Rechercher une recette, un ingrédient..."
               />
+              <datalist id="suggestions-recettes">
+                {suggestions.map((suggestion) => (
+                  <option key={`${suggestion.type}-${suggestion.texte}`} value={suggestion.texte} />
+                ))}
+              </datalist>
             </div>
 
             {/* Category Filters */}
@@ -193,6 +214,7 @@ const Recettes = () => {
                     onClick={() => handleCategoryFilter(category)}
                   >
                     {category}
+                    {categoryCounts[category] !== undefined && ` (${categoryCounts[category]})`}
                   </Badge>
                 ))}
               </div>
@@ -262,7 +284,7 @@ const Recettes = () => {
               {searchTerm || selectedCategory ? (
                 <Button
                   onClick={() => {
-                    setSearchTerm('');
+                    setSearchInput('');
                     setSelectedCategory('');
                   }}
                   variant="outline"
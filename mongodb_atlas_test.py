@@ -89,6 +89,15 @@ async def test_mongodb_atlas_connection():
         tokens_count = await db.password_reset_tokens.count_documents({})
         print(f"   Password reset tokens: {tokens_count}")
         
+        # Finished emails must not keep their body (reset links)
+        bodies_count = await db.email_outbox.count_documents(
+            {"status": {"$in": ["sent", "failed"]}, "body": {"$exists": True}}
+        )
+        print(f"   Finished emails still holding a body: {bodies_count}")
+        if bodies_count:
+            print("   ❌ Email bodies are kept after delivery")
+            return False
+        
         # Check votes
         votes_count = await db.votes.count_documents({})
         print(f"   Votes in database: {votes_count}")
@@ -135,7 +144,7 @@ async def test_password_reset_tokens():
         print(f"Found {len(recent_tokens)} recent password reset tokens:")
         for i, token in enumerate(recent_tokens, 1):
             print(f"   {i}. Email: {token.get('email', 'N/A')}")
-            print(f"      Token: {token.get('token', 'N/A')[:20]}...")
+            print(f"      Token hash: {token.get('token_hash', 'N/A')[:20]}...")
             print(f"      Used: {token.get('used', 'N/A')}")
             print(f"      Created: {token.get('created_at', 'N/A')}")
             print()
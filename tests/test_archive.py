@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from archive import ArchiveJob
+from coordination import LocalCoordination
+
+
+def archive_comments(keep_comments):
+    db = AsyncMongoMockClient()["test"]
+    now = datetime.now(timezone.utc)
+    job = ArchiveJob(db, LocalCoordination(), comments_retention_days=180, keep_comments=keep_comments, pause=0)
+
+    async def run():
+        await db.commentaires.insert_many([
+            {"id": f"c{age}", "recette_id": "r1", "created_at": now - timedelta(days=age)}
+            for age in (1, 200, 300, 400)
+        ])
+        await job.archive()
+        return sorted(c["id"] for c in await db.commentaires.find().to_list(None))
+
+    return asyncio.run(run())
+
+
+def test_keeps_the_newest_comments_past_retention():
+    assert archive_comments(keep_comments=2) == ["c1", "c200"]
+
+
+def test_keep_comments_zero_applies_the_retention_window_only():
+    assert archive_comments(keep_comments=0) == ["c1"]
+
+
+def test_negative_keep_comments_is_rejected():
+    with pytest.raises(ValueError):
+        ArchiveJob(None, LocalCoordination(), keep_comments=-1)
+
+
+class InterleavingDatabase:
+    """Database whose vote archive copies run ``after_copy`` right after each copy"""
+
+    def __init__(self, db, after_copy):
+        self._db = db
+        self._after_copy = after_copy
+
+    def __getattr__(self, name):
+        return self[name]
+
+    def __getitem__(self, name):
+        collection = self._db[name]
+        if name != "votes_archive":
+            return collection
+        after_copy = self._after_copy
+
+        class Collection:
+            def __getattr__(self, attribute):
+                return getattr(collection, attribute)
+
+            async def bulk_write(self, *args, **kwargs):
+                result = await collection.bulk_write(*args, **kwargs)
+                await after_copy()
+                return result
+
+        return Collection()
+
+
+def archive_votes(votes, after_copy=None):
+    db = AsyncMongoMockClient()["test"]
+    now = datetime.now(timezone.utc)
+
+    async def nothing():
+        pass
+
+    job = ArchiveJob(InterleavingDatabase(db, after_copy(db) if after_copy else nothing),
+                     LocalCoordination(), votes_retention_days=90, pause=0)
+
+    async def run():
+        await db.recettes.insert_one({"id": "r1", "version": 3, "note_moyenne": 0.0, "nb_votes": 0})
+        await db.votes.insert_many([
+            {"id": f"v{n}", "recette_id": "r1", "user_id": f"u{n}", "note": note,
+             "created_at": now - timedelta(days=age)}
+            for n, (note, age) in enumerate(votes)
+        ])
+        await job._archive_votes(now - timedelta(days=90))
+        recette = await db.recettes.find_one({"id": "r1"}, {"_id": 0})
+        hot = {vote["id"]: vote["note"] for vote in await db.votes.find().to_list(None)}
+        archived = {vote["id"]: vote["note"] for vote in await db.votes_archive.find().to_list(None)}
+        return recette, hot, archived
+
+    return asyncio.run(run())
+
+
+def test_old_votes_move_and_keep_counting():
+    recette, hot, archived = archive_votes([(5, 200), (3, 100), (4, 1)])
+    assert hot == {"v2": 4}
+    assert archived == {"v0": 5, "v1": 3}
+    assert recette["votes_archives"] == {"nb": 2, "somme": 8}
+    assert (recette["nb_votes"], recette["note_moyenne"]) == (3, 4.0)
+    assert recette["version"] == 4
+
+
+def test_vote_rated_again_during_the_move_is_not_lost():
+    def after_copy(db):
+        async def rate_again():
+            if (await db.votes.find_one({"id": "v0"}))["note"] == 5:
+                await db.votes.update_one({"id": "v0"}, {"$set": {"note": 1}})
+        return rate_again
+
+    # The vote stays hot with its new note, then the next batch archives that note
+    recette, hot, archived = archive_votes([(5, 200), (3, 100)], after_copy)
+    assert hot == {}
+    assert archived == {"v0": 1, "v1": 3}
+    assert recette["votes_archives"] == {"nb": 2, "somme": 4}
+    assert (recette["nb_votes"], recette["note_moyenne"]) == (2, 2.0)
+
+
+def test_totals_recounted_when_a_vote_lands_in_between():
+    def after_copy(db):
+        async def vote_and_bump():
+            await db.votes.insert_one({"id": "new", "recette_id": "r1", "user_id": "x", "note": 2,
+                                       "created_at": datetime.now(timezone.utc)})
+            await db.recettes.update_one({"id": "r1"}, {"$inc": {"version": 1}})
+        return vote_and_bump
+
+    recette, hot, archived = archive_votes([(5, 200)], after_copy)
+    assert hot == {"new": 2} and archived == {"v0": 5}
+    assert (recette["nb_votes"], recette["note_moyenne"]) == (2, 3.5)
+
+
+def test_stale_copy_from_an_interrupted_run_is_replaced():
+    def after_copy(db):
+        async def check():
+            assert (await db.votes_archive.find_one({"id": "v0"}))["note"] == 4
+        return check
+
+    db = AsyncMongoMockClient()["test"]
+    now = datetime.now(timezone.utc)
+    job = ArchiveJob(InterleavingDatabase(db, after_copy(db)), LocalCoordination(), pause=0)
+
+    async def run():
+        vote = {"id": "v0", "recette_id": "r1", "user_id": "u0", "note": 4, "created_at": now - timedelta(days=200)}
+        result = await db.votes.insert_one(vote)
+        await db.votes_archive.insert_one({**vote, "_id": result.inserted_id, "note": 1})
+        await db.recettes.insert_one({"id": "r1", "version": 1})
+        await job._archive_votes(now - timedelta(days=90))
+        return await db.votes_archive.find_one({"id": "v0"})
+
+    assert asyncio.run(run())["note"] == 4
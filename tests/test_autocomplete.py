@@ -0,0 +1,70 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from autocomplete import AutocompleteIndex
+
+RECETTES = [
+    {"_id": 1, "id": "r1", "titre": "Tarte aux pommes", "note_moyenne": 4.0, "ingredient_tokens": ["pomme", "sucre"]},
+    {"_id": 2, "id": "r2", "titre": "Pommes de terre sautées", "note_moyenne": 4.5,
+     "ingredient_tokens": ["pomme", "beurre"]},
+    {"_id": 3, "id": "r3", "titre": "Poulet rôti", "note_moyenne": 3.0, "ingredient_tokens": ["poulet"]},
+]
+
+
+def textes(suggestions):
+    return [suggestion["texte"] for suggestion in suggestions]
+
+
+def test_load_matches_incremental_adds():
+    loaded, added = AutocompleteIndex(), AutocompleteIndex()
+    loaded.load(RECETTES)
+    for recette in RECETTES:
+        added.add(recette)
+    assert loaded._entries == added._entries
+    assert loaded._keys == added._keys
+    assert loaded._ingredient_counts == added._ingredient_counts == {"pomme": 2, "sucre": 1, "beurre": 1, "poulet": 1}
+
+
+def test_suggest_titles_by_rating_then_ingredients():
+    index = AutocompleteIndex()
+    index.load(RECETTES)
+    assert textes(index.suggest("pom")) == ["Pommes de terre sautées", "Tarte aux pommes", "pomme"]
+    assert textes(index.suggest("Pou")) == ["Poulet rôti", "poulet"]
+    assert index.suggest("  ") == []
+
+
+def test_remove_drops_entries_and_object_ids():
+    index = AutocompleteIndex()
+    index.load(RECETTES)
+    index.remove("r2")
+    assert textes(index.suggest("pom")) == ["Tarte aux pommes", "pomme"]
+    assert index._ingredient_counts["pomme"] == 1
+    assert "beurre" not in index._keys
+    assert 2 not in index._object_ids
+
+    index.remove_object(1)
+    assert len(index) == 1
+    assert index._object_ids == {3: "r3"}
+
+
+def test_add_keeps_the_known_object_id():
+    index = AutocompleteIndex()
+    index.load(RECETTES)
+    index.add({"id": "r3", "titre": "Poulet basquaise", "ingredient_tokens": ["poulet", "poivron"]})
+    index.remove_object(3)
+    assert len(index) == 2
+    assert index.suggest("poulet") == []
+
+
+def test_build_indexes_approved_recipes():
+    db = AsyncMongoMockClient()["test"]
+
+    async def build():
+        await db.recettes.insert_many([{**recette, "approuve": recette["id"] != "r3"} for recette in RECETTES])
+        index = AutocompleteIndex()
+        return await index.build(db), index
+
+    count, index = asyncio.run(build())
+    assert count == 2
+    assert textes(index.suggest("pou")) == []
@@ -0,0 +1,66 @@
+import asyncio
+import gzip
+import json
+
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import BaseModel
+
+from catalog import export_ndjson, import_ndjson, iter_lines
+
+
+class Recette(BaseModel):
+    id: str
+    titre: str
+    ingredients: str
+    approuve: bool = False
+
+
+async def chunks(data: bytes, size: int = 7):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def run_import(db, data: bytes, on_insert=None):
+    return asyncio.run(import_ndjson(db, iter_lines(chunks(data)), Recette, batch_size=2, on_insert=on_insert))
+
+
+def ndjson(*recettes) -> bytes:
+    return "\n".join(recette if isinstance(recette, str) else json.dumps(recette) for recette in recettes).encode()
+
+
+def test_import_reports_duplicates_and_invalid_lines():
+    db = AsyncMongoMockClient()["test"]
+    asyncio.run(db.recettes.create_index("id", unique=True))
+    asyncio.run(db.recettes.insert_one({"id": "r1", "titre": "Déjà là", "ingredients": ""}))
+    inserted = []
+    rapport = run_import(db, ndjson(
+        {"id": "r1", "titre": "Doublon", "ingredients": "sel"},
+        {"id": "r2", "titre": "Soupe", "ingredients": "2 poireaux", "approuve": True},
+        "{pas du json",
+        {"id": "r3", "titre": "Sans ingrédients"},
+        {"id": "r4", "titre": "Tarte", "ingredients": "3 pommes"},
+    ), on_insert=inserted.extend)
+
+    assert (rapport["importees"], rapport["doublons"], rapport["invalides"]) == (2, 1, 2)
+    assert [erreur["ligne"] for erreur in rapport["erreurs"]] == [3, 4]
+    assert [recette["id"] for recette in inserted] == ["r2", "r4"]
+    soupe = asyncio.run(db.recettes.find_one({"id": "r2"}))
+    assert soupe["ingredient_tokens"] == ["poireau"]
+
+
+def test_export_then_gzip_import_round_trip():
+    source, target = AsyncMongoMockClient()["source"], AsyncMongoMockClient()["target"]
+    asyncio.run(source.recettes.insert_many([
+        {"id": f"r{n}", "titre": f"Recette {n}", "ingredients": "sel", "approuve": n % 2 == 0,
+         "ingredient_tokens": ["sel"]}
+        for n in range(5)
+    ]))
+
+    async def export():
+        return b"".join([chunk async for chunk in export_ndjson(source, {"approuve": True}, batch_size=2)])
+
+    data = asyncio.run(export())
+    assert all("ingredient_tokens" not in json.loads(line) for line in data.splitlines())
+    rapport = run_import(target, gzip.compress(data))
+    assert rapport["importees"] == 3
+    assert sorted(asyncio.run(target.recettes.distinct("id"))) == ["r0", "r2", "r4"]
@@ -0,0 +1,32 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from change_events import ChangeBus, ChangeStreamWatcher
+
+
+def test_workers_keep_their_own_resume_token(monkeypatch):
+    db = AsyncMongoMockClient()["test"]
+    watchers = [ChangeStreamWatcher(db, ChangeBus(), worker_id="web-1") for _ in range(2)]
+
+    async def scenario():
+        await watchers[0].create_indexes()
+        for slot, (watcher, token) in enumerate(zip(watchers, ({"_data": "a"}, {"_data": "b"}))):
+            monkeypatch.setenv("WORKER_SLOT", str(slot))
+            watcher._resume_token = token
+            await watcher._save_token(force=True)
+        # The replacement of worker 0 resumes from worker 0's position
+        monkeypatch.setenv("WORKER_SLOT", "0")
+        replacement = ChangeStreamWatcher(db, ChangeBus(), worker_id="web-1")
+        return await replacement._load_token(), sorted(await db.change_stream_state.distinct("name"))
+
+    token, names = asyncio.run(scenario())
+    assert token == {"_data": "a"}
+    assert names == ["recettes:web-1:0", "recettes:web-1:1"]
+
+
+def test_default_key_uses_the_pid_outside_gunicorn(monkeypatch):
+    monkeypatch.delenv("WORKER_SLOT", raising=False)
+    monkeypatch.setattr("os.getpid", lambda: 4242)
+    monkeypatch.setattr("socket.gethostname", lambda: "hote")
+    assert ChangeStreamWatcher(None, ChangeBus()).state_key == "recettes:hote:4242"
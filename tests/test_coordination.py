@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from coordination import CoordinationBackend, LocalCoordination, LockNotAcquired, MongoCoordination
+
+
+@pytest.fixture(params=["local", "mongo"])
+def make_backend(request):
+    def make():
+        if request.param == "local":
+            return LocalCoordination()
+        return MongoCoordination(AsyncMongoMockClient()["test"])
+    return make
+
+
+def run(backend, scenario):
+    async def main():
+        await backend.setup()
+        return await scenario(backend)
+    return asyncio.run(main())
+
+
+def test_lock_is_exclusive_until_released(make_backend):
+    async def scenario(backend):
+        token = await backend.acquire_lock("job", ttl=30)
+        assert token is not None
+        assert await backend.acquire_lock("job", ttl=30) is None
+        assert await backend.acquire_lock("autre", ttl=30) is not None
+        await backend.release_lock("job", token)
+        return await backend.acquire_lock("job", ttl=30)
+
+    assert run(make_backend(), scenario) is not None
+
+
+def test_release_needs_the_owner_token(make_backend):
+    async def scenario(backend):
+        await backend.acquire_lock("job", ttl=30)
+        await backend.release_lock("job", "pas-le-bon")
+        return await backend.acquire_lock("job", ttl=30)
+
+    assert run(make_backend(), scenario) is None
+
+
+def test_expired_lock_can_be_taken_over(make_backend):
+    async def scenario(backend):
+        first = await backend.acquire_lock("job", ttl=0.05)
+        await asyncio.sleep(0.1)
+        second = await backend.acquire_lock("job", ttl=30)
+        # The previous holder's late release must not free the new lock
+        await backend.release_lock("job", first)
+        return second, await backend.acquire_lock("job", ttl=30)
+
+    second, third = run(make_backend(), scenario)
+    assert second is not None and third is None
+
+
+def test_lock_context_manager(make_backend):
+    async def scenario(backend):
+        async with backend.lock("job"):
+            with pytest.raises(LockNotAcquired):
+                async with backend.lock("job"):
+                    pass
+        async with backend.lock("job") as token:
+            return token
+
+    assert run(make_backend(), scenario)
+
+
+def test_lock_waits_for_the_holder(make_backend):
+    async def scenario(backend):
+        async def holder():
+            async with backend.lock("job"):
+                await asyncio.sleep(0.1)
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0.01)
+        async with backend.lock("job", wait=1.0, poll=0.02):
+            assert task.done()
+        return True
+
+    assert run(make_backend(), scenario)
+
+
+def test_backends_must_implement_every_operation():
+    class LocksOnly(CoordinationBackend):
+        async def acquire_lock(self, name, ttl):
+            return "token"
+
+        async def release_lock(self, name, token):
+            pass
+
+    with pytest.raises(TypeError):
+        LocksOnly()
@@ -0,0 +1,56 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from facets import FacetCounter
+
+CATEGORIES = ["Entrées", "Plats", "Desserts"]
+
+
+def counter_with(recettes):
+    db = AsyncMongoMockClient()["test"]
+    asyncio.run(db.recettes.insert_many(recettes))
+    return db, FacetCounter(db, CATEGORIES, ttl=60)
+
+
+def recette(categorie, note, approuve=True):
+    return {"categorie": categorie, "note_moyenne": note, "approuve": approuve}
+
+
+def test_counts_per_category_and_rating_bucket():
+    _, counter = counter_with([
+        recette("Plats", 0.0), recette("Plats", 3.6), recette("Plats", 4.0),
+        recette("Desserts", 5.0), recette("Desserts", 1.0), recette("Entrées", 2.5, approuve=False),
+    ])
+    facettes = asyncio.run(counter.counts({"approuve": True}))
+    assert facettes == {
+        "total": 5,
+        "categories": {"Entrées": 0, "Plats": 3, "Desserts": 2},
+        "notes": {"non_notees": 1, "1": 1, "2": 0, "3": 1, "4": 1, "5": 1},
+    }
+
+
+def test_perfect_rating_has_its_own_bucket():
+    _, counter = counter_with([recette("Plats", 4.99), recette("Plats", 5.0), recette("Desserts", 5.0)])
+    notes = asyncio.run(counter.counts({"approuve": True}))["notes"]
+    assert (notes["4"], notes["5"]) == (1, 2)
+
+
+def test_selected_category_narrows_ratings_but_not_categories():
+    _, counter = counter_with([recette("Plats", 3.6), recette("Desserts", 4.5), recette("Desserts", 4.9)])
+    facettes = asyncio.run(counter.counts({"approuve": True}, "Plats"))
+    assert facettes["total"] == 1
+    assert facettes["categories"] == {"Entrées": 0, "Plats": 1, "Desserts": 2}
+    assert facettes["notes"]["3"] == 1 and facettes["notes"]["4"] == 0
+
+
+def test_cache_until_invalidated():
+    db, counter = counter_with([recette("Plats", 3.0)])
+    assert asyncio.run(counter.counts({"approuve": True}, cache_key=("a",)))["total"] == 1
+    asyncio.run(db.recettes.insert_one(recette("Plats", 4.0)))
+    assert asyncio.run(counter.counts({"approuve": True}, cache_key=("a",)))["total"] == 1
+
+    counter.apply_change({"operation": "update", "updated_fields": ["note_moyenne"]})
+    assert asyncio.run(counter.counts({"approuve": True}, cache_key=("a",)))["total"] == 1
+    counter.apply_change({"operation": "update", "updated_fields": ["categorie"]})
+    assert asyncio.run(counter.counts({"approuve": True}, cache_key=("a",)))["total"] == 2
@@ -0,0 +1,45 @@
+import pytest
+
+from ingredients import extract_ingredients, ingredient_fields, normalize_terms, singular, TOKENIZER_VERSION
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("200 g de farine", ["farine"]),
+    ("3 œufs frais", ["oeuf"]),
+    ("2 gros oignons", ["oignon"]),
+    ("100 g de carottes râpées", ["carotte"]),
+    ("100 g de noisettes", ["noisette"]),
+    ("1 noisette de beurre", ["beurre"]),
+    ("une noisette d'huile", ["huile"]),
+    ("200 g de petits pois", ["pois"]),
+    ("1 ananas", ["ananas"]),
+    ("2 piments doux", ["piment", "doux"]),
+    ("4 poireaux (le blanc)", ["poireau"]),
+])
+def test_normalize_terms(text, expected):
+    assert normalize_terms(text) == expected
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("tomates", "tomate"),
+    ("choux", "chou"),
+    ("gateaux", "gateau"),
+    ("pois", "pois"),
+    ("noix", "noix"),
+    ("riz", "riz"),
+    ("cresson", "cresson"),
+])
+def test_singular(word, expected):
+    assert singular(word) == expected
+
+
+def test_pantry_matches_recipe_tokens():
+    recette = extract_ingredients("100 g de noisettes\n1 noisette de beurre\n2 ananas frais")
+    assert recette == ["ananas", "beurre", "noisette"]
+    assert set(extract_ingredients("noisettes, beurre")) <= set(recette)
+
+
+def test_ingredient_fields_carry_the_tokenizer_version():
+    assert ingredient_fields("sel; poivre") == {
+        "ingredient_tokens": ["poivre", "sel"], "ingredient_tokens_version": TOKENIZER_VERSION
+    }
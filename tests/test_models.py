@@ -0,0 +1,19 @@
+import pytest
+from pydantic import ValidationError
+
+from models import RecetteBatchRequest
+
+
+def test_batch_include_accepts_known_parts():
+    assert RecetteBatchRequest(ids=["a"], include=["commentaires", "ma_note"]).include == ["commentaires", "ma_note"]
+    assert RecetteBatchRequest(ids=["a"]).include == []
+
+
+def test_batch_include_rejects_unknown_parts():
+    with pytest.raises(ValidationError):
+        RecetteBatchRequest(ids=["a"], include=["commentaire"])
+
+
+def test_batch_ids_are_capped():
+    with pytest.raises(ValidationError):
+        RecetteBatchRequest(ids=[str(n) for n in range(101)])
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from outbox import EmailOutbox, EmailTransport
+
+
+class FlakyTransport(EmailTransport):
+    """Fails the first ``failures`` sends"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.sent = []
+
+    async def send(self, message: dict) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("SMTP indisponible")
+        self.sent.append(message)
+
+
+def run(transport, steps, max_attempts=3):
+    """Enqueue one message, then drain ``steps`` times, making it due before each drain"""
+    db = AsyncMongoMockClient()["test"]
+    outbox = EmailOutbox(db, transport, max_attempts=max_attempts, base_delay=10.0)
+    states = []
+
+    async def scenario():
+        await outbox.enqueue("a@test.com", "Sujet", "Lien: https://site/reset-password?token=secret")
+        for _ in range(steps):
+            await outbox.collection.update_many({}, {"$set": {"next_attempt_at": datetime(2000, 1, 1)}})
+            before = datetime.utcnow()
+            await outbox.drain()
+            await outbox.stop()
+            message = await outbox.collection.find_one({}, {"_id": 0})
+            states.append((message, before))
+
+    asyncio.run(scenario())
+    return states
+
+
+def test_sent_message_loses_its_body():
+    transport = FlakyTransport()
+    [(message, _)] = run(transport, steps=1)
+    assert transport.sent[0]["body"].endswith("token=secret")
+    assert message["status"] == "sent"
+    assert message["attempts"] == 1
+    assert "body" not in message and "locked_until" not in message
+
+
+def test_failures_back_off_exponentially():
+    states = run(FlakyTransport(failures=2), steps=3)
+    for attempts, (message, before) in enumerate(states[:2], start=1):
+        assert message["status"] == "pending"
+        assert message["attempts"] == attempts
+        assert message["last_error"] == "SMTP indisponible"
+        assert "body" in message
+        delay = (message["next_attempt_at"] - before).total_seconds()
+        assert 10.0 * 2 ** (attempts - 1) <= delay <= 15.0 * 2 ** (attempts - 1) + 1
+    message, _ = states[2]
+    assert message["status"] == "sent" and message["attempts"] == 3
+    assert "last_error" not in message
+
+
+def test_dead_lettered_message_loses_its_body():
+    transport = FlakyTransport(failures=5)
+    message, before = run(transport, steps=3)[-1]
+    assert message["status"] == "failed"
+    assert message["attempts"] == 3
+    assert message["failed_at"] > before - timedelta(seconds=1)
+    assert "body" not in message
+    assert transport.sent == []
+
+
+def test_redact_finished_drops_old_bodies():
+    db = AsyncMongoMockClient()["test"]
+    outbox = EmailOutbox(db, FlakyTransport())
+
+    async def scenario():
+        await db.email_outbox.insert_many([
+            {"id": "1", "status": "sent", "body": "x", "sent_at": datetime.utcnow() - timedelta(days=1)},
+            {"id": "2", "status": "failed", "body": "x"},
+            {"id": "3", "status": "pending", "body": "x"},
+        ])
+        redacted = await outbox.redact_finished()
+        return redacted, await db.email_outbox.distinct("id", {"body": {"$exists": True}})
+
+    assert asyncio.run(scenario()) == (2, ["3"])
+
+
+def test_abandoned_messages_expire():
+    db = AsyncMongoMockClient()["test"]
+    outbox = EmailOutbox(db, FlakyTransport())
+    yesterday = (datetime.utcnow() - timedelta(days=1)).replace(microsecond=0)
+
+    async def scenario():
+        await db.email_outbox.insert_many([
+            {"id": "1", "status": "failed"},
+            {"id": "2", "status": "failed", "failed_at": yesterday},
+            {"id": "3", "status": "pending"},
+        ])
+        await outbox.create_indexes()
+        indexes = await db.email_outbox.index_information()
+        expiring = {
+            index["key"][0][0]: index["expireAfterSeconds"]
+            for index in indexes.values() if "expireAfterSeconds" in index
+        }
+        stamped = {m["id"]: m.get("failed_at") for m in await db.email_outbox.find().to_list(None)}
+        return expiring, stamped
+
+    expiring, stamped = asyncio.run(scenario())
+    assert expiring == {"sent_at": 7 * 24 * 3600, "failed_at": 30 * 24 * 3600}
+    # Messages abandoned before failed_at existed start expiring now
+    assert stamped["1"] > yesterday
+    assert stamped["2"] == yesterday
+    assert stamped["3"] is None
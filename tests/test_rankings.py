@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from coordination import LocalCoordination
+from rankings import RankingJob
+
+
+def recette(recette_id, note, votes, categorie="Plats", age_days=10):
+    return {
+        "id": recette_id, "categorie": categorie, "note_moyenne": note, "nb_votes": votes, "approuve": True,
+        "created_at": datetime.now(timezone.utc) - timedelta(days=age_days)
+    }
+
+
+def test_bayesian_top_order():
+    db = AsyncMongoMockClient()["test"]
+    job = RankingJob(db, LocalCoordination(), prior_votes=5)
+
+    async def scenario():
+        await db.recettes.insert_many([recette("seul", 5.0, 1), recette("populaire", 4.7, 50), recette("moyen", 3.0, 20)])
+        await job.compute()
+        return await job.ranked_ids("top")
+
+    assert asyncio.run(scenario()) == ["populaire", "seul", "moyen"]
+
+
+def test_recipes_approved_since_the_last_run_are_listed_unranked():
+    db = AsyncMongoMockClient()["test"]
+    job = RankingJob(db, LocalCoordination())
+
+    async def scenario():
+        await db.recettes.insert_many([recette("ancienne", 4.0, 3)])
+        await job.compute()
+        await db.recettes.insert_many([
+            recette("nouvelle", 0.0, 0, age_days=0),
+            recette("dessert", 0.0, 0, categorie="Desserts", age_days=1),
+            {**recette("en_attente", 0.0, 0), "approuve": False},
+        ])
+        ranked = await job.ranked_ids("top")
+        unranked = await job.unranked({"approuve": True}, limit=10)
+        in_category = await job.unranked({"approuve": True, "categorie": "Desserts"}, limit=10)
+        return ranked, [r["id"] for r in unranked], [r["id"] for r in in_category]
+
+    ranked, unranked, in_category = asyncio.run(scenario())
+    assert ranked == ["ancienne"]
+    assert unranked == ["nouvelle", "dessert"]
+    assert in_category == ["dessert"]
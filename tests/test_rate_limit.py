@@ -0,0 +1,70 @@
+import asyncio
+
+import rate_limit
+from rate_limit import MemoryRateLimitBackend, RateLimitPolicy, RateLimitRule
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def hit(backend, key="k", capacity=3, rate=1.0):
+    return asyncio.run(backend.hit(key, capacity, rate))
+
+
+def test_bucket_allows_capacity_then_refuses(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    backend = MemoryRateLimitBackend()
+    assert [hit(backend)[0] for _ in range(3)] == [True, True, True]
+    allowed, wait = hit(backend)
+    assert not allowed
+    assert wait == 1.0
+
+
+def test_bucket_refills_over_time(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    backend = MemoryRateLimitBackend()
+    for _ in range(3):
+        hit(backend, rate=0.5)
+    clock.now += 2
+    assert hit(backend, rate=0.5) == (True, 0.0)
+    allowed, wait = hit(backend, rate=0.5)
+    assert not allowed
+    assert wait == 2.0
+
+
+def test_refill_is_capped_at_capacity(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    backend = MemoryRateLimitBackend()
+    hit(backend)
+    clock.now += 3600
+    assert [hit(backend)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_key_count_is_bounded_least_recent_first(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    backend = MemoryRateLimitBackend(max_keys=3)
+    for key in ("a", "b", "c"):
+        hit(backend, key=key, capacity=1)
+    hit(backend, key="a", capacity=1)  # "a" is now the most recent
+    hit(backend, key="d", capacity=1)
+    assert list(backend._buckets) == ["c", "a", "d"]
+    # "a" kept its empty bucket
+    assert not hit(backend, key="a", capacity=1)[0]
+
+
+def test_rule_matching():
+    policy = RateLimitPolicy("images", capacity=10, per_seconds=60, key="user")
+    rule = RateLimitRule(("POST", "PATCH"), r"/api/recettes/[^/]+", (policy,))
+    assert rule.matches("PATCH", "/api/recettes/abc")
+    assert not rule.matches("GET", "/api/recettes/abc")
+    assert not rule.matches("PATCH", "/api/recettes/abc/noter")
+    assert policy.refill_rate == 10 / 60
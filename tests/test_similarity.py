@@ -0,0 +1,151 @@
+import asyncio
+import math
+
+import numpy as np
+from mongomock_motor import AsyncMongoMockClient
+
+from coordination import LocalCoordination
+from similarity import SimilarityIndex, fit_idf, recette_terms, top_neighbours, vectorize
+
+DOCUMENTS = [
+    ["tarte", "pomme", "pomme", "sucre"],
+    ["tarte", "poire", "sucre"],
+    ["soupe", "poireau", "pomme"],
+    ["soupe", "poireau"],
+]
+
+
+def test_fit_idf_weights_rare_terms_higher():
+    vocabulary, idf = fit_idf(DOCUMENTS)
+    assert list(vocabulary) == ["poire", "poireau", "pomme", "soupe", "sucre", "tarte"]
+    assert idf[vocabulary["poire"]] == math.log(5 / 2) + 1
+    assert idf[vocabulary["pomme"]] == math.log(5 / 3) + 1
+    assert idf[vocabulary["poire"]] > idf[vocabulary["pomme"]]
+
+
+def test_vectorize_normalizes_rows_and_ignores_unknown_terms():
+    vocabulary, idf = fit_idf(DOCUMENTS)
+    matrix = vectorize(DOCUMENTS + [["inconnu"], ["pomme", "inconnu"]], vocabulary, idf)
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    assert np.allclose(norms, [1, 1, 1, 1, 0, 1])
+    # Sublinear term frequency: a repeated term weighs 1 + log(2) times one occurrence
+    row = matrix[0].toarray()[0]
+    ratio = (row[vocabulary["pomme"]] / idf[vocabulary["pomme"]]) / (row[vocabulary["sucre"]] / idf[vocabulary["sucre"]])
+    assert math.isclose(ratio, 1 + math.log(2))
+
+
+def test_top_neighbours_excludes_self_and_sorts_by_score():
+    vocabulary, idf = fit_idf(DOCUMENTS)
+    matrix = vectorize(DOCUMENTS, vocabulary, idf)
+    neighbours = top_neighbours(matrix, matrix, k=2, min_score=0.0, block=3)
+    assert [[column for column, _ in row] for row in neighbours] == [[1, 2], [0], [3, 0], [2]]
+    assert all(score > 0 for row in neighbours for _, score in row)
+    assert neighbours[2][0][1] > neighbours[2][1][1]
+
+
+def test_top_neighbours_min_score_and_k():
+    vocabulary, idf = fit_idf(DOCUMENTS)
+    matrix = vectorize(DOCUMENTS, vocabulary, idf)
+    assert top_neighbours(matrix, matrix, k=1, min_score=0.0) == [row[:1] for row in top_neighbours(matrix, matrix, k=3, min_score=0.0)]
+    assert top_neighbours(matrix, matrix, k=3, min_score=1.0) == [[], [], [], []]
+
+
+def test_recette_terms_weigh_the_title_twice():
+    recette = {"titre": "Tarte aux pommes", "ingredients": "3 pommes\n100 g de sucre"}
+    assert recette_terms(recette) == ["tarte", "pomme", "tarte", "pomme", "pomme", "sucre"]
+    assert recette_terms({**recette, "ingredient_tokens": ["beurre"]})[-1] == "beurre"
+
+
+def recette(recette_id, titre, ingredients):
+    return {"id": recette_id, "titre": titre, "ingredients": ingredients, "approuve": True}
+
+
+CATALOG = [
+    recette("a", "Tarte aux pommes", "pommes\nsucre\nbeurre"),
+    recette("b", "Tarte aux poires", "poires\nsucre\nbeurre"),
+    recette("x", "Soupe de poireaux", "poireaux\npommes de terre"),
+]
+
+
+def workers(count=1):
+    db = AsyncMongoMockClient()["test"]
+    coordination = LocalCoordination()
+    return db, [SimilarityIndex(db, coordination, k=3, min_score=0.01) for _ in range(count)]
+
+
+async def lists(db):
+    return {
+        entry["recette_id"]: [similaire["recette_id"] for similaire in entry["similaires"]]
+        for entry in await db.recette_similaires.find().to_list(None)
+    }
+
+
+def test_insert_new_pushes_into_neighbour_lists():
+    db, [index] = workers()
+
+    async def scenario():
+        await db.recettes.insert_many([dict(r) for r in CATALOG])
+        await index.run_once()
+        await db.recettes.insert_one(recette("c", "Tarte pommes poires", "pommes\npoires\nsucre"))
+        assert await index.run_once() == {"nouvelles": 1}
+        assert await index.run_once() == {"nouvelles": 0}
+        return await lists(db)
+
+    found = asyncio.run(scenario())
+    assert found["c"][:2] in (["a", "b"], ["b", "a"])
+    assert found["a"][0] == "c" and found["b"][0] == "c"
+
+
+def test_two_workers_do_not_insert_a_recipe_twice():
+    db, [first, second] = workers(2)
+
+    async def scenario():
+        await db.recettes.insert_many([dict(r) for r in CATALOG])
+        await first.run_once()
+        await second.run_once()
+        await db.recettes.insert_one(recette("c", "Tarte pommes poires", "pommes\npoires\nsucre"))
+        assert await second.run_once() == {"nouvelles": 1}
+        # The first worker never saw "c": it must load it rather than insert it again
+        assert await first.run_once() == {"nouvelles": 0}
+        await db.recettes.insert_one(recette("d", "Tarte fine aux pommes", "pommes\nsucre"))
+        assert await first.run_once() == {"nouvelles": 1}
+        return await lists(db)
+
+    found = asyncio.run(scenario())
+    for similaires in found.values():
+        assert len(similaires) == len(set(similaires))
+    assert "c" in found["d"]
+
+
+def test_mark_stale_reinserts_an_edited_recipe():
+    db, [index] = workers()
+
+    async def scenario():
+        await db.recettes.insert_many([dict(r) for r in CATALOG])
+        await index.run_once()
+        before = await lists(db)
+        # The soup becomes a pie: it leaves the lists, then comes back with new neighbours
+        await db.recettes.update_one({"id": "x"}, {"$set": {"titre": "Tarte aux pommes", "ingredients": "pommes\nsucre"}})
+        await index.mark_stale("x")
+        assert all("x" not in similaires for similaires in (await lists(db)).values())
+        assert await index.run_once() == {"nouvelles": 1}
+        assert await index.run_once() == {"nouvelles": 0}
+        return before, await lists(db)
+
+    before, after = asyncio.run(scenario())
+    assert before["a"][0] == "b"
+    assert after["x"][0] == "a" and after["a"][0] == "x"
+    assert after["a"].count("x") == 1
+
+
+def test_empty_vocabulary_is_rebuilt_right_away():
+    db, [index] = workers()
+
+    async def scenario():
+        assert (await index.run_once())["termes"] == 0
+        await db.recettes.insert_many([dict(r) for r in CATALOG])
+        return await index.run_once(), await lists(db)
+
+    report, found = asyncio.run(scenario())
+    assert report["recettes"] == 3
+    assert found["a"][0] == "b"
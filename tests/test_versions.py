@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+from pymongo import ReturnDocument
+
+from versions import etag_version, parse_if_match, version_filter, versioned_update
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("*", None),
+    ('"v3"', 3),
+    (' W/"v12" ', 12),
+    ("7", 7),
+])
+def test_parse_if_match(header, expected):
+    assert parse_if_match(header) == expected
+
+
+@pytest.mark.parametrize("header", ['"abc"', '"v"', "v3, v4"])
+def test_parse_if_match_rejects_garbage(header):
+    with pytest.raises(HTTPException) as error:
+        parse_if_match(header)
+    assert error.value.status_code == 400
+
+
+def test_etag_round_trips_through_if_match():
+    assert etag_version(5) == '"v5"'
+    assert parse_if_match(etag_version(5)) == 5
+
+
+def compare_and_set(document, version):
+    db = AsyncMongoMockClient()["test"]
+
+    async def run():
+        await db.recettes.insert_one({"id": "r1", **document})
+        recette = await db.recettes.find_one_and_update(
+            {"id": "r1", "version": version_filter(version)},
+            versioned_update({"$set": {"note_moyenne": 4.0}}, version),
+            return_document=ReturnDocument.AFTER
+        )
+        return recette and {key: value for key, value in recette.items() if key != "_id"}
+
+    return asyncio.run(run())
+
+
+def test_missing_version_counts_as_version_1():
+    assert compare_and_set({}, 1) == {"id": "r1", "note_moyenne": 4.0, "version": 2}
+
+
+def test_compare_and_set_bumps_the_matching_version():
+    assert compare_and_set({"version": 3}, 3)["version"] == 4
+
+
+@pytest.mark.parametrize("document, version", [({"version": 2}, 1), ({}, 2), ({"version": 3}, 2)])
+def test_compare_and_set_rejects_other_versions(document, version):
+    assert compare_and_set(document, version) is None
+
+
+def test_unconditional_update_increments():
+    assert versioned_update({"$set": {"a": 1}}) == {"$set": {"a": 1}, "$inc": {"version": 1}}
+    assert versioned_update({"$set": {"a": 1}}, 4) == {"$set": {"a": 1, "version": 5}}